@@ -109,10 +109,44 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Background workers (renditions, storage deletions) write concurrently;
+            # take the write lock up front instead of failing with "database is locked"
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file, not the shared-cache in-memory default, whose table locks fail
+            # the threaded tests (orders/tests.py) instead of waiting for the timeout
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
 
+# Cache
+# Local memory by default; set REDIS_URL (requires the redis package) so all
+# gunicorn workers share the cached feeds and stats (invalidation is in the database).
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unitrade',
+        }
+    }
+
+# Product feed cache (see products/feed_cache.py)
+FEED_CACHE_TTL = int(os.getenv('FEED_CACHE_TTL', '300'))  # seconds
+FEED_CACHE_LOCK_TTL = int(os.getenv('FEED_CACHE_LOCK_TTL', '10'))  # max seconds a rebuild may hold the lock
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -229,6 +263,55 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How long an unpaid order holds its items' stock (see orders/reservations.py)
+ORDER_RESERVATION_TTL_MINUTES = int(os.getenv('ORDER_RESERVATION_TTL_MINUTES', '30'))
+
+# Paystack webhook inbox (see orders/payment_events.py)
+PAYMENT_EVENTS_ASYNC = os.getenv('PAYMENT_EVENTS_ASYNC', 'True').lower() == 'true'
+
+# Streaming admin exports: rows fetched per round trip (see products/exports.py)
+EXPORT_CHUNK_SIZE = 2000
+
+# Order event side effects: rollups, push, SMS (see orders/lifecycle.py)
+ORDER_EVENTS_ASYNC = os.getenv('ORDER_EVENTS_ASYNC', 'True').lower() == 'true'
+ORDER_SMS_STATUSES = ('shipped',)  # statuses the buyer is also told about by SMS
+
+# Paystack API client (see orders/paystack.py)
+PAYSTACK_BASE_URL = os.getenv('PAYSTACK_BASE_URL', 'https://api.paystack.co')
+PAYSTACK_CONNECT_TIMEOUT = 3.05  # seconds
+PAYSTACK_READ_TIMEOUT = float(os.getenv('PAYSTACK_READ_TIMEOUT', '10'))
+PAYSTACK_POOL_SIZE = 10
+PAYSTACK_RETRIES = 2
+PAYSTACK_BACKOFF_SECONDS = 0.25
+PAYSTACK_BREAKER_FAILURES = 5
+PAYSTACK_BREAKER_RESET_SECONDS = 30
+
+# Catalog facet counts (see products/facets.py)
+FACETS_TIMEOUT_MS = int(os.getenv('FACETS_TIMEOUT_MS', '300'))
+FACETS_BOUNDARY_TTL = 3600
+
+# Product image renditions (see products/images.py)
+IMAGE_RENDITIONS_ASYNC = os.getenv('IMAGE_RENDITIONS_ASYNC', 'True').lower() == 'true'
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', '2'))
+
+# Chunked image uploads (see products/uploads.py)
+IMAGE_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_UPLOAD_CHUNK_BYTES = 1024 * 1024  # must stay below DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB)
+
+# Background deletion of removed product files (see products/storage_cleanup.py)
+STORAGE_DELETION_ASYNC = os.getenv('STORAGE_DELETION_ASYNC', 'True').lower() == 'true'
+STORAGE_DELETION_WORKERS = int(os.getenv('STORAGE_DELETION_WORKERS', '4'))
+
+# In-process autocomplete index (see products/autocomplete.py)
+AUTOCOMPLETE_WARM_AT_STARTUP = os.getenv('AUTOCOMPLETE_WARM_AT_STARTUP', 'True').lower() == 'true'
+AUTOCOMPLETE_SYNC_SECONDS = 30
+AUTOCOMPLETE_REBUILD_SECONDS = 900
+
+# Buffered product view counters (see products/view_counts.py)
+VIEW_COUNTS_FLUSH_SECONDS = int(os.getenv('VIEW_COUNTS_FLUSH_SECONDS', '30'))
+VIEW_COUNTS_MAX_PENDING = 500
+VIEW_COUNTS_ASYNC = os.getenv('VIEW_COUNTS_ASYNC', 'True').lower() == 'true'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -16,6 +16,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
 from products.models import Product, ProductImage
+from products import storage_cleanup
 
 def clear_all_products():
     print("🚨 WARNING: This will delete ALL products!")
@@ -34,21 +35,15 @@ def clear_all_products():
     confirm = input(f"Are you sure you want to delete {product_count} products? (yes/no): ")
     
     if confirm.lower() == 'yes':
-        # Delete image files first
-        for image in ProductImage.objects.all():
-            if image.image:
-                try:
-                    if os.path.exists(image.image.path):
-                        os.remove(image.image.path)
-                        print(f"🗑️ Deleted image: {image.image.name}")
-                except Exception as e:
-                    print(f"❌ Error deleting image: {e}")
-        
-        # Delete all products
+        # Delete all products (image files are queued for deletion by the post_delete signals)
         deleted_count, deleted_objects = Product.objects.all().delete()
         
         print(f"✅ Deleted {deleted_count} products successfully!")
         print(f"📋 Details: {deleted_objects}")
+
+        # Remove the queued files through the storage API (works on GCS too)
+        deleted_files, failed_files = storage_cleanup.drain(batch_size=500)
+        print(f"🗑️ Deleted {deleted_files} image files ({failed_files} failed, retried by process_storage_deletions)")
     else:
         print("❌ Deletion cancelled")
 
@@ -1,3 +1,59 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from . import lifecycle
+from .models import Order, OrderEvent, OrderItem
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ('product',)
+
+
+class OrderEventInline(admin.TabularInline):
+    model = OrderEvent
+    extra = 0
+    fields = ('created_at', 'field', 'from_value', 'to_value', 'actor', 'source', 'note', 'dispatched_at')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+def _transition_action(status):
+    def action(modeladmin, request, queryset):
+        try:
+            changed = lifecycle.transition(queryset, status=status, actor=request.user, source='admin')
+        except lifecycle.InvalidTransition as e:
+            modeladmin.message_user(request, f'Nothing changed: {e.detail}', messages.ERROR)
+            return
+        modeladmin.message_user(request, f'{len(changed)} orders marked {status}.')
+    action.__name__ = f'mark_{status}'
+    action.short_description = f'Mark selected orders {status}'
+    return action
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'buyer', 'total', 'status', 'payment_status', 'created_at')
+    list_filter = ('status', 'payment_status')
+    search_fields = ('id', 'buyer__email', 'paystack_reference')
+    raw_id_fields = ('buyer',)
+    # Status changes go through the actions below, so they are validated and recorded
+    readonly_fields = ('status', 'payment_status', 'reservation_expires_at', 'created_at', 'updated_at')
+    inlines = [OrderItemInline, OrderEventInline]
+    actions = [_transition_action(status) for status in ('processing', 'shipped', 'delivered', 'completed', 'cancelled')]
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'field', 'from_value', 'to_value', 'source', 'actor', 'created_at', 'dispatched_at')
+    list_filter = ('field', 'to_value', 'source')
+    raw_id_fields = ('order', 'actor')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
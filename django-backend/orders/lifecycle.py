@@ -0,0 +1,274 @@
+"""
+Order lifecycle: the allowed changes of ``Order.status`` and ``payment_status``, and
+what happens after them.
+
+Every change goes through ``transition()``, which takes any number of orders (marking
+500 orders shipped is one call) and, in one transaction,
+
+* locks the orders in primary-key order and checks each change against
+  ``STATUS_TRANSITIONS`` / ``PAYMENT_TRANSITIONS``. Orders already in the target state
+  are left alone, so repeating a transition is harmless. With ``strict`` one disallowed
+  change rejects the whole call (``InvalidTransition``, a 409); otherwise those orders
+  are skipped, which is how payments "only move forward";
+* writes the changes with one ``UPDATE`` per distinct outcome (paying a pending order
+  also moves it to processing and ends its stock reservation; cancelling one returns
+  its reserved stock);
+* appends one ``OrderEvent`` per changed field with ``bulk_create``.
+
+Side effects are not run inline. After the commit a single background worker reads
+undispatched events in batches and, per batch, refreshes the sales rollups of the
+orders that were paid or cancelled, sends the push notifications with one Expo request
+per 100 messages and one SMS request per message text, then marks the events
+dispatched. Events left behind by a crashed worker are picked up again by
+``python manage.py dispatch_order_events``.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status as http_status
+from rest_framework.exceptions import APIException
+
+from users.services.push_notifications import ORDER_STATUS_MESSAGES, PushNotificationService
+from users.sms_utils import send_bulk_sms
+from . import reservations, rollups
+from .models import Order, OrderEvent, OrderItem
+
+logger = logging.getLogger(__name__)
+
+STATUS_TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'completed', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': {'completed'},
+    'completed': set(),
+    'cancelled': set(),
+}
+PAYMENT_TRANSITIONS = {
+    'pending': {'paid', 'failed'},
+    'failed': {'paid'},  # a later attempt succeeded
+    'paid': {'refunded'},
+    'refunded': set(),
+}
+# Statuses an unpaid order cannot reach
+REQUIRES_PAYMENT = {'shipped', 'delivered', 'completed'}
+# Sent as GSM-7 (see users/sms_utils.py), so plain ASCII: no emoji like the push texts
+SMS_MESSAGES = {
+    'processing': 'UniTrade: your order is being processed.',
+    'shipped': 'UniTrade: your order has been shipped.',
+    'delivered': 'UniTrade: your order has been delivered.',
+    'cancelled': 'UniTrade: your order has been cancelled.',
+}
+
+CLAIM_SECONDS = 120  # a claimed batch is dispatched by someone else if its worker dies
+
+_executor = None
+_kick_lock = threading.Lock()
+_kick_queued = False
+
+
+class InvalidTransition(APIException):
+    status_code = http_status.HTTP_409_CONFLICT
+    default_detail = 'One or more orders cannot make this change.'
+    default_code = 'invalid_transition'
+
+
+def _get_executor():
+    # One worker, so events are dispatched in the order they were recorded
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-events')
+    return _executor
+
+
+def _check(current_status, current_payment, status, payment_status):
+    """Why this change is not allowed, or ''."""
+    if payment_status and payment_status != current_payment \
+            and payment_status not in PAYMENT_TRANSITIONS.get(current_payment, ()):
+        return f'payment cannot go from {current_payment} to {payment_status}'
+    if status and status != current_status:
+        if status not in STATUS_TRANSITIONS.get(current_status, ()):
+            return f'cannot go from {current_status} to {status}'
+        if status in REQUIRES_PAYMENT and (payment_status or current_payment) != 'paid':
+            return f'cannot be {status} before it is paid'
+    return ''
+
+
+def transition(queryset, status=None, payment_status=None, actor=None, source='', note='', strict=True):
+    """
+    Move the orders of ``queryset`` to ``status`` and/or ``payment_status`` in one
+    transaction, recording an ``OrderEvent`` per change. Returns the primary keys of
+    the orders that changed. Raises ``InvalidTransition`` if ``strict`` and any order
+    cannot make the change (nothing is changed then).
+    """
+    if status is not None and status not in STATUS_TRANSITIONS:
+        raise InvalidTransition({'status': f'Unknown status {status!r}.'})
+    if payment_status is not None and payment_status not in PAYMENT_TRANSITIONS:
+        raise InvalidTransition({'payment_status': f'Unknown payment status {payment_status!r}.'})
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update().order_by('pk')
+            .values_list('pk', 'status', 'payment_status', 'reservation_expires_at')
+        )
+        changes = {}  # pk -> ({field: (old, new)}, reservation_expires_at)
+        rejected = {}
+        for pk, current_status, current_payment, reserved_until in rows:
+            reason = _check(current_status, current_payment, status, payment_status)
+            if reason:
+                rejected[pk] = reason
+                continue
+            change = {}
+            if payment_status and payment_status != current_payment:
+                change['payment_status'] = (current_payment, payment_status)
+            if status and status != current_status:
+                change['status'] = (current_status, status)
+            elif payment_status == 'paid' and current_status == 'pending' and 'payment_status' in change:
+                change['status'] = (current_status, 'processing')
+            if change:
+                changes[pk] = (change, reserved_until)
+        if rejected and strict:
+            raise InvalidTransition({
+                'detail': InvalidTransition.default_detail,
+                'orders': {str(pk): reason for pk, reason in rejected.items()},
+            })
+        if not changes:
+            return []
+
+        now = timezone.now()
+        groups = defaultdict(list)
+        released = []
+        for pk, (change, reserved_until) in changes.items():
+            fields = {field: new for field, (_, new) in change.items()}
+            if reserved_until is not None and (fields.get('payment_status') == 'paid' or fields.get('status') == 'cancelled'):
+                # Paid: the reserved stock is sold for good. Cancelled: it goes back on sale.
+                fields['reservation_expires_at'] = None
+                if fields.get('status') == 'cancelled' and fields.get('payment_status') != 'paid':
+                    released.append(pk)
+            groups[tuple(sorted(fields.items()))].append(pk)
+        for fields, pks in groups.items():
+            Order.objects.filter(pk__in=pks).update(**dict(fields), updated_at=now)
+        if released:
+            reservations.return_stock(released)
+
+        OrderEvent.objects.bulk_create([
+            OrderEvent(
+                order_id=pk, field=field, from_value=old, to_value=new, actor=actor,
+                source=source, note=note[:255], dispatch_after=now,
+            )
+            for pk, (change, _) in changes.items()
+            for field, (old, new) in change.items()
+        ])
+        transaction.on_commit(_kick)
+    return list(changes)
+
+
+def _kick():
+    global _kick_queued
+    if not getattr(settings, 'ORDER_EVENTS_ASYNC', True):
+        dispatch()
+        return
+    with _kick_lock:
+        if _kick_queued:
+            return
+        _kick_queued = True
+    _get_executor().submit(_dispatch_in_worker)
+
+
+def _dispatch_in_worker():
+    global _kick_queued
+    with _kick_lock:
+        # Kicks arriving from here on queue another pass for events added during this one
+        _kick_queued = False
+    try:
+        dispatch()
+    except Exception:
+        logger.exception("Dispatching order events failed")
+    finally:
+        connection.close()
+
+
+def _claim(batch_size, queryset):
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            queryset.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True, dispatch_after__lte=now).order_by('pk')[:batch_size]
+        )
+        if events:
+            OrderEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                dispatch_after=now + timedelta(seconds=CLAIM_SECONDS)
+            )
+    return events
+
+
+def notifications(events):
+    """The push notifications and SMS texts for a batch of events: ``(pushes, {message: [phone numbers]})``."""
+    order_ids = {event.order_id for event in events}
+    buyers = dict(Order.objects.filter(pk__in=order_ids).values_list('pk', 'buyer_id'))
+    phones = dict(Order.objects.filter(pk__in=order_ids).exclude(buyer__phone_number__isnull=True)
+                  .exclude(buyer__phone_number='').values_list('pk', 'buyer__phone_number'))
+    paid = [event.order_id for event in events if event.field == 'payment_status' and event.to_value == 'paid']
+    sellers = defaultdict(set)
+    for order_id, seller_id in OrderItem.objects.filter(order_id__in=paid, product__isnull=False) \
+            .values_list('order_id', 'product__seller_id').distinct():
+        sellers[order_id].add(seller_id)
+
+    pushes = []
+    texts = defaultdict(list)
+    sms_statuses = getattr(settings, 'ORDER_SMS_STATUSES', ('shipped',))
+    for event in events:
+        if event.order_id not in buyers:
+            continue  # deleted since
+        data = {'type': 'order', 'orderId': str(event.order_id)}
+        if event.field == 'status' and event.to_value in ORDER_STATUS_MESSAGES:
+            pushes.append({'user_id': buyers[event.order_id], 'title': 'Order Update',
+                           'body': ORDER_STATUS_MESSAGES[event.to_value], 'data': data, 'type': 'order'})
+            if event.to_value in sms_statuses and event.to_value in SMS_MESSAGES and event.order_id in phones:
+                texts[SMS_MESSAGES[event.to_value]].append(phones[event.order_id])
+        elif event.field == 'payment_status' and event.to_value == 'paid':
+            pushes.append({'user_id': buyers[event.order_id], 'title': 'Payment Confirmed ✅',
+                           'body': f'Payment for order #{event.order_id} was successful',
+                           'data': {**data, 'type': 'payment'}, 'type': 'payment'})
+            for seller_id in sorted(sellers[event.order_id]):
+                pushes.append({'user_id': seller_id, 'title': 'New Order! 🎉',
+                               'body': f'Order #{event.order_id} has been paid', 'data': data, 'type': 'order'})
+    return pushes, texts
+
+
+def dispatch_batch(batch_size=500, queryset=None):
+    """Run the side effects of one batch of due events (of ``queryset``). Returns the number dispatched."""
+    events = _claim(batch_size, OrderEvent.objects.all() if queryset is None else queryset)
+    if not events:
+        return 0
+    counted = sorted({
+        event.order_id for event in events
+        if 'paid' in (event.from_value, event.to_value) or 'cancelled' in (event.from_value, event.to_value)
+    })
+    try:
+        for start in range(0, len(counted), 500):
+            rollups.refresh(counted[start:start + 500])
+    except Exception:
+        # The sweeper (refresh_sales_rollups) picks these orders up again
+        logger.exception("Refreshing sales rollups of %s orders failed", len(counted))
+    pushes, texts = notifications(events)
+    # Push and SMS failures are logged (NotificationLog for push) and not retried
+    PushNotificationService.send_many(pushes)
+    for message, phone_numbers in texts.items():
+        send_bulk_sms(sorted(set(phone_numbers)), message)
+    OrderEvent.objects.filter(pk__in=[event.pk for event in events]).update(dispatched_at=timezone.now())
+    return len(events)
+
+
+def dispatch(batch_size=500, queryset=None):
+    """Dispatch batches until nothing (of ``queryset``) is due. Returns the number of events dispatched."""
+    dispatched = 0
+    while True:
+        batch = dispatch_batch(batch_size, queryset)
+        if not batch:
+            return dispatched
+        dispatched += batch
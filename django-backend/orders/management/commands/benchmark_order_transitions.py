@@ -0,0 +1,96 @@
+import logging
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from orders import lifecycle
+from orders.models import Order, OrderEvent, OrderItem
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Time bulk order transitions through orders/transition/ (query count and latency per batch) '
+        'against changing the same orders one call at a time, then how long dispatching their side '
+        'effects takes. All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders per transition request')
+
+    def handle(self, *args, **options):
+        # Quiet the warning for the deliberately rejected batch below
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        # Nothing commits, so the background dispatcher is never kicked: the side effects run inline below
+        with transaction.atomic():
+            self.benchmark(options['orders'], options['batch_size'])
+            transaction.set_rollback(True)
+
+    def benchmark(self, count, batch_size):
+        User = get_user_model()
+        admin = User.objects.create_user(email='transition-admin@example.com', password=None,
+                                         first_name='Transition', last_name='Admin', is_staff=True)
+        buyer = User.objects.create_user(email='transition-buyer@example.com', password=None,
+                                         first_name='Transition', last_name='Buyer')
+        product = Product.objects.create(name='Transition product', description='', price=10, category='Other',
+                                         condition='good', seller=admin, stock=1)
+        Order.objects.bulk_create([
+            Order(buyer=buyer, total=10, status='processing', payment_status='paid') for _ in range(count)
+        ], batch_size=1000)
+        order_ids = list(Order.objects.filter(buyer=buyer).order_by('pk').values_list('pk', flat=True))
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=pk, product=product, name=product.name, price=10, quantity=1, category='Other')
+            for pk in order_ids
+        ], batch_size=1000)
+        self.stdout.write(f'generated {len(order_ids)} paid orders')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        # All or nothing: one order that cannot be delivered yet rejects the batch
+        response = client.post('/api/orders/transition/', {'orders': order_ids[:10], 'status': 'delivered'}, format='json')
+        if response.status_code != 409 or Order.objects.filter(pk__in=order_ids, status='delivered').exists():
+            raise CommandError(f'An invalid batch answered {response.status_code} or changed orders')
+
+        half = len(order_ids) // 2
+        bulk, single = order_ids[:half], order_ids[half:]
+        latencies, query_counts = [], []
+        for start in range(0, len(bulk), batch_size):
+            batch = bulk[start:start + batch_size]
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.post('/api/orders/transition/', {'orders': batch, 'status': 'shipped'}, format='json')
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200 or len(response.data['changed']) != len(batch):
+                raise CommandError(f'Transition answered {response.status_code}: {response.data}')
+            query_counts.append(len(queries))
+        self.stdout.write(
+            f'bulk: {len(bulk)} orders shipped in batches of {batch_size}: '
+            f'{sum(latencies):.2f}s, median {statistics.median(latencies) * 1000:.0f} ms and '
+            f'{max(query_counts)} queries per batch ({len(bulk) / sum(latencies):,.0f} orders/s)'
+        )
+
+        started = time.perf_counter()
+        for pk in single:
+            lifecycle.transition(Order.objects.filter(pk=pk), status='shipped', actor=admin, source='admin')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'one at a time: {len(single)} orders shipped in {elapsed:.2f}s ({len(single) / elapsed:,.0f} orders/s)')
+
+        events = OrderEvent.objects.filter(order__buyer=buyer, to_value='shipped')
+        if events.count() != len(order_ids):
+            raise CommandError(f'{events.count()} events recorded for {len(order_ids)} changes')
+        started = time.perf_counter()
+        # Only these events: real ones waiting for the worker must not be sent from here
+        lifecycle.dispatch(queryset=OrderEvent.objects.filter(order__buyer=buyer))
+        elapsed = time.perf_counter() - started
+        if events.filter(dispatched_at__isnull=True).exists():
+            raise CommandError('Some events were not dispatched')
+        self.stdout.write(
+            f'side effects of {len(order_ids)} events dispatched in {elapsed:.2f}s '
+            '(no push tokens or phone numbers registered, so no Expo or SMS requests)'
+        )
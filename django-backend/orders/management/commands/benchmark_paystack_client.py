@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+import requests
+
+from orders import paystack
+from orders.paystack_stub import StubServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the Paystack client against the local stub: pooled vs. per-call connections '
+        'on a healthy API, retries on a flaky one, and the circuit breaker on a hung one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=400)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--connect-ms', type=float, default=60,
+                            help='Stub delay per new connection, standing in for the TLS handshake')
+        parser.add_argument('--latency-ms', type=float, default=20, help='Stub latency for every scenario')
+        parser.add_argument('--error-rate', type=float, default=0.3, help='Share of 500s in the flaky scenario')
+        parser.add_argument('--read-timeout', type=float, default=0.5, help='Client read timeout in the hung scenario')
+
+    def handle(self, *args, **options):
+        # Every failed attempt is logged; the summary lines are what matter here
+        logging.getLogger('orders.paystack').setLevel(logging.CRITICAL)
+        server = StubServer(connect_ms=options['connect_ms'], latency_ms=options['latency_ms'], jitter_ms=options['latency_ms'] / 2,
+                            hang_seconds=options['read_timeout'] * 4, verify_unknown=True)
+        server.start()
+        try:
+            with override_settings(PAYSTACK_BASE_URL=server.url, PAYSTACK_BACKOFF_SECONDS=0.05):
+                self.stdout.write('healthy API')
+                self.run('  new connection per call', options, self.call_unpooled(server.url))
+                self.run('  pooled client', options, paystack.verify)
+
+                server.configure(error_rate=options['error_rate'])
+                self.stdout.write(f'flaky API ({options["error_rate"]:.0%} of answers are 500s)')
+                with override_settings(PAYSTACK_RETRIES=0, PAYSTACK_BREAKER_FAILURES=10 ** 6):
+                    self.run('  no retries', options, paystack.verify)
+                with override_settings(PAYSTACK_BREAKER_FAILURES=10 ** 6):
+                    self.run('  with retries', options, paystack.verify)
+
+                server.configure(error_rate=0, hang_rate=1)
+                self.stdout.write(f'hung API (read timeout {options["read_timeout"]}s)')
+                with override_settings(PAYSTACK_READ_TIMEOUT=options['read_timeout']):
+                    with override_settings(PAYSTACK_BREAKER_FAILURES=10 ** 6):
+                        self.run('  without breaker', options, paystack.verify, calls=options['threads'] * 4)
+                    self.run('  with breaker', options, paystack.verify, calls=options['threads'] * 4)
+                    self.stdout.write(f'  circuit: {paystack.breaker.snapshot()}')
+                paystack.breaker.reset()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.stdout.write('cache-backed verify stats: ' + json.dumps(paystack.get_stats()['verify']))
+
+    def call_unpooled(self, base_url):
+        def call(reference):
+            # What the views did before: a fresh connection, and no timeout
+            return requests.get(f'{base_url}/transaction/verify/{reference}').json()
+        return call
+
+    def run(self, label, options, call, calls=None):
+        calls = calls or options['calls']
+        paystack.breaker.reset()
+
+        def one(index):
+            started = time.perf_counter()
+            try:
+                ok = bool(call(f'BENCH-{index}').get('status'))
+            except paystack.PaystackUnavailable:
+                ok = False
+            return ok, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            results = list(executor.map(one, range(calls)))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for _, latency in results)
+        ok = sum(1 for success, _ in results if success)
+        self.stdout.write(
+            f'{label}: {ok}/{calls} ok in {elapsed:.2f}s ({calls / elapsed:,.0f}/s); '
+            f'p50 {statistics.median(latencies):.1f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms, '
+            f'max {latencies[-1]:.1f} ms'
+        )
@@ -0,0 +1,96 @@
+from datetime import timedelta
+import logging
+import random
+import secrets
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from orders import paystack, reconciliation
+from orders.models import Order
+from orders.paystack_stub import StubServer
+
+REFERENCE_PREFIX = 'LOADTEST-'
+# What Paystack reports for the generated orders, with weights
+STATES = (('success', 70), ('failed', 10), ('abandoned', 12), ('underpaid', 3), ('unknown', 5))
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconcile generated pending orders against the local Paystack stub and report the rate. '
+        'All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--latency-ms', type=float, default=100, help='Stub latency per verify call')
+        parser.add_argument('--error-rate', type=float, default=0.02, help='Share of stub answers that are 500s')
+
+    def handle(self, *args, **options):
+        # Every retried call and underpaid order is logged; the summary is what matters here
+        for name in ('orders.paystack', 'orders.reconciliation'):
+            logging.getLogger(name).setLevel(logging.CRITICAL)
+        server = StubServer(connect_ms=60, latency_ms=options['latency_ms'], jitter_ms=options['latency_ms'] / 2,
+                            error_rate=options['error_rate'])
+        server.start()
+        try:
+            # The verify calls run in other threads, but every query runs in this one
+            with transaction.atomic():
+                self.benchmark(server, options)
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def benchmark(self, server, options):
+        buyer = get_user_model().objects.create_user(
+            email='reconcile-load@example.com', password=None, first_name='Load', last_name='Test'
+        )
+        expected = self.create_orders(buyer, options['orders'], server)
+        paystack.breaker.reset()
+        with override_settings(PAYSTACK_BASE_URL=server.url, PAYSTACK_BACKOFF_SECONDS=0.05):
+            started = time.perf_counter()
+            # Only the generated orders: real pending ones must not be checked against the stub
+            report = reconciliation.reconcile(
+                older_than=timedelta(minutes=15), batch_size=options['batch_size'], concurrency=options['concurrency'],
+                queryset=Order.objects.filter(buyer=buyer),
+            )
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'reconciled {report["checked"]} orders in {elapsed:.1f}s ({report["checked"] / elapsed:,.0f}/s) '
+            f'at concurrency {options["concurrency"]}, {options["latency_ms"]:.0f} ms stub latency'
+        )
+        self.stdout.write('  ' + ', '.join(f'{outcome} {report[outcome]}' for outcome in reconciliation.OUTCOMES))
+        paid = Order.objects.filter(buyer=buyer, payment_status='paid').count()
+        failed = Order.objects.filter(buyer=buyer, payment_status='failed').count()
+        ok = paid == expected['success'] and failed == expected['failed']
+        style = self.style.SUCCESS if ok else self.style.ERROR
+        self.stdout.write(style(
+            f'{paid} paid (expected {expected["success"]}), {failed} failed (expected {expected["failed"]})'
+        ))
+
+    def create_orders(self, buyer, count, server):
+        rng = random.Random(11)
+        created = timezone.now() - timedelta(hours=1)
+        orders, expected = [], {state: 0 for state, _ in STATES}
+        states, weights = zip(*STATES)
+        for _ in range(count):
+            total = rng.randint(5, 500)
+            reference = f'{REFERENCE_PREFIX}{secrets.token_hex(8)}'
+            state = rng.choices(states, weights)[0]
+            expected[state] += 1
+            if state == 'underpaid':
+                server.seed(reference, total * 100 - 100, 'success')
+            elif state != 'unknown':
+                server.seed(reference, total * 100, state)
+            orders.append(Order(buyer=buyer, total=total, paystack_reference=reference))
+        Order.objects.bulk_create(orders, batch_size=1000)
+        # created_at is auto_now_add; age the orders past the reconciliation cutoff
+        Order.objects.filter(buyer=buyer).update(created_at=created)
+        return expected
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders import reservations, rollups
+from orders.models import Order, OrderItem, SellerSalesDay
+from products.models import Product
+
+CATEGORIES = ('Books', 'Electronics', 'Clothing', 'Furniture', 'Other')
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a year of orders, backfill the seller sales rollups, check them against the orders, '
+        'then time incremental updates and the 90-day dashboard. All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--sellers', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200, help='Dashboard requests to time')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.benchmark(options['orders'], options['sellers'], options['requests'])
+            transaction.set_rollback(True)
+
+    def benchmark(self, count, seller_count, requests):
+        User = get_user_model()
+        buyer = User.objects.create_user(email='rollup-buyer@example.com', password=None, first_name='Load', last_name='Test')
+        sellers = [
+            User.objects.create_user(email=f'rollup-seller-{n}@example.com', password=None,
+                                     first_name='Seller', last_name=str(n), role='seller')
+            for n in range(seller_count)
+        ]
+        orders = self.create_orders(buyer, sellers, count)
+        started = time.perf_counter()
+        # Only the generated orders: real ones are left to refresh_sales_rollups
+        changed = rollups.backfill(queryset=Order.objects.filter(buyer=buyer))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'backfilled {changed} orders in {elapsed:.2f}s ({changed / elapsed:,.0f}/s)')
+        self.check_against_orders(sellers)
+
+        # Incremental: cancel some paid orders the way the reservation sweeper would. Nothing
+        # commits, so the event dispatcher never runs; refresh their rollups as it would.
+        sample = random.Random(3).sample(orders, min(500, len(orders)))
+        Order.objects.filter(pk__in=[order.pk for order in sample]).update(reservation_expires_at=timezone.now())
+        started = time.perf_counter()
+        for order in sample:
+            reservations.release(order)
+            rollups.refresh([order.pk])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'cancelled {len(sample)} orders one by one, rollups included, in {elapsed:.2f}s')
+        self.check_against_orders(sellers)
+
+        self.time_dashboard(sellers, requests)
+
+    def create_orders(self, buyer, sellers, count):
+        rng = random.Random(7)
+        Product.objects.bulk_create([
+            Product(name=f'Rollup product {n}', description='', price=rng.randint(5, 300), category=rng.choice(CATEGORIES),
+                    condition='good', seller=rng.choice(sellers), stock=10 ** 6)
+            for n in range(len(sellers) * 10)
+        ])
+        products = list(Product.objects.filter(seller__in=sellers))
+        orders = Order.objects.bulk_create([
+            Order(buyer=buyer, total=0, status='processing' if rng.random() < 0.8 else 'cancelled',
+                  payment_status='paid' if rng.random() < 0.85 else 'pending')
+            for _ in range(count)
+        ], batch_size=1000)
+        orders = list(Order.objects.filter(buyer=buyer).order_by('pk'))
+        items, now = [], timezone.now()
+        for order in orders:
+            for product in rng.sample(products, rng.randint(1, 3)):
+                items.append(OrderItem(order=order, product=product, seller_id=product.seller_id, name=product.name,
+                                       price=product.price, quantity=rng.randint(1, 3), category=product.category))
+        OrderItem.objects.bulk_create(items, batch_size=1000)
+        # Spread the orders over the last year (created_at is auto_now_add)
+        days = defaultdict(list)
+        for order in orders:
+            days[rng.randint(0, 364)].append(order.pk)
+        for day, pks in days.items():
+            Order.objects.filter(pk__in=pks).update(created_at=now - timedelta(days=day))
+        self.stdout.write(f'generated {len(orders)} orders with {len(items)} items for {len(sellers)} sellers')
+        return [order for order in Order.objects.filter(buyer=buyer, status='processing', payment_status='paid')]
+
+    def check_against_orders(self, sellers):
+        """The rollup totals must equal the same sums computed from the orders."""
+        expected = dict(
+            OrderItem.objects.filter(seller__in=sellers, order__payment_status='paid')
+            .exclude(order__status='cancelled').values('seller_id')
+            .annotate(revenue=Sum(F('price') * F('quantity'))).values_list('seller_id', 'revenue')
+        )
+        actual = dict(
+            SellerSalesDay.objects.filter(seller__in=sellers, category=SellerSalesDay.ALL).values('seller_id')
+            .annotate(revenue=Sum('gross_revenue')).values_list('seller_id', 'revenue')
+        )
+        for seller in sellers:
+            if Decimal(expected.get(seller.pk) or 0) != Decimal(actual.get(seller.pk) or 0):
+                raise CommandError(f'Seller {seller.pk}: rollups say {actual.get(seller.pk)}, orders say {expected.get(seller.pk)}')
+        self.stdout.write(self.style.SUCCESS('  rollups match the orders'))
+
+    def time_dashboard(self, sellers, requests):
+        client = APIClient()
+        client.force_authenticate(sellers[0])
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get('/api/orders/sales/summary/?days=90')
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'Dashboard answered {response.status_code}')
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/orders/sales/summary/?days=90')
+        latencies.sort()
+        self.stdout.write(
+            f'90-day dashboard: p50 {statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms '
+            f'(full request), {len(queries)} queries'
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders import lifecycle
+from orders.models import OrderEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the side effects (sales rollups, push, SMS) of recorded order status changes, '
+        'including events left behind by a background worker that died'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Keep dispatching every --interval seconds')
+        parser.add_argument('--interval', type=int, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            dispatched = lifecycle.dispatch(options['batch_size'])
+            elapsed = time.perf_counter() - started
+            if dispatched or not options['loop']:
+                waiting = OrderEvent.objects.filter(dispatched_at__isnull=True).count()
+                rate = f' ({dispatched / elapsed:,.0f}/s)' if dispatched and elapsed else ''
+                self.stdout.write(self.style.SUCCESS(
+                    f'Dispatched {dispatched} order events{rate}, {waiting} undispatched.'
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
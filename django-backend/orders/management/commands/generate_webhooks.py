@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+import secrets
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+import requests
+
+from orders import payment_events
+from orders.models import Order, PaymentEvent
+
+REFERENCE_PREFIX = 'LOADTEST-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the Paystack webhook inbox: send signed charge events (with retried '
+        'duplicates) for generated orders, report acknowledgement latency and throughput, '
+        'then apply the events and report that rate. Runs in a scratch copy of the database '
+        '(created, migrated and dropped like the test runner\'s), never in the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--rate', type=float, default=0, help='Target events/sec (0: as fast as possible)')
+        parser.add_argument('--duplicates', type=float, default=0.1, help='Share of deliveries that repeat an earlier event')
+        parser.add_argument(
+            '--url', help='Webhook URL of a running server to load instead of calling the view in-process. Only '
+                          'acknowledgements are measured; no orders are generated, so the server stores the events '
+                          'in its own database without matching them.',
+        )
+
+    def handle(self, *args, **options):
+        if options['url']:
+            rng = random.Random(5)
+            payments = [(f'{REFERENCE_PREFIX}{secrets.token_hex(8)}', rng.randint(5, 500)) for _ in range(options['orders'])]
+            self.send(self.build_bodies(payments, options['events'], options['duplicates']), options)
+            return
+        # The webhook view runs in several threads, each with its own connection, so the
+        # orders must be committed: a scratch database instead of a rolled-back transaction
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run_in_process(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_in_process(self, options):
+        orders = self.create_orders(options['orders'])
+        payments = [(order.paystack_reference, order.total) for order in orders]
+        bodies = self.build_bodies(payments, options['events'], options['duplicates'])
+        # Apply the events after the load instead of alongside it, to time both
+        with override_settings(PAYMENT_EVENTS_ASYNC=False):
+            self.send(bodies, options)
+        started = time.perf_counter()
+        applied, retrying = payment_events.drain()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'applied {applied} events in {elapsed:.2f}s ({applied / elapsed:,.0f}/s), {retrying} to retry')
+        stored = PaymentEvent.objects.filter(reference__startswith=REFERENCE_PREFIX).count()
+        paid = Order.objects.filter(pk__in=[order.pk for order in orders], payment_status='paid').count()
+        self.stdout.write(self.style.SUCCESS(f'{stored} distinct events stored; {paid}/{len(orders)} orders paid'))
+
+    def create_orders(self, count):
+        buyer = get_user_model().objects.create_user(
+            email='webhook-load@example.com', password=None, first_name='Load', last_name='Test'
+        )
+        Order.objects.bulk_create([
+            Order(buyer=buyer, total=random.randint(5, 500), paystack_reference=f'{REFERENCE_PREFIX}{secrets.token_hex(8)}')
+            for _ in range(count)
+        ])
+        return list(Order.objects.filter(buyer=buyer))
+
+    def build_bodies(self, payments, count, duplicates):
+        """Webhook bodies for ``payments`` (``(reference, total)`` pairs)."""
+        rng = random.Random(7)
+        bodies = []
+        for n in range(count):
+            if bodies and rng.random() < duplicates:
+                bodies.append(rng.choice(bodies))
+                continue
+            reference, total = rng.choice(payments)
+            success = rng.random() < 0.9
+            bodies.append(json.dumps({
+                'event': 'charge.success' if success else 'charge.failed',
+                'data': {
+                    'id': 10 ** 9 + n,
+                    'reference': reference,
+                    'status': 'success' if success else 'failed',
+                    'amount': int(total * 100),
+                    'currency': 'GHS',
+                },
+            }).encode())
+        return bodies
+
+    def send(self, bodies, options):
+        local = threading.local()
+        rate = options['rate']
+        started = time.perf_counter()
+
+        def post(index):
+            if rate:
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            body = bodies[index]
+            headers = {'X-Paystack-Signature': payment_events.sign(body), 'Content-Type': 'application/json'}
+            sent = time.perf_counter()
+            if options['url']:
+                if not hasattr(local, 'session'):
+                    local.session = requests.Session()
+                status = local.session.post(options['url'], data=body, headers=headers, timeout=10).status_code
+            else:
+                if not hasattr(local, 'client'):
+                    local.client = Client()
+                status = local.client.post(
+                    '/api/orders/paystack-webhook/', data=body, content_type='application/json',
+                    HTTP_X_PAYSTACK_SIGNATURE=headers['X-Paystack-Signature'],
+                ).status_code
+            return status, (time.perf_counter() - sent) * 1000
+
+        def run(indexes):
+            try:
+                return [post(index) for index in indexes]
+            finally:
+                connection.close()
+
+        threads = options['threads']
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = [r for chunk in executor.map(run, [range(t, len(bodies), threads) for t in range(threads)]) for r in chunk]
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for _, latency in results)
+        errors = sum(1 for status, _ in results if status != 200)
+        self.stdout.write(
+            f'sent {len(bodies)} webhooks in {elapsed:.2f}s ({len(bodies) / elapsed:,.0f}/s), {errors} non-200; '
+            f'ack p50 {statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms'
+        )
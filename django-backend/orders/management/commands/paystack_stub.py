@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from orders.paystack_stub import StubServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a local stand-in for the Paystack API that can be made slow or failing. '
+        'Point PAYSTACK_BASE_URL at it to try the client and the payment views offline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--connect-ms', type=float, default=0, help='Delay per new connection (handshake cost)')
+        parser.add_argument('--latency-ms', type=float, default=0)
+        parser.add_argument('--jitter-ms', type=float, default=0)
+        parser.add_argument('--error-rate', type=float, default=0, help='Share of requests answered with a 500')
+        parser.add_argument('--hang-rate', type=float, default=0, help='Share of requests left unanswered')
+        parser.add_argument('--hang-seconds', type=float, default=30)
+        parser.add_argument('--reset-rate', type=float, default=0, help='Share of connections dropped without an answer')
+        parser.add_argument('--verify-unknown', action='store_true', help='Report unknown references as paid')
+        parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        server = StubServer(
+            (options['host'], options['port']),
+            connect_ms=options['connect_ms'], latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'], hang_rate=options['hang_rate'], hang_seconds=options['hang_seconds'], reset_rate=options['reset_rate'],
+            verify_unknown=options['verify_unknown'], verbose=options['verbose'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Paystack stub listening on {server.url}; set PAYSTACK_BASE_URL={server.url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
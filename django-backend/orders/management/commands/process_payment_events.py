@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders import payment_events
+from orders.models import PaymentEvent
+
+
+class Command(BaseCommand):
+    help = 'Apply stored Paystack webhook events to their orders, retrying events whose order was not found'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--loop', action='store_true', help='Keep draining the inbox every --interval seconds')
+        parser.add_argument('--interval', type=int, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            applied, retrying = payment_events.drain(options['batch_size'])
+            elapsed = time.perf_counter() - started
+            if applied or retrying or not options['loop']:
+                waiting = PaymentEvent.objects.filter(processed_at__isnull=True).count()
+                rate = f' ({applied / elapsed:,.0f}/s)' if applied and elapsed else ''
+                self.stdout.write(self.style.SUCCESS(
+                    f'Applied {applied} payment events{rate}, {retrying} to retry, {waiting} unprocessed.'
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,50 @@
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import reconciliation
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify the Paystack references of orders still pending payment, concurrently, '
+        'and mark them paid or failed in bulk'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15, help='Only orders created at least this many minutes ago')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20, help='Paystack calls in flight at once')
+        parser.add_argument('--limit', type=int, help='Check at most this many orders')
+        parser.add_argument('--dry-run', action='store_true', help='Report outcomes without updating orders')
+        parser.add_argument('--loop', action='store_true', help='Reconcile again every --interval seconds')
+        parser.add_argument('--interval', type=int, default=600)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            report = reconciliation.reconcile(
+                older_than=timedelta(minutes=options['older_than']), batch_size=options['batch_size'],
+                concurrency=options['concurrency'], limit=options['limit'], dry_run=options['dry_run'],
+            )
+            self.write_report(report, time.perf_counter() - started, options['dry_run'])
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def write_report(self, report, elapsed, dry_run):
+        checked = report['checked']
+        rate = f' ({checked / elapsed:,.0f}/s)' if checked and elapsed else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Dry run: " if dry_run else ""}checked {checked} pending orders in {elapsed:.1f}s{rate}'
+        ))
+        for outcome in reconciliation.OUTCOMES:
+            self.stdout.write(f'  {outcome:<14} {report[outcome]}')
+        if report['underpaid_references']:
+            self.stdout.write(self.style.WARNING(
+                'Underpaid: ' + ', '.join(report['underpaid_references'][:20])
+                + (' ...' if len(report['underpaid_references']) > 20 else '')
+            ))
+        if report['stopped_early']:
+            self.stdout.write(self.style.ERROR('Stopped early: Paystack is unavailable. The rest is left for the next run.'))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Bring the seller sales rollups up to date: count orders whose payment or status changed '
+        'without an order event, or backfill history (--rebuild recounts everything)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Orders (by primary key) scanned per query')
+        parser.add_argument('--rebuild', action='store_true', help='Drop the rollups and count every order again')
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            started = time.perf_counter()
+            changed = rollups.rebuild()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt the sales rollups from {changed} orders in {elapsed:.1f}s.'))
+            if not options['loop']:
+                return
+        while True:
+            started = time.perf_counter()
+            changed = rollups.backfill(options['chunk_size'], progress=self.progress if not options['loop'] else None)
+            elapsed = time.perf_counter() - started
+            if not options['loop']:
+                self.stdout.write('')  # past the progress line
+            if changed or not options['loop']:
+                rate = f' ({changed / elapsed:,.0f}/s)' if changed and elapsed else ''
+                self.stdout.write(self.style.SUCCESS(f'Counted {changed} changed orders in {elapsed:.1f}s{rate}.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def progress(self, done, total, changed):
+        self.stdout.write(f'  scanned up to order {done}/{total}, {changed} counted', ending='\r')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders import reservations
+
+
+class Command(BaseCommand):
+    help = 'Return the stock held by unpaid orders whose reservation expired, and cancel those orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping every --interval seconds')
+        parser.add_argument('--interval', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            released = reservations.release_expired()
+            if released or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from orders import payment_events
+from orders.models import PaymentEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue stored Paystack webhook events to be applied again (applying is idempotent), '
+        'then apply them unless --queue-only is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reference', action='append', default=[], help='Events for this payment reference (repeatable)')
+        parser.add_argument('--id', type=int, action='append', default=[], dest='ids', help='Event id (repeatable)')
+        parser.add_argument('--since', help='Events received at or after this ISO datetime')
+        parser.add_argument('--failed', action='store_true', help='Only events that ended with an error')
+        parser.add_argument('--queue-only', action='store_true')
+
+    def handle(self, *args, **options):
+        events = PaymentEvent.objects.all()
+        if options['reference']:
+            events = events.filter(reference__in=options['reference'])
+        if options['ids']:
+            events = events.filter(pk__in=options['ids'])
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since datetime: {options['since']}")
+            events = events.filter(received_at__gte=since)
+        if options['failed']:
+            events = events.exclude(last_error='')
+        if not any((options['reference'], options['ids'], options['since'], options['failed'])):
+            raise CommandError('Select events with --reference, --id, --since or --failed.')
+        queued = payment_events.replay(events)
+        self.stdout.write(f'Queued {queued} events.')
+        if not options['queue_only']:
+            applied, retrying = payment_events.drain()
+            self.stdout.write(self.style.SUCCESS(f'Applied {applied} events, {retrying} to retry.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_orderitem_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reservation_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+def blank_references_to_null(apps, schema_editor):
+    # Several orders may have no reference; only NULLs may repeat under the unique index
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(paystack_reference='').update(paystack_reference=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_history_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(blank_references_to_null, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='paystack_reference',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_key', models.CharField(max_length=200, unique=True)),
+                ('event', models.CharField(max_length=50)),
+                ('reference', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['next_attempt_at'], name='orders_paymentevent_due_idx')],
+            },
+        ),
+    ]
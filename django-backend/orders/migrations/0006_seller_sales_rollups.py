@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_payment_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='rollup_state',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.CreateModel(
+            name='SellerSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(max_length=50)),
+                ('gross_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('seller', 'date', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_item_seller(apps, schema_editor):
+    """Copy each product's seller onto its order items, one id range per transaction."""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    last_id = 0
+    while True:
+        ids = list(OrderItem.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:BACKFILL_BATCH_SIZE])
+        if not ids:
+            return
+        with transaction.atomic():
+            OrderItem.objects.filter(pk__gte=ids[0], pk__lte=ids[-1], product__isnull=False).update(
+                seller_id=Subquery(product.values('seller_id')[:1]),
+            )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Lets the backfill commit batch by batch (the new column is nullable, so adding it is instant)
+    atomic = False
+
+    dependencies = [
+        ('orders', '0007_order_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='seller',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_item_seller, migrations.RunPython.noop),
+    ]
@@ -26,17 +26,30 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='paystack')
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
-    paystack_reference = models.CharField(max_length=100, blank=True, null=True)
+    # Unique so webhook events find their order with one index lookup
+    paystack_reference = models.CharField(max_length=100, blank=True, null=True, unique=True)
     delivery_address = models.TextField(blank=True, null=True)
+    # Set while the items' stock is held for an unpaid order (see orders/reservations.py)
+    reservation_expires_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    # What the seller sales rollups currently count this order as (see orders/rollups.py)
+    rollup_state = models.CharField(max_length=10, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Order history: one buyer's orders, newest first
+            models.Index(fields=['buyer', '-created_at']),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.buyer.email}"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    # Copied from the product, so the sale stays the seller's if the product is deleted (see orders/rollups.py)
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
@@ -44,5 +57,96 @@ class OrderItem(models.Model):
     seller_name = models.CharField(max_length=255, blank=True, null=True)
     category = models.CharField(max_length=50, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # A seller's products -> the orders containing them, without reading item rows
+            models.Index(fields=['product', 'order']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.name} (Order #{self.order_id})"
+
+class PaymentEvent(models.Model):
+    """
+    A Paystack webhook delivery, stored as received (see orders/payment_events.py).
+
+    The webhook only verifies the signature and inserts the row; events are applied
+    to their orders afterwards. ``event_key`` is unique, so Paystack's retried
+    deliveries of the same event are stored (and applied) once.
+    """
+    event_key = models.CharField(max_length=200, unique=True)
+    event = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The worker's queue: unprocessed events that are due, oldest first
+            models.Index(fields=['next_attempt_at'], name='orders_paymentevent_due_idx',
+                         condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for {self.reference or '?'} ({'processed' if self.processed_at else 'pending'})"
+
+class SellerSalesDay(models.Model):
+    """
+    One seller's sales in one category on one day, kept up to date as orders are paid
+    or cancelled (see orders/rollups.py). The row with ``category=ALL`` holds the
+    seller's totals for the day, so an order spanning categories counts once there.
+    """
+    ALL = '*'
+
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sales_days')
+    date = models.DateField()
+    category = models.CharField(max_length=50)
+    gross_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        # Also the dashboard's index: one seller's days in a date range
+        unique_together = ('seller', 'date', 'category')
+
+    def __str__(self):
+        return f"Seller {self.seller_id} sales on {self.date} ({self.category})"
+
+class OrderEvent(models.Model):
+    """
+    One change of an order's ``status`` or ``payment_status``, appended by
+    orders/lifecycle.py in the transaction that made it. Events are never edited;
+    ``dispatched_at`` only records that their side effects (rollups, push, SMS) ran.
+    """
+    FIELD_CHOICES = [
+        ('status', 'Status'),
+        ('payment_status', 'Payment status'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    from_value = models.CharField(max_length=20)
+    to_value = models.CharField(max_length=20)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # What made the change: webhook, verify, reconciliation, reservation, seller, admin, ...
+    source = models.CharField(max_length=30, blank=True)
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatch_after = models.DateTimeField()
+    dispatched_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher's queue: undispatched events that are due, oldest first
+            models.Index(fields=['dispatch_after'], name='orders_orderevent_due_idx',
+                         condition=models.Q(dispatched_at__isnull=True)),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.name} (Order #{self.order.id})"
+        return f"Order #{self.order_id} {self.field}: {self.from_value} -> {self.to_value}"
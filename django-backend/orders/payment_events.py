@@ -0,0 +1,238 @@
+"""
+Paystack webhook inbox.
+
+``PaystackWebhookView`` checks the ``X-Paystack-Signature`` HMAC, inserts the body into
+``PaymentEvent`` (``INSERT ... ON CONFLICT DO NOTHING`` on ``event_key``, so retried
+deliveries are dropped) and answers 200 straight away. Events are applied to their
+orders afterwards by
+
+* a single background worker kicked after the insert, and
+* ``python manage.py process_payment_events``, which also retries events whose
+  order could not be found yet, with exponential backoff.
+
+Events are applied in the order they were received, and applying one is
+idempotent and only ever moves an order forward (a late ``charge.failed`` never
+undoes a payment), so replaying events with ``python manage.py replay_payment_events``
+is safe.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import hashlib
+import hmac
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import lifecycle
+from .models import Order, PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'HTTP_X_PAYSTACK_SIGNATURE'
+CLAIM_SECONDS = 120  # a claimed batch is retried by someone else if its worker dies
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 3600
+
+_executor = None
+_kick_lock = threading.Lock()
+_kick_queued = False
+
+
+class OrderNotFound(Exception):
+    pass
+
+
+def _get_executor():
+    # One worker, so events are applied in the order they were received
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='payment-events')
+    return _executor
+
+
+def sign(body, secret=None):
+    """The ``X-Paystack-Signature`` value for a raw request body."""
+    secret = secret if secret is not None else settings.PAYSTACK_SECRET_KEY
+    return hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+
+
+def signature_is_valid(body, signature):
+    return bool(signature) and hmac.compare_digest(sign(body), signature)
+
+
+def event_key(payload):
+    """What identifies one Paystack event across retried deliveries."""
+    data = payload.get('data') or {}
+    return f"{payload.get('event', '')}:{data.get('id') or data.get('reference') or ''}"[:200]
+
+
+def record(payload):
+    """Store a verified webhook payload; a repeat delivery of a stored event is ignored."""
+    data = payload.get('data') or {}
+    PaymentEvent.objects.bulk_create(
+        [PaymentEvent(
+            event_key=event_key(payload),
+            event=str(payload.get('event', ''))[:50],
+            reference=str(data.get('reference') or '')[:100],
+            payload=payload,
+            next_attempt_at=timezone.now(),
+        )],
+        ignore_conflicts=True,
+    )
+    if getattr(settings, 'PAYMENT_EVENTS_ASYNC', True):
+        transaction.on_commit(_kick)
+
+
+def _kick():
+    global _kick_queued
+    with _kick_lock:
+        if _kick_queued:
+            return
+        _kick_queued = True
+    _get_executor().submit(_drain_in_worker)
+
+
+def mark_paid(order, data, source='webhook', actor=None):
+    """
+    Apply a successful charge to ``order``. Returns False (and leaves the order alone) if
+    the amount paid does not cover the order total.
+    """
+    if order.payment_status == 'paid':
+        # Payment is never undone, so an in-memory 'paid' is current
+        return True
+    amount = data.get('amount')
+    if amount is not None and Decimal(amount) < order.total * 100:
+        logger.error("Paystack charge %s for order %s paid %s, expected %s",
+                     data.get('reference'), order.pk, amount, order.total * 100)
+        return False
+    updated = set_paid(Order.objects.filter(pk=order.pk), source, actor)
+    if updated and order.status == 'cancelled':
+        logger.warning("Order %s was paid after it was cancelled", order.pk)
+    order.payment_status = 'paid'
+    order.reservation_expires_at = None
+    return True
+
+
+def mark_failed(order, source='webhook'):
+    if order.payment_status != 'pending':
+        return
+    set_failed(Order.objects.filter(pk=order.pk), source)
+    order.payment_status = 'failed'
+
+
+def set_paid(queryset, source, actor=None):
+    """Mark the orders in ``queryset`` paid (see lifecycle.py). Returns how many were not paid yet."""
+    # Not strict: replays and out-of-order deliveries change nothing
+    return len(lifecycle.transition(queryset, payment_status='paid', actor=actor, source=source, strict=False))
+
+
+def set_failed(queryset, source):
+    """Mark the orders in ``queryset`` whose payment is still pending failed. Returns how many changed."""
+    return len(lifecycle.transition(queryset.filter(payment_status='pending'), payment_status='failed',
+                                    source=source, strict=False))
+
+
+def apply(event, order):
+    """Apply one event to its order (None if not found). Raises ``OrderNotFound`` to retry later."""
+    if event.event not in ('charge.success', 'charge.failed'):
+        return ''
+    if order is None:
+        raise OrderNotFound(f'No order with reference {event.reference!r}')
+    data = event.payload.get('data') or {}
+    if event.event == 'charge.success' and data.get('status') == 'success':
+        if not mark_paid(order, data):
+            return 'Amount paid does not cover the order total'
+    elif event.event == 'charge.failed':
+        mark_failed(order)
+    return ''
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, next_attempt_at__lte=now).order_by('pk')[:batch_size]
+        )
+        if events:
+            PaymentEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+            )
+    return events
+
+
+def process_batch(batch_size=200):
+    """Apply one batch of due events. Returns ``(applied, retrying)``."""
+    events = _claim(batch_size)
+    if not events:
+        return 0, 0
+    references = {event.reference for event in events if event.reference}
+    orders = Order.objects.in_bulk(references, field_name='paystack_reference')
+    now = timezone.now()
+    done, retry = [], []
+    # One transaction per batch (fewer commits); a savepoint per event isolates failures
+    with transaction.atomic():
+        for event in events:
+            try:
+                with transaction.atomic():
+                    event.last_error = apply(event, orders.get(event.reference))
+            except Exception as e:
+                event.attempts += 1
+                event.last_error = f'{type(e).__name__}: {e}'
+                if event.attempts >= MAX_ATTEMPTS:
+                    logger.error("Giving up on payment event %s: %s", event.pk, event.last_error)
+                    event.processed_at = now
+                else:
+                    event.next_attempt_at = now + timedelta(seconds=min(2 ** event.attempts * 15, MAX_BACKOFF_SECONDS))
+                    retry.append(event)
+                    continue
+            else:
+                event.processed_at = now
+            done.append(event)
+        # Plain tuples: bulk_update's CASE expressions cost more than applying the events
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {PaymentEvent._meta.db_table} SET processed_at = %s, attempts = %s, last_error = %s, "
+                "next_attempt_at = %s WHERE id = %s",
+                [
+                    (
+                        connection.ops.adapt_datetimefield_value(event.processed_at), event.attempts, event.last_error,
+                        connection.ops.adapt_datetimefield_value(event.next_attempt_at), event.pk,
+                    )
+                    for event in done + retry
+                ],
+            )
+    return len(done), len(retry)
+
+
+def drain(batch_size=200):
+    """Process batches until nothing is due. Returns ``(applied, retrying)``."""
+    applied = retrying = 0
+    while True:
+        batch_applied, batch_retrying = process_batch(batch_size)
+        if not batch_applied and not batch_retrying:
+            return applied, retrying
+        applied += batch_applied
+        retrying += batch_retrying
+
+
+def _drain_in_worker():
+    global _kick_queued
+    with _kick_lock:
+        # Kicks arriving from here on queue another pass for events added during this one
+        _kick_queued = False
+    try:
+        drain()
+    except Exception:
+        logger.exception("Payment event drain failed")
+    finally:
+        connection.close()
+
+
+def replay(queryset):
+    """Queue already processed events to be applied again. Returns how many were queued."""
+    return queryset.update(processed_at=None, attempts=0, last_error='', next_attempt_at=timezone.now())
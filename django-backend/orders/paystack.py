@@ -0,0 +1,284 @@
+"""
+Paystack API client.
+
+Every call goes through one ``requests.Session`` per process, so connections (and
+their TLS sessions) to Paystack are kept alive and reused from a pool of
+``PAYSTACK_POOL_SIZE``. Each attempt is bounded by ``PAYSTACK_CONNECT_TIMEOUT`` and
+``PAYSTACK_READ_TIMEOUT``.
+
+Idempotent calls (``verify``) are retried up to ``PAYSTACK_RETRIES`` times on timeouts,
+connection errors, 429 and 5xx answers, sleeping a random time up to an exponentially
+growing cap between attempts ("full jitter"), so clients that failed together do not
+retry together. ``initialize`` is only retried when the connection could not be
+made, as the request then never reached Paystack.
+
+A circuit breaker counts consecutive failed attempts. After ``PAYSTACK_BREAKER_FAILURES``
+of them it opens, and calls fail straight away with ``PaystackUnavailable`` (a 503)
+instead of each tying up a worker for the full timeout. After
+``PAYSTACK_BREAKER_RESET_SECONDS`` a single trial call is let through, and its outcome
+closes or reopens the circuit. The breaker is per process.
+
+Attempt counts per outcome and a latency histogram are kept in the cache: shared by
+all processes with a shared cache (``REDIS_URL``), per process with the default
+LocMemCache. ``get_stats()`` reports them and ``PaystackStatsView`` serves them.
+``python manage.py paystack_stub`` runs a local stand-in for the API (see
+``orders/paystack_stub.py``) that can be made slow, flaky or unresponsive, and
+``python manage.py benchmark_paystack_client`` measures the client against it.
+"""
+from urllib.parse import quote
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ('initialize', 'verify')
+OUTCOMES = ('ok', 'client_error', 'server_error', 'timeout', 'connection_error', 'circuit_open')
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PaystackUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The payment provider is unavailable. Please try again shortly.'
+    default_code = 'paystack_unavailable'
+
+
+def _base_url():
+    return getattr(settings, 'PAYSTACK_BASE_URL', 'https://api.paystack.co').rstrip('/')
+
+
+def _timeout():
+    return (
+        getattr(settings, 'PAYSTACK_CONNECT_TIMEOUT', 3.05),
+        getattr(settings, 'PAYSTACK_READ_TIMEOUT', 10),
+    )
+
+
+def _retries():
+    return getattr(settings, 'PAYSTACK_RETRIES', 2)
+
+
+def _backoff_seconds():
+    return getattr(settings, 'PAYSTACK_BACKOFF_SECONDS', 0.25)
+
+
+def new_session(pool_size):
+    """A session keeping up to ``pool_size`` connections alive, for callers running that many calls at once."""
+    session = requests.Session()
+    # Retries are ours (they need to know about idempotency and the breaker)
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0))
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0))
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = new_session(getattr(settings, 'PAYSTACK_POOL_SIZE', 10))
+    return _session
+
+
+class CircuitBreaker:
+    """Closed -> (``failures`` in a row) -> open -> (``reset_seconds``) -> half-open -> closed/open."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def _threshold(self):
+        return getattr(settings, 'PAYSTACK_BREAKER_FAILURES', 5)
+
+    def _reset_seconds(self):
+        return getattr(settings, 'PAYSTACK_BREAKER_RESET_SECONDS', 30)
+
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self._reset_seconds():
+            return 'open'
+        return 'half_open'
+
+    def allow(self):
+        """Whether a call may go out now. In half-open state only one trial call at a time may."""
+        with self._lock:
+            state = self.state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def succeeded(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Paystack circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self._threshold()):
+                if self.opened_at is None:
+                    logger.error("Paystack circuit opened after %s failed calls", self.failures)
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self.state(), 'consecutive_failures': self.failures}
+
+
+breaker = CircuitBreaker()
+
+
+def _stat_key(endpoint, name):
+    return f'paystack:stats:{endpoint}:{name}'
+
+
+def _incr_stat(endpoint, name, delta=1):
+    key = _stat_key(endpoint, name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def _record(endpoint, outcome, elapsed_ms=None):
+    _incr_stat(endpoint, outcome)
+    if elapsed_ms is None:
+        return
+    _incr_stat(endpoint, 'ms', int(elapsed_ms))
+    bucket = next((f'le_{edge}' for edge in LATENCY_BUCKETS_MS if elapsed_ms <= edge), 'le_inf')
+    _incr_stat(endpoint, bucket)
+
+
+def _stat_names():
+    return (*OUTCOMES, 'retries', 'ms', *[f'le_{edge}' for edge in LATENCY_BUCKETS_MS], 'le_inf')
+
+
+def get_stats():
+    """Attempts per outcome, retries and a latency histogram per endpoint, plus this process's circuit."""
+    keys = [_stat_key(endpoint, name) for endpoint in ENDPOINTS for name in _stat_names()]
+    values = cache.get_many(keys)
+    stats = {}
+    for endpoint in ENDPOINTS:
+        raw = {name: values.get(_stat_key(endpoint, name), 0) for name in _stat_names()}
+        timed = sum(raw[name] for name in _stat_names() if name.startswith('le_'))
+        histogram, cumulative = {}, 0
+        for edge in (*LATENCY_BUCKETS_MS, 'inf'):
+            cumulative += raw[f'le_{edge}']
+            histogram[str(edge)] = cumulative
+        stats[endpoint] = {
+            'attempts': {outcome: raw[outcome] for outcome in OUTCOMES},
+            'retries': raw['retries'],
+            'avg_ms': raw['ms'] / timed if timed else 0,
+            # Cumulative, Prometheus style: attempts that took at most <key> ms
+            'latency_ms_le': histogram,
+            **{f'p{q}_ms_le': _quantile_bucket(histogram, timed, q / 100) for q in (50, 95, 99)},
+        }
+    stats['circuit'] = breaker.snapshot()
+    return stats
+
+
+def _quantile_bucket(histogram, total, q):
+    """Upper edge of the histogram bucket holding quantile ``q``."""
+    if not total:
+        return None
+    for edge, count in histogram.items():
+        if count >= q * total:
+            return edge
+
+
+def reset_stats():
+    cache.delete_many([_stat_key(endpoint, name) for endpoint in ENDPOINTS for name in _stat_names()])
+
+
+def _sleep_before_retry(attempt):
+    cap = _backoff_seconds() * 2 ** attempt
+    time.sleep(random.uniform(0, cap))
+
+
+def request(endpoint, method, path, idempotent, session=None, **kwargs):
+    """
+    Call Paystack and return the decoded JSON answer, which may report a rejection
+    (``{"status": false, ...}`` on a 4xx). Raises ``PaystackUnavailable`` if Paystack
+    could not be reached, answered with an error, or the circuit is open.
+    """
+    session = session or get_session()
+    headers = {'Authorization': f'Bearer {getattr(settings, "PAYSTACK_SECRET_KEY", "")}'}
+    url = _base_url() + path
+    attempts = 1 + _retries()
+    for attempt in range(attempts):
+        if not breaker.allow():
+            _record(endpoint, 'circuit_open')
+            raise PaystackUnavailable()
+        if attempt:
+            _incr_stat(endpoint, 'retries')
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, headers=headers, timeout=_timeout(), **kwargs)
+        except requests.ConnectTimeout as e:
+            # Never reached Paystack, so even a non-idempotent call can be retried
+            outcome, retry, error = 'timeout', True, e
+        except requests.Timeout as e:
+            outcome, retry, error = 'timeout', idempotent, e
+        except requests.ConnectionError as e:
+            outcome, retry, error = 'connection_error', idempotent, e
+        except requests.RequestException as e:
+            # Broken or undecodable answers, redirect loops...: failures too, so a half-open trial always ends
+            outcome, retry, error = 'connection_error', idempotent, e
+        else:
+            if response.status_code >= 500 or response.status_code == 429:
+                outcome, retry, error = 'server_error', idempotent, f'HTTP {response.status_code}'
+            else:
+                try:
+                    data = response.json()
+                except ValueError:
+                    outcome, retry, error = 'server_error', idempotent, f'HTTP {response.status_code}, not JSON'
+                else:
+                    # A 4xx with a JSON answer is Paystack working as intended
+                    breaker.succeeded()
+                    _record(endpoint, 'ok' if response.ok else 'client_error', (time.perf_counter() - started) * 1000)
+                    return data
+        breaker.failed()
+        _record(endpoint, outcome, (time.perf_counter() - started) * 1000)
+        logger.warning("Paystack %s attempt %s/%s failed: %s", endpoint, attempt + 1, attempts, error)
+        if not retry or attempt + 1 >= attempts:
+            break
+        _sleep_before_retry(attempt)
+    logger.error("Paystack %s failed after %s attempt(s)", endpoint, attempt + 1)
+    raise PaystackUnavailable()
+
+
+def initialize(payload):
+    """``POST /transaction/initialize``."""
+    return request('initialize', 'POST', '/transaction/initialize', idempotent=False, json=payload)
+
+
+def verify(reference, session=None):
+    """``GET /transaction/verify/<reference>``."""
+    path = f'/transaction/verify/{quote(str(reference), safe="")}'
+    return request('verify', 'GET', path, idempotent=True, session=session)
@@ -0,0 +1,153 @@
+"""
+A local stand-in for the two Paystack endpoints we call, for exercising
+``orders/paystack.py`` offline.
+
+``POST /transaction/initialize`` remembers the reference and amount, and
+``GET /transaction/verify/<reference>`` reports that transaction as paid (or answers
+400 for a reference it has not seen, as Paystack does). ``StubServer.seed()`` adds
+transactions in any state directly.
+
+Responses can be delayed and made to fail, which is what the client's timeouts,
+retries and breaker are for:
+
+* ``connect_ms``: delay once per new connection, standing in for the TCP and TLS
+  handshakes a real HTTPS connection costs,
+* ``latency_ms`` / ``jitter_ms``: delay before every answer,
+* ``error_rate``: share of requests answered with a 500,
+* ``hang_rate``: share of requests that get no answer for ``hang_seconds``,
+* ``reset_rate``: share of requests whose connection is dropped without an answer.
+
+Connections are kept alive (HTTP/1.1), like Paystack's.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import secrets
+import socket
+import threading
+import time
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body in one segment: on a kept-alive connection Nagle plus delayed ACKs
+    # would otherwise add ~40 ms to every answer
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def setup(self):
+        super().setup()
+        if self.server.connect_ms:
+            time.sleep(self.server.connect_ms / 1000)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _misbehave(self):
+        """Apply the configured delay and failure. Returns True if the request was answered or dropped."""
+        server = self.server
+        delay = server.latency_ms + random.uniform(0, server.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+        roll = random.random()
+        if roll < server.reset_rate:
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return True
+        roll -= server.reset_rate
+        if roll < server.hang_rate:
+            time.sleep(server.hang_seconds)
+            self.close_connection = True
+            return True
+        roll -= server.hang_rate
+        if roll < server.error_rate:
+            self._send(500, {'status': False, 'message': 'Internal server error (stub)'})
+            return True
+        return False
+
+    def _send(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self._misbehave():
+            return
+        if self.path != '/transaction/initialize':
+            return self._send(404, {'status': False, 'message': 'Not found'})
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return self._send(400, {'status': False, 'message': 'Invalid JSON'})
+        reference = payload.get('reference') or secrets.token_hex(8)
+        self.server.seed(reference, payload.get('amount'))
+        self._send(200, {
+            'status': True,
+            'message': 'Authorization URL created',
+            'data': {
+                'authorization_url': f'http://{self.headers.get("Host", "localhost")}/pay/{reference}',
+                'access_code': secrets.token_hex(6),
+                'reference': reference,
+            },
+        })
+
+    def do_GET(self):
+        if self._misbehave():
+            return
+        prefix = '/transaction/verify/'
+        if not self.path.startswith(prefix):
+            return self._send(404, {'status': False, 'message': 'Not found'})
+        reference = self.path[len(prefix):]
+        with self.server.lock:
+            transaction = self.server.transactions.get(reference)
+        if transaction is None:
+            if not self.server.verify_unknown:
+                return self._send(400, {'status': False, 'message': 'Transaction reference not found'})
+            transaction = {'amount': None, 'status': 'success'}
+        self._send(200, {
+            'status': True,
+            'message': 'Verification successful',
+            'data': {**transaction, 'reference': reference, 'currency': 'GHS'},
+        })
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), connect_ms=0, latency_ms=0, jitter_ms=0, error_rate=0, hang_rate=0,
+                 hang_seconds=30, reset_rate=0, verify_unknown=False, verbose=False):
+        super().__init__(address, _Handler)
+        self.lock = threading.Lock()
+        self.transactions = {}
+        self.verbose = verbose
+        # Answer verify for references never initialized here (amount unknown), e.g. for benchmarks
+        self.verify_unknown = verify_unknown
+        self.configure(connect_ms=connect_ms, latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate,
+                       hang_rate=hang_rate, hang_seconds=hang_seconds, reset_rate=reset_rate)
+
+    def configure(self, **behaviour):
+        """Change how the stub misbehaves while it runs."""
+        for name, value in behaviour.items():
+            setattr(self, name, value)
+
+    def seed(self, reference, amount, status='success'):
+        """Record a transaction, as ``verify`` will report it."""
+        with self.lock:
+            self.transactions[reference] = {'amount': amount, 'status': status}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve on a background thread. Returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, name='paystack-stub', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,147 @@
+"""
+Reconciliation of orders whose payment is still pending.
+
+A payment is normally settled by the Paystack webhook (``orders/payment_events.py``)
+or by the buyer's call to ``verify-payment/``. When both are missed the order stays
+pending. ``reconcile()`` walks pending orders older than a cutoff that have a Paystack
+reference, in primary-key batches. For each batch it
+
+* verifies the references concurrently: an asyncio semaphore caps the calls in
+  flight, and the blocking client (``orders/paystack.py``, with its timeouts, retries
+  and breaker) runs on an executor of the same size over a connection pool to match;
+* applies the outcomes with one ``UPDATE`` per outcome: ``success`` covering the
+  total marks the order paid, exactly as a ``charge.success`` webhook would, and
+  ``failed`` marks its payment failed. Anything else (abandoned, still ongoing, a
+  reference Paystack does not know) leaves the order pending.
+
+If the circuit breaker opens, the run stops after the current batch and the
+remaining orders are left for the next run. ``python manage.py reconcile_payments``
+runs this.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import asyncio
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import payment_events, paystack
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ('paid', 'failed', 'underpaid', 'still_pending', 'not_found', 'unavailable')
+
+
+def pending_orders(older_than, queryset=None):
+    queryset = Order.objects.all() if queryset is None else queryset
+    return (
+        queryset.filter(payment_status='pending', created_at__lt=timezone.now() - older_than)
+        .exclude(paystack_reference__isnull=True).exclude(paystack_reference='')
+    )
+
+
+async def _verify_all(references, concurrency, session, executor):
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def verify(reference):
+        async with semaphore:
+            try:
+                return reference, await loop.run_in_executor(executor, paystack.verify, reference, session)
+            except paystack.PaystackUnavailable:
+                return reference, None
+
+    return dict(await asyncio.gather(*(verify(reference) for reference in references)))
+
+
+def verify_concurrently(references, concurrency, session=None, executor=None):
+    """``{reference: verify answer}`` for ``references``, None where Paystack was unavailable."""
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='reconcile')
+    try:
+        return asyncio.run(_verify_all(references, concurrency, session or paystack.new_session(concurrency), executor))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def classify(order, answer):
+    """What a verify answer means for ``order``: one of ``OUTCOMES``."""
+    if answer is None:
+        return 'unavailable'
+    if not answer.get('status'):
+        return 'not_found'
+    data = answer.get('data') or {}
+    if data.get('status') == 'success':
+        amount = data.get('amount')
+        if amount is not None and Decimal(amount) < order.total * 100:
+            return 'underpaid'
+        return 'paid'
+    if data.get('status') == 'failed':
+        return 'failed'
+    return 'still_pending'
+
+
+def apply(orders, outcomes):
+    """Apply ``{order pk: outcome}`` to a batch of ``orders``, with one UPDATE per outcome."""
+    paid = [pk for pk, outcome in outcomes.items() if outcome == 'paid']
+    failed = [pk for pk, outcome in outcomes.items() if outcome == 'failed']
+    with transaction.atomic():
+        if paid:
+            payment_events.set_paid(Order.objects.filter(pk__in=paid), 'reconciliation')
+        if failed:
+            payment_events.set_failed(Order.objects.filter(pk__in=failed), 'reconciliation')
+    for order in orders:
+        if outcomes[order.pk] == 'underpaid':
+            logger.error("Paystack charge %s for order %s paid less than the total %s",
+                         order.paystack_reference, order.pk, order.total)
+        elif outcomes[order.pk] == 'paid' and order.status == 'cancelled':
+            logger.warning("Order %s was paid after it was cancelled", order.pk)
+
+
+def reconcile(older_than=timedelta(minutes=15), batch_size=500, concurrency=20, limit=None, dry_run=False,
+              queryset=None):
+    """
+    Verify and settle pending orders (of ``queryset``) older than ``older_than``. Returns a report dict:
+    a count per outcome, ``checked``, ``underpaid_references``, and ``stopped_early`` if
+    the breaker opened. With ``dry_run`` nothing is written.
+    """
+    counts = Counter()
+    underpaid = []
+    stopped_early = False
+    last_pk = 0
+    session = paystack.new_session(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='reconcile') as executor:
+        while limit is None or counts.total() < limit:
+            size = batch_size if limit is None else min(batch_size, limit - counts.total())
+            orders = list(
+                pending_orders(older_than, queryset).filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'status', 'total', 'paystack_reference')[:size]
+            )
+            if not orders:
+                break
+            last_pk = orders[-1].pk
+            answers = verify_concurrently(
+                [order.paystack_reference for order in orders], concurrency, session, executor
+            )
+            outcomes = {order.pk: classify(order, answers.get(order.paystack_reference)) for order in orders}
+            if not dry_run:
+                apply(orders, outcomes)
+            batch = Counter(outcomes.values())
+            counts.update(batch)
+            underpaid += [order.paystack_reference for order in orders if outcomes[order.pk] == 'underpaid']
+            if batch['unavailable'] and paystack.breaker.state() != 'closed':
+                logger.error("Paystack is unavailable; stopping reconciliation after %s orders", counts.total())
+                stopped_early = True
+                break
+    session.close()
+    return {
+        'checked': counts.total(),
+        **{outcome: counts[outcome] for outcome in OUTCOMES},
+        'underpaid_references': underpaid,
+        'stopped_early': stopped_early,
+    }
@@ -0,0 +1,164 @@
+"""
+Stock reservation for orders.
+
+Creating an order locks its products' rows in id order (so carts sharing products
+cannot deadlock) and takes its items out of ``Product.stock`` with a single conditional
+``UPDATE product SET stock = stock - <qty> WHERE id IN (...) AND stock >= <qty>``
+(``<qty>`` being a ``CASE`` on the product id), inside the order's transaction. If
+the update matches fewer rows than the order has products the whole order rolls
+back, so two buyers can never both get the last unit. Products whose
+stock reaches zero are marked ``sold``.
+
+The stock stays held while the order is unpaid. ``Order.reservation_expires_at``
+records when the hold lapses. Payment confirms it (the field is cleared), and
+``python manage.py release_expired_reservations`` puts the stock of abandoned
+orders back and cancels them. Cancelling an order any other way (see
+orders/lifecycle.py) returns its stock too.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from products.cards import refresh_cards_on_commit
+from products.models import Product
+from . import lifecycle
+from .models import Order, OrderItem
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough stock for one or more items.'
+    default_code = 'insufficient_stock'
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'ORDER_RESERVATION_TTL_MINUTES', 30))
+
+
+def _quantities(items):
+    """``{product_id: total quantity}`` for ``(product_id, quantity)`` pairs, skipping product-less items."""
+    quantities = defaultdict(int)
+    for product_id, quantity in items:
+        if product_id is not None:
+            quantities[product_id] += quantity
+    return quantities
+
+
+def reserve(order, items):
+    """
+    Take ``items`` (``(product_id, quantity)`` pairs) out of stock for ``order``.
+
+    Must run inside the transaction that creates the order. Raises ``InsufficientStock``
+    (and the caller's transaction rolls back) if any product cannot cover its quantity.
+    The number of queries does not depend on the number of items.
+    """
+    quantities = _quantities(items)
+    if not quantities:
+        return
+    now = timezone.now()
+    requested = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    try:
+        with transaction.atomic():
+            # Lock the cart's rows in id order first: an UPDATE locks them in scan order, and two
+            # carts sharing products could then each hold one row the other waits for (deadlock)
+            list(Product.objects.select_for_update().filter(pk__in=list(quantities)).order_by('pk').values_list('pk', flat=True))
+            # One conditional UPDATE for the whole cart; any product short of stock fails it all
+            updated = Product.objects.filter(pk__in=list(quantities), status='active', stock__gte=requested).update(
+                stock=F('stock') - requested, updated_at=now,
+            )
+            if updated != len(quantities):
+                raise InsufficientStock()
+    except InsufficientStock:
+        available = dict(
+            Product.objects.filter(pk__in=list(quantities), status='active').values_list('pk', 'stock')
+        )
+        product_id = next(pk for pk in sorted(quantities) if available.get(pk, 0) < quantities[pk])
+        raise InsufficientStock({
+            'detail': InsufficientStock.default_detail,
+            'product': product_id,
+            'requested': quantities[product_id],
+            'available': available.get(product_id, 0),
+        })
+    sold_out = list(
+        Product.objects.filter(pk__in=list(quantities), stock=0, status='active').values_list('pk', flat=True)
+    )
+    if sold_out:
+        Product.objects.filter(pk__in=sold_out).update(status='sold', updated_at=now)
+        refresh_cards_on_commit(sold_out)
+    order.reservation_expires_at = now + reservation_ttl()
+    Order.objects.filter(pk=order.pk).update(reservation_expires_at=order.reservation_expires_at)
+
+
+def confirm(order):
+    """The order was paid: its reserved stock is sold for good."""
+    Order.objects.filter(pk=order.pk).update(reservation_expires_at=None)
+    order.reservation_expires_at = None
+
+
+def release(order, cancel=True):
+    """
+    Return ``order``'s reserved stock, and cancel it unless ``cancel`` is False. Returns
+    False if it holds no reservation, for example because it was paid or already released.
+    """
+    with transaction.atomic():
+        # Only orders still holding a reservation, so concurrent releases (sweeper vs. cancel) return stock once
+        claimed = Order.objects.filter(pk=order.pk, reservation_expires_at__isnull=False)
+        if cancel:
+            # Ends the reservation and returns the stock with the status change (see lifecycle.py)
+            if not lifecycle.transition(claimed, status='cancelled', source='reservation', strict=False):
+                # Cancelled earlier without going through transition(): the reservation still has to end
+                if not claimed.filter(status='cancelled').update(reservation_expires_at=None):
+                    return False
+                return_stock([order.pk])
+        else:
+            if not claimed.update(reservation_expires_at=None):
+                return False
+            return_stock([order.pk])
+    order.reservation_expires_at = None
+    if cancel:
+        order.status = 'cancelled'
+    return True
+
+
+def return_stock(order_ids):
+    """Put the items of ``order_ids``, whose reservations have just ended, back on sale."""
+    quantities = _quantities(OrderItem.objects.filter(order_id__in=order_ids).values_list('product_id', 'quantity'))
+    now = timezone.now()
+    relisted = []
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity, updated_at=now)
+        # Only relist products that these reservations sold out
+        if Product.objects.filter(pk=product_id, status='sold', stock=quantity).update(status='active'):
+            relisted.append(product_id)
+    if relisted:
+        refresh_cards_on_commit(relisted)
+
+
+def release_expired(batch_size=200):
+    """Release the reservations of unpaid orders past their TTL. Returns the number released."""
+    released = 0
+    due = Order.objects.filter(reservation_expires_at__lt=timezone.now()).exclude(payment_status='paid')
+    after = Q()
+    while True:
+        # Keyset past the previous batch: orders that cannot be released keep their
+        # reservation_expires_at and must not be selected again
+        orders = list(due.filter(after).order_by('reservation_expires_at', 'pk')[:batch_size])
+        if not orders:
+            return released
+        last = orders[-1]
+        after = Q(reservation_expires_at__gt=last.reservation_expires_at) | Q(
+            reservation_expires_at=last.reservation_expires_at, pk__gt=last.pk,
+        )
+        released += sum(release(order) for order in orders)
+        if len(orders) < batch_size:
+            return released
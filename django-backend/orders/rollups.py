@@ -0,0 +1,225 @@
+"""
+Seller sales rollups.
+
+``SellerSalesDay`` holds, per seller, day (of the order) and category, the gross
+revenue, units and orders of paid orders and the number of paid orders that were
+cancelled, plus a ``category=ALL`` row with the seller's totals for the day. Unpaid
+checkouts that are cancelled (or abandoned and released by the reservation sweeper)
+are not counted at all. The seller dashboard reads only these rows, so a 90-day view
+is at most a few hundred rows off one index.
+
+Each order records in ``Order.rollup_state`` what the rollups currently count it as:
+``''`` (nothing), ``'sale'`` (paid, not cancelled) or ``'cancelled'`` (paid, then
+cancelled). An order's contribution is computed from its items' own seller, category,
+price and quantity, which never change, so what was added when it was counted is
+exactly what is subtracted later, even if a product has been deleted since. ``refresh()``
+locks a batch of orders, works out the difference between what is counted and what
+should be, and adds that difference with one multi-row
+``INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x``. Refreshing an order that
+is already counted correctly changes nothing, so refreshes can be repeated safely.
+
+Orders are refreshed in batches by the order event dispatcher (orders/lifecycle.py)
+after they are paid or cancelled. Orders changed without going through
+``lifecycle.transition()`` (or lost in a crash) are caught by
+``python manage.py refresh_sales_rollups``, which also backfills history in
+primary-key chunks.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Order, OrderItem, SellerSalesDay
+
+METRICS = ('gross_revenue', 'units', 'orders', 'cancellations')
+# Payment statuses of orders that were paid at some point
+PAID = ('paid', 'refunded')
+
+
+def target_state(status, payment_status):
+    """What an order with this status and payment status should be counted as."""
+    if status == 'cancelled':
+        return 'cancelled' if payment_status in PAID else ''
+    if payment_status == 'paid':
+        return 'sale'
+    return ''
+
+
+def target_state_expression():
+    """``target_state()`` in SQL, to find orders whose ``rollup_state`` is out of date."""
+    return Case(
+        When(status='cancelled', payment_status__in=PAID, then=Value('cancelled')),
+        When(status='cancelled', then=Value('')),
+        When(payment_status='paid', then=Value('sale')),
+        default=Value(''),
+    )
+
+
+def _contributions(state, day, items, sign):
+    """``{(seller_id, day, category): [revenue, units, orders, cancellations]}`` of one order, times ``sign``."""
+    rows = defaultdict(lambda: [Decimal(0), 0, 0, 0])
+    if not state:
+        return rows
+    for seller_id, categories in items.items():
+        for category, (revenue, units) in (*categories.items(), (SellerSalesDay.ALL, _sum(categories.values()))):
+            row = rows[(seller_id, day, category)]
+            if state == 'sale':
+                row[0] += sign * revenue
+                row[1] += sign * units
+                row[2] += sign
+            else:
+                row[3] += sign
+    return rows
+
+
+def _sum(values):
+    revenue, units = Decimal(0), 0
+    for item_revenue, item_units in values:
+        revenue += item_revenue
+        units += item_units
+    return revenue, units
+
+
+def refresh(order_ids):
+    """Bring the rollups of ``order_ids`` up to date. Returns the number of orders whose counting changed."""
+    order_ids = sorted(set(order_ids))
+    if not order_ids:
+        return 0
+    with transaction.atomic():
+        # Locked (in pk order), so concurrent refreshes of an order add its difference once
+        orders = list(
+            Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk')
+            .values_list('pk', 'status', 'payment_status', 'rollup_state', 'created_at')
+        )
+        changed = {
+            pk: (rollup_state, target_state(status, payment_status), timezone.localdate(created_at))
+            for pk, status, payment_status, rollup_state, created_at in orders
+            if rollup_state != target_state(status, payment_status)
+        }
+        if not changed:
+            return 0
+        # {order: {seller: {category: (revenue, units)}}}
+        items = defaultdict(lambda: defaultdict(dict))
+        rows = OrderItem.objects.filter(order_id__in=list(changed), seller__isnull=False).values_list(
+            'order_id', 'seller_id', 'category', 'price', 'quantity',
+        )
+        for order_id, seller_id, category, price, quantity in rows:
+            revenue, units = items[order_id][seller_id].get(category or '', (Decimal(0), 0))
+            items[order_id][seller_id][category or ''] = (revenue + price * quantity, units + quantity)
+
+        deltas = defaultdict(lambda: [Decimal(0), 0, 0, 0])
+        for pk, (old, new, day) in changed.items():
+            for sign, state in ((-1, old), (1, new)):
+                for key, values in _contributions(state, day, items[pk], sign).items():
+                    deltas[key] = [a + b for a, b in zip(deltas[key], values)]
+        write(deltas)
+
+        by_state = defaultdict(list)
+        for pk, (_, new, _) in changed.items():
+            by_state[new].append(pk)
+        for state, pks in by_state.items():
+            Order.objects.filter(pk__in=pks).update(rollup_state=state)
+    return len(changed)
+
+
+def write(deltas):
+    """Add ``{(seller_id, date, category): [revenue, units, orders, cancellations]}`` to the rollups."""
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    revenue_field = SellerSalesDay._meta.get_field('gross_revenue')
+    rows = [
+        (
+            seller_id, connection.ops.adapt_datefield_value(day), category,
+            connection.ops.adapt_decimalfield_value(revenue, revenue_field.max_digits, revenue_field.decimal_places),
+            units, orders, cancellations, now,
+        )
+        for (seller_id, day, category), (revenue, units, orders, cancellations) in sorted(deltas.items())
+        if revenue or units or orders or cancellations
+    ]
+    table = SellerSalesDay._meta.db_table
+    rows_per_statement = min(100, (connection.features.max_query_params or 1000) // 8)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), rows_per_statement):
+            chunk = rows[start:start + rows_per_statement]
+            cursor.execute(
+                f"INSERT INTO {table} (seller_id, date, category, gross_revenue, units, orders, cancellations, "
+                "updated_at) VALUES " + ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+                + " ON CONFLICT (seller_id, date, category) DO UPDATE SET "
+                + ', '.join(f'{metric} = {table}.{metric} + excluded.{metric}' for metric in METRICS)
+                + ", updated_at = excluded.updated_at",
+                [value for row in chunk for value in row],
+            )
+    return len(rows)
+
+
+def out_of_date(queryset=None):
+    """Orders (of ``queryset``) whose ``rollup_state`` does not match their status."""
+    queryset = Order.objects.all() if queryset is None else queryset
+    return queryset.alias(target=target_state_expression()).exclude(rollup_state=F('target'))
+
+
+def backfill(chunk_size=2000, since_pk=0, progress=None, queryset=None):
+    """
+    Refresh every out-of-date order (of ``queryset``), walking the orders table in
+    primary-key chunks. Returns the number of orders whose counting changed.
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    changed = 0
+    last_pk = since_pk
+    max_pk = queryset.order_by('-pk').values_list('pk', flat=True).first() or 0
+    while last_pk < max_pk:
+        upper = last_pk + chunk_size
+        order_ids = list(out_of_date(queryset.filter(pk__gt=last_pk, pk__lte=upper)).values_list('pk', flat=True))
+        for start in range(0, len(order_ids), 500):
+            changed += refresh(order_ids[start:start + 500])
+        last_pk = upper
+        if progress:
+            progress(min(last_pk, max_pk), max_pk, changed)
+    return changed
+
+
+def rebuild():
+    """Drop all rollups and count every order again."""
+    with transaction.atomic():
+        SellerSalesDay.objects.all().delete()
+        Order.objects.exclude(rollup_state='').update(rollup_state='')
+    return backfill()
+
+
+def summary(seller_id, start, end):
+    """
+    A seller's sales from ``start`` to ``end`` (dates, inclusive), read from the rollups
+    only: totals, one entry per day (days without sales included) and per category.
+    """
+    rows = SellerSalesDay.objects.filter(seller_id=seller_id, date__gte=start, date__lte=end).values_list(
+        'date', 'category', *METRICS,
+    )
+    zero = [Decimal('0.00'), 0, 0, 0]
+    daily, categories = {}, defaultdict(lambda: list(zero))
+    for date, category, *values in rows:
+        if category == SellerSalesDay.ALL:
+            daily[date] = values
+        else:
+            # One row per day: a category's figures are the sum over the range
+            categories[category] = [a + b for a, b in zip(categories[category], values)]
+    totals = [sum(column) for column in zip(zero, *daily.values())]
+
+    def entry(values):
+        return {metric: str(value) if metric == 'gross_revenue' else value for metric, value in zip(METRICS, values)}
+
+    days = (end - start).days + 1
+    return {
+        'from': start,
+        'to': end,
+        'totals': entry(totals),
+        'daily': [
+            {'date': day, **entry(daily.get(day, zero))}
+            for day in (start + timedelta(days=n) for n in range(days))
+        ],
+        'categories': [
+            {'category': category, **entry(values)}
+            for category, values in sorted(categories.items(), key=lambda item: (-item[1][0], item[0]))
+        ],
+    }
@@ -1,10 +1,30 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Order, OrderItem
-from products.models import Product
+from .models import Order, OrderEvent, OrderItem
+from . import reservations
+from products.cards import image_url, seller_display_name
+from products.models import Product, ProductImage
 from users.serializers import UserSerializer
 
+class ProductIdField(serializers.PrimaryKeyRelatedField):
+    """
+    Accepts a product id without fetching the product; ``OrderSerializer.validate``
+    loads every product of the order in one query.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), required=False)
+    product = ProductIdField(queryset=Product.objects.all())
     seller = serializers.SerializerMethodField()
 
     class Meta:
@@ -12,16 +32,17 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'product', 'name', 'price', 'quantity', 'image', 'seller_name', 'category', 'seller'
         ]
-        read_only_fields = ['id']
+        # Filled in from the product when the order is created
+        read_only_fields = ['id', 'name', 'price', 'seller_name', 'category']
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
     def get_seller(self, obj):
         # Return seller id and name from the related product, if available
-        if obj.product and obj.product.seller:
-            return {
-                'id': obj.product.seller.id,
-                'name': getattr(obj.product.seller, 'get_full_name', lambda: obj.product.seller.username)() or obj.product.seller.username
-            }
-        return None
+        # (views load items with select_related('product__seller'))
+        if obj.product_id is None or obj.product is None:
+            return None
+        seller = obj.product.seller
+        return {'id': seller.id, 'name': seller_display_name(seller)}
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
@@ -34,19 +55,88 @@ class OrderSerializer(serializers.ModelSerializer):
             'paystack_reference', 'delivery_address', 'created_at', 'updated_at', 'items'
         ]
         read_only_fields = ['id', 'buyer', 'status', 'payment_status', 'created_at', 'updated_at']
+        # Computed from current prices; a total sent by the client must match it
+        extra_kwargs = {'total': {'required': False}}
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError('An order needs at least one item.')
+        return items
 
+    def validate(self, attrs):
+        items = attrs.get('items', [])
+        product_ids = {item['product'] for item in items}
+        products = Product.objects.select_related('seller').in_bulk(product_ids)
+        missing = [
+            {'product': [f'Invalid pk "{item["product"]}" - object does not exist.']} if item['product'] not in products else {}
+            for item in items
+        ]
+        if any(missing):
+            raise serializers.ValidationError({'items': missing})
+
+        # Cover image: each product's first uploaded image, in the same query for all of them
+        covers = {}
+        for image in ProductImage.objects.filter(product_id__in=product_ids).order_by('product_id', 'pk'):
+            covers.setdefault(image.product_id, image)
+
+        total = Decimal('0')
+        for item in items:
+            product = products[item['product']]
+            item['product'] = product
+            item['name'] = product.name
+            item['price'] = product.price
+            item['category'] = product.category
+            item['seller'] = product.seller
+            item['seller_name'] = seller_display_name(product.seller)
+            if not item.get('image') and product.pk in covers:
+                item['image'] = image_url(covers[product.pk].image)
+            total += product.price * item['quantity']
+        if 'total' in attrs and attrs['total'] != total:
+            raise serializers.ValidationError({'total': f'Does not match the current prices of the items ({total}).'})
+        attrs['total'] = total
+        return attrs
+
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        # request = self.context.get('request')
-        # buyer = request.user if request else None
         order = Order.objects.create(status='pending', payment_status='pending', payment_method='paystack', **validated_data)
-        for item_data in items_data:
-            product = item_data.get('product')
-            # Set image from product if not already provided
-            if not item_data.get('image') and product:
-                # Get first image if available
-                first_image = product.images.first()
-                if first_image:
-                    item_data['image'] = first_image.image.url if hasattr(first_image.image, 'url') else str(first_image.image)
-            OrderItem.objects.create(order=order, **item_data)
-        return order 
\ No newline at end of file
+        # Hold the stock until payment; raises InsufficientStock (409) and rolls back the order
+        reservations.reserve(order, [(item_data['product'].pk, item_data['quantity']) for item_data in items_data])
+        OrderItem.objects.bulk_create([OrderItem(order=order, **item_data) for item_data in items_data])
+        return order
+
+
+class SellerOrderSerializer(OrderSerializer):
+    """An order as one of its sellers sees it: only their items, and what those add up to."""
+    seller_total = serializers.SerializerMethodField()
+
+    class Meta(OrderSerializer.Meta):
+        fields = OrderSerializer.Meta.fields + ['seller_total']
+        read_only_fields = OrderSerializer.Meta.fields + ['seller_total']
+
+    def get_seller_total(self, obj):
+        # items were prefetched down to the seller's own
+        return str(sum((item.price * item.quantity for item in obj.items.all()), Decimal('0.00')))
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ['id', 'field', 'from_value', 'to_value', 'actor', 'source', 'note', 'created_at']
+        read_only_fields = fields
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """A change of status and/or payment status for up to ``MAX_ORDERS`` orders at once."""
+    MAX_ORDERS = 1000
+
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=MAX_ORDERS)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    payment_status = serializers.ChoiceField(choices=Order.PAYMENT_STATUS_CHOICES, required=False)
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if not attrs.get('status') and not attrs.get('payment_status'):
+            raise serializers.ValidationError('Give a status, a payment_status or both.')
+        attrs['orders'] = sorted(set(attrs['orders']))
+        return attrs
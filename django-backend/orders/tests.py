@@ -1,3 +1,223 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import threading
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import reservations, rollups
+from .models import Order, OrderItem
+from .serializers import OrderSerializer
+from products.models import Product, ProductImage
+
+
+def place_order(buyer, cart, barrier):
+    """Create an order for ``cart`` (``(product, quantity)`` pairs) the way checkout does, in its own connection."""
+    try:
+        try:
+            barrier.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        with transaction.atomic():
+            order = Order.objects.create(buyer=buyer, total=sum(product.price * quantity for product, quantity in cart))
+            reservations.reserve(order, [(product.pk, quantity) for product, quantity in cart])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, name=product.name, price=product.price, quantity=quantity)
+                for product, quantity in cart
+            ])
+        return True
+    except reservations.InsufficientStock:
+        return False
+    finally:
+        connection.close()
+
+
+class StockReservationStressTest(TransactionTestCase):
+    """Concurrent checkouts, each committing in its own thread and connection, never oversell."""
+    threads = 8
+
+    def setUp(self):
+        self.buyer = get_user_model().objects.create_user(
+            email='stock-stress@example.com', password=None, first_name='Stress', last_name='Buyer',
+        )
+
+    def product(self, stock):
+        return Product.objects.create(name='Stock stress product', description='', price=10, category='Other',
+                                      condition='good', seller=self.buyer, stock=stock)
+
+    def race(self, carts):
+        barrier = threading.Barrier(self.threads)
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            return list(executor.map(lambda cart: place_order(self.buyer, cart, barrier), carts))
+
+    def reserved(self, product):
+        return sum(OrderItem.objects.filter(product=product).values_list('quantity', flat=True))
+
+    def test_last_units_are_sold_once(self):
+        product = self.product(stock=10)
+        results = self.race([[(product, 1)]] * 50)
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(self.reserved(product), 10)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(product.status, 'sold')
+
+    def test_carts_sharing_products_in_opposite_order(self):
+        # Rows locked in id order: no deadlock, and either the whole cart is reserved or none of it
+        first, second = self.product(stock=15), self.product(stock=15)
+        carts = [[(first, 1), (second, 2)] if n % 2 else [(second, 2), (first, 1)] for n in range(40)]
+        results = self.race(carts)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        placed = results.count(True)
+        self.assertEqual(placed, 7)
+        self.assertEqual(self.reserved(first), placed)
+        self.assertEqual(self.reserved(second), 2 * placed)
+        self.assertEqual((first.stock, second.stock), (15 - placed, 15 - 2 * placed))
+
+
+class OrderCreateQueriesTest(TestCase):
+    """Validating and creating an order runs the same queries whatever the cart size."""
+    # Includes the savepoints of the serializer's atomic block inside the test transaction
+    queries = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email='order-queries-seller@example.com', password=None,
+                                              first_name='Q', last_name='Seller')
+        cls.buyer = User.objects.create_user(email='order-queries-buyer@example.com', password=None,
+                                             first_name='Q', last_name='Buyer')
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        request = Request(APIRequestFactory().post('/api/orders/'))
+        request.user = self.buyer
+        for size in (1, 5, 20, 50):
+            with self.subTest(items=size):
+                products = Product.objects.bulk_create([
+                    Product(name=f'Cart item {n}', description='', price=10 + n, category='Other', condition='good',
+                            seller=self.seller, stock=5)
+                    for n in range(size)
+                ])
+                ProductImage.objects.bulk_create([
+                    ProductImage(product=product, image=f'product_images/cart_{product.pk}_{n}.jpg')
+                    for product in products for n in range(2)
+                ])
+                data = {'items': [{'product': product.pk, 'quantity': 2} for product in products], 'delivery_address': 'Hall 3'}
+                with self.assertNumQueries(self.queries):
+                    serializer = OrderSerializer(data=data, context={'request': request})
+                    serializer.is_valid(raise_exception=True)
+                    order = serializer.save(buyer=self.buyer)
+                self.assertEqual(order.items.count(), size)
+                self.assertEqual(order.total, sum((10 + n) * 2 for n in range(size)))
+
+
+class SellerSalesSummaryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email='summary-seller@example.com', password=None,
+                                              first_name='Sales', last_name='Seller', role='seller')
+        buyer = User.objects.create_user(email='summary-buyer@example.com', password=None,
+                                         first_name='Sales', last_name='Buyer')
+        books = Product.objects.create(name='Book', description='', price=10, category='Books', condition='good',
+                                       seller=cls.seller, stock=10)
+        lamp = Product.objects.create(name='Lamp', description='', price=4, category='Other', condition='good',
+                                      seller=cls.seller, stock=10)
+        now = timezone.now()
+        cls.today = timezone.localdate(now)
+        # A 10.00 book on each of three days, and a lamp on one of them
+        for days_ago, products in ((0, [books, lamp]), (1, [books]), (2, [books])):
+            order = Order.objects.create(buyer=buyer, total=0, status='processing', payment_status='paid')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, seller=cls.seller, name=product.name, price=product.price,
+                          quantity=1, category=product.category)
+                for product in products
+            ])
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=days_ago))
+        rollups.refresh(Order.objects.filter(buyer=buyer).values_list('pk', flat=True))
+
+    def test_categories_sum_every_day_in_range(self):
+        summary = rollups.summary(self.seller.pk, self.today - timedelta(days=6), self.today)
+        self.assertEqual(summary['totals'], {'gross_revenue': '34.00', 'units': 4, 'orders': 3, 'cancellations': 0})
+        self.assertEqual(summary['categories'], [
+            {'category': 'Books', 'gross_revenue': '30.00', 'units': 3, 'orders': 3, 'cancellations': 0},
+            {'category': 'Other', 'gross_revenue': '4.00', 'units': 1, 'orders': 1, 'cancellations': 0},
+        ])
+        self.assertEqual(len(summary['daily']), 7)
+        self.assertEqual(sum(Decimal(day['gross_revenue']) for day in summary['daily']), Decimal('34.00'))
+
+
+class SellerSalesRollupsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email='rollups-seller@example.com', password=None,
+                                              first_name='Rollups', last_name='Seller', role='seller')
+        cls.buyer = User.objects.create_user(email='rollups-buyer@example.com', password=None,
+                                             first_name='Rollups', last_name='Buyer')
+
+    def order(self, payment_status):
+        product = Product.objects.create(name='Desk', description='', price=25, category='Furniture', condition='good',
+                                         seller=self.seller, stock=10)
+        order = Order.objects.create(buyer=self.buyer, total=50, status='processing', payment_status=payment_status)
+        OrderItem.objects.create(order=order, product=product, seller=self.seller, name=product.name,
+                                 price=product.price, quantity=2, category=product.category)
+        return order, product
+
+    def totals(self):
+        today = timezone.localdate()
+        return rollups.summary(self.seller.pk, today, today)['totals']
+
+    def test_cancelling_after_the_product_is_deleted_subtracts_the_sale(self):
+        order, product = self.order('paid')
+        rollups.refresh([order.pk])
+        self.assertEqual(self.totals(), {'gross_revenue': '50.00', 'units': 2, 'orders': 1, 'cancellations': 0})
+        product.delete()
+        Order.objects.filter(pk=order.pk).update(status='cancelled')
+        rollups.refresh([order.pk])
+        self.assertEqual(self.totals(), {'gross_revenue': '0.00', 'units': 0, 'orders': 0, 'cancellations': 1})
+
+    def test_unpaid_cancelled_orders_are_not_cancellations(self):
+        order, _ = self.order('pending')
+        Order.objects.filter(pk=order.pk).update(status='cancelled')
+        self.assertEqual(rollups.refresh([order.pk]), 0)
+        self.assertEqual(self.totals(), {'gross_revenue': '0.00', 'units': 0, 'orders': 0, 'cancellations': 0})
+
+
+class ReleaseExpiredTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.buyer = User.objects.create_user(email='release-buyer@example.com', password=None,
+                                             first_name='Release', last_name='Buyer')
+        cls.product = Product.objects.create(name='Kettle', description='', price=5, category='Other',
+                                             condition='good', seller=cls.buyer, stock=10)
+
+    def order(self, status, payment_status='pending'):
+        order = Order.objects.create(buyer=self.buyer, total=5, status=status, payment_status=payment_status,
+                                     reservation_expires_at=timezone.now() - timedelta(minutes=1))
+        OrderItem.objects.create(order=order, product=self.product, name='Kettle', price=5, quantity=1)
+        return order
+
+    def test_orders_that_cannot_be_released_do_not_stall_the_sweep(self):
+        stuck = [self.order('completed', 'refunded') for _ in range(3)]
+        pending = self.order('pending')
+        self.assertEqual(reservations.release_expired(batch_size=1), 1)
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.reservation_expires_at), ('cancelled', None))
+        self.assertEqual(Order.objects.filter(pk__in=[order.pk for order in stuck],
+                                              reservation_expires_at__isnull=False).count(), 3)
+
+    def test_order_cancelled_outside_transition_returns_its_stock(self):
+        order = self.order('cancelled')
+        self.assertEqual(reservations.release_expired(), 1)
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertIsNone(order.reservation_expires_at)
+        self.assertEqual(self.product.stock, 11)
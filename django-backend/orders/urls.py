@@ -1,10 +1,17 @@
 from django.urls import path
-from .views import OrderListCreateView, OrderDetailView, PaystackVerifyPaymentView, PaystackWebhookView, PaystackInitView
+from .views import OrderListCreateView, OrderDetailView, OrderEventListView, OrderTransitionView, SellerOrderListView, SellerSalesSummaryView, OrderExportView, OrderItemExportView, PaystackVerifyPaymentView, PaystackWebhookView, PaystackInitView, PaystackStatsView
 
 urlpatterns = [
     path('', OrderListCreateView.as_view(), name='order-list-create'),
+    path('export.<str:export_format>', OrderExportView.as_view(), name='order-export'),
+    path('items/export.<str:export_format>', OrderItemExportView.as_view(), name='order-item-export'),
     path('<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('<int:pk>/events/', OrderEventListView.as_view(), name='order-events'),
+    path('transition/', OrderTransitionView.as_view(), name='order-transition'),
+    path('sales/', SellerOrderListView.as_view(), name='order-seller-list'),
+    path('sales/summary/', SellerSalesSummaryView.as_view(), name='order-seller-sales-summary'),
     path('verify-payment/', PaystackVerifyPaymentView.as_view(), name='order-verify-payment'),
     path('paystack-webhook/', PaystackWebhookView.as_view(), name='order-paystack-webhook'),
     path('paystack-init/', PaystackInitView.as_view(), name='order-paystack-init'),
+    path('paystack-stats/', PaystackStatsView.as_view(), name='order-paystack-stats'),
 ] 
\ No newline at end of file
@@ -1,12 +1,19 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import requests
-from django.conf import settings
-from .models import Order
-from .serializers import OrderSerializer
+from datetime import timedelta
+import json
+import secrets
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from .models import Order, OrderItem
+from .serializers import OrderEventSerializer, OrderSerializer, OrderTransitionSerializer, SellerOrderSerializer
+from products.pagination import KeysetPagination
+from products.exports import ExportView
+from . import lifecycle, payment_events, paystack, rollups
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 import logging
@@ -15,24 +22,186 @@ logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+def with_items(queryset, items=None):
+    """
+    Load orders with their buyer and items (and each item's product seller) in three
+    queries, however many orders and items there are. ``items`` narrows the items shown.
+    """
+    items = (items if items is not None else OrderItem.objects.all()).select_related('product__seller')
+    return queryset.select_related('buyer__university', 'buyer__campus__university').prefetch_related(
+        Prefetch('items', queryset=items.order_by('pk'))
+    )
+
+
+def is_admin(user):
+    return user.is_staff or getattr(user, 'role', None) == 'admin'
+
+
+def visible_orders(user):
+    """Admins see every order; buyers their orders; sellers orders containing one of their products."""
+    if is_admin(user):
+        return Order.objects.all()
+    return Order.objects.filter(
+        Q(buyer=user) | Q(pk__in=OrderItem.objects.filter(product__seller=user).values('order_id'))
+    )
+
+
 class OrderListCreateView(generics.ListCreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff or getattr(user, 'role', None) == 'admin':
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(buyer=user).order_by('-created_at')
+        if is_admin(user):
+            return with_items(Order.objects.all()).order_by('-created_at')
+        return with_items(Order.objects.filter(buyer=user)).order_by('-created_at')
 
     def perform_create(self, serializer):
         serializer.save(buyer=self.request.user)
 
 class OrderDetailView(generics.RetrieveAPIView):
-    queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return with_items(visible_orders(self.request.user))
+
+
+class OrderEventListView(generics.ListAPIView):
+    """An order's status and payment changes, oldest first (see orders/lifecycle.py)."""
+    serializer_class = OrderEventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        order = get_object_or_404(visible_orders(self.request.user).only('pk'), pk=self.kwargs['pk'])
+        return order.events.order_by('pk')
+
+
+class OrderTransitionView(APIView):
+    """
+    Change the status and/or payment status of up to 1000 orders in one transaction:
+    ``{"orders": [1, 2, ...], "status": "shipped", "note": "..."}``. All or nothing: if
+    any order cannot make the change the answer is a 409 saying why, and no order
+    changes. Orders already in the requested state are left alone. Admins may make any
+    allowed change; sellers may mark shipped or delivered the orders whose items are
+    all theirs.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    seller_statuses = ('shipped', 'delivered')
+
+    def post(self, request):
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        queryset = Order.objects.filter(pk__in=data['orders'])
+        source = 'admin'
+        if not is_admin(request.user):
+            if data.get('payment_status') or data.get('status') not in self.seller_statuses:
+                raise PermissionDenied('Sellers can only mark orders shipped or delivered.')
+            # Orders with an item of another seller (or of a deleted product) are not theirs to change
+            others = OrderItem.objects.filter(order_id__in=data['orders']).exclude(product__seller=request.user)
+            queryset = queryset.exclude(pk__in=others.values('order_id'))
+            source = 'seller'
+        found = set(queryset.values_list('pk', flat=True))
+        missing = [pk for pk in data['orders'] if pk not in found]
+        if missing:
+            raise NotFound({'detail': 'Orders not found.', 'orders': missing})
+        changed = lifecycle.transition(
+            queryset, status=data.get('status'), payment_status=data.get('payment_status'),
+            actor=request.user, source=source, note=data['note'],
+        )
+        return Response({'changed': changed, 'unchanged': sorted(found.difference(changed))})
+
+class SellerOrderListView(generics.ListAPIView):
+    """
+    Orders containing the requesting seller's products, newest first, each showing
+    only that seller's items. Keyset-paginated (``?cursor=``), so deep pages cost the
+    same as the first.
+    """
+    serializer_class = SellerOrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        mine = OrderItem.objects.filter(product__seller=self.request.user)
+        # Semi-join over the (product, order) index instead of DISTINCT over a join
+        queryset = Order.objects.filter(pk__in=mine.values('order_id'))
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return with_items(queryset, mine)
+
+
+class SellerSalesSummaryView(APIView):
+    """
+    The requesting seller's revenue, units, orders and cancellations over the last
+    ``?days=`` days (default 30): totals, per day and per category. Read from the sales
+    rollups only (see orders/rollups.py). Admins may pass ``?seller=<id>``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 366
+
+    def get(self, request):
+        seller_id = request.user.pk
+        if is_admin(request.user) and request.query_params.get('seller'):
+            seller_id = request.query_params['seller']
+        try:
+            seller_id = int(seller_id)
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            raise ValidationError({'detail': 'seller and days must be integers.'})
+        days = min(max(days, 1), self.max_days)
+        end = timezone.localdate()
+        return Response({'seller': seller_id, **rollups.summary(seller_id, end - timedelta(days=days - 1), end)})
+
+class OrderExportView(ExportView):
+    """All orders, for admins, as ``export.csv`` or ``export.ndjson`` (see products/exports.py)."""
+    export_name = 'orders'
+    queryset = Order.objects.all()
+    university_field = 'buyer__university_id'
+    filters = {'status': 'status', 'payment_status': 'payment_status', 'buyer': 'buyer_id'}
+    columns = {
+        'id': 'id',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'buyer_id': 'buyer_id',
+        'buyer_email': 'buyer__email',
+        'university': 'buyer__university__name',
+        'status': 'status',
+        'payment_status': 'payment_status',
+        'payment_method': 'payment_method',
+        'paystack_reference': 'paystack_reference',
+        'total': 'total',
+        'delivery_address': 'delivery_address',
+    }
+
+
+class OrderItemExportView(ExportView):
+    """Order items with their order's date and status, for admins. Dates and filters apply to the order."""
+    export_name = 'order-items'
+    queryset = OrderItem.objects.all()
+    date_field = 'order__created_at'
+    university_field = 'order__buyer__university_id'
+    filters = {
+        'status': 'order__status', 'payment_status': 'order__payment_status',
+        'category': 'category', 'seller': 'product__seller_id', 'buyer': 'order__buyer_id',
+    }
+    columns = {
+        'id': 'id',
+        'order_id': 'order_id',
+        'order_created_at': 'order__created_at',
+        'order_status': 'order__status',
+        'payment_status': 'order__payment_status',
+        'product_id': 'product_id',
+        'seller_id': 'product__seller_id',
+        'seller_name': 'seller_name',
+        'name': 'name',
+        'category': 'category',
+        'price': 'price',
+        'quantity': 'quantity',
+    }
+
+
 class PaystackVerifyPaymentView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -41,13 +210,8 @@ class PaystackVerifyPaymentView(APIView):
         if not reference:
             return Response({'detail': 'Reference is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Verify with Paystack
-        headers = {
-            'Authorization': f'Bearer {getattr(settings, "PAYSTACK_SECRET_KEY", "")}',
-        }
-        url = f'https://api.paystack.co/transaction/verify/{reference}'
-        paystack_response = requests.get(url, headers=headers)
-        data = paystack_response.json()
+        # Verify with Paystack (raises PaystackUnavailable, a 503, if it cannot be reached)
+        data = paystack.verify(reference)
 
         if not data.get('status'):
             return Response({'detail': 'Verification failed.', 'paystack': data}, status=status.HTTP_400_BAD_REQUEST)
@@ -58,11 +222,10 @@ class PaystackVerifyPaymentView(APIView):
         except Order.DoesNotExist:
             return Response({'detail': 'Order not found for this reference.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Update order status if payment is successful
+        # Update order status if payment is successful (the webhook may already have)
         if data['data']['status'] == 'success':
-            order.payment_status = 'paid'
-            order.status = 'processing'
-            order.save()
+            if not payment_events.mark_paid(order, data['data'], source='verify', actor=request.user):
+                return Response({'detail': 'Amount paid does not cover the order total.'}, status=status.HTTP_400_BAD_REQUEST)
             return Response({'detail': 'Payment verified and order updated.', 'order_id': order.id})
         else:
             return Response({'detail': 'Payment not successful.', 'paystack': data}, status=status.HTTP_400_BAD_REQUEST)
@@ -70,68 +233,68 @@ class PaystackVerifyPaymentView(APIView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PaystackWebhookView(APIView):
+    """
+    Paystack webhook: verify the signature, store the event and acknowledge. Events are
+    applied to orders in the background (see orders/payment_events.py).
+    """
     authentication_classes = []
     permission_classes = []
 
     def post(self, request):
-        event = request.data.get('event')
-        data = request.data.get('data', {})
-        reference = data.get('reference')
-        logger.info(f"Paystack webhook received: event={event}, reference={reference}")
-
-        if not reference:
-            return Response({'detail': 'No reference provided.'}, status=400)
-
+        body = request.body
+        if not payment_events.signature_is_valid(body, request.META.get(payment_events.SIGNATURE_HEADER)):
+            logger.warning("Paystack webhook with an invalid signature rejected")
+            return Response({'detail': 'Invalid signature.'}, status=status.HTTP_401_UNAUTHORIZED)
         try:
-            order = Order.objects.get(paystack_reference=reference)
-        except Order.DoesNotExist:
-            logger.warning(f"Order not found for reference: {reference}")
-            return Response({'detail': 'Order not found.'}, status=404)
-
-        if event == 'charge.success' and data.get('status') == 'success':
-            order.payment_status = 'paid'
-            order.status = 'processing'
-            order.save()
-            logger.info(f"Order {order.id} marked as paid via webhook.")
-        elif event == 'charge.failed':
-            order.payment_status = 'failed'
-            order.save()
-            logger.info(f"Order {order.id} marked as failed via webhook.")
-        # You can handle more events as needed
-
+            payload = json.loads(body)
+        except ValueError:
+            return Response({'detail': 'Invalid JSON.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(payload, dict) or not payload.get('event'):
+            return Response({'detail': 'No event provided.'}, status=status.HTTP_400_BAD_REQUEST)
+        payment_events.record(payload)
         return Response({'detail': 'Webhook received.'})
 
 class PaystackInitView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        amount = request.data.get('amount')
         email = request.data.get('email')
         order_id = request.data.get('order_id')
-        if not amount or not email or not order_id:
-            return Response({'detail': 'amount, email, and order_id are required.'}, status=400)
+        if not email or not order_id:
+            return Response({'detail': 'email and order_id are required.'}, status=400)
 
         # Optionally, get the order and update its status to 'pending'
         try:
             order = Order.objects.get(id=order_id, buyer=request.user)
         except Order.DoesNotExist:
             return Response({'detail': 'Order not found.'}, status=404)
+        if not order.paystack_reference:
+            # Our own reference, so webhook events can be matched to the order
+            order.paystack_reference = f'UT-{order.pk}-{secrets.token_hex(6)}'
+            order.save(update_fields=['paystack_reference', 'updated_at'])
 
         # Prepare Paystack payload
         callback_url = f'http://localhost:3000/order-confirmation/{order_id}'
         payload = {
-            'amount': int(float(amount) * 100),  # Paystack expects amount in kobo/pesewas
+            # The order's own total (not a client-sent amount), in kobo/pesewas
+            'amount': int(order.total * 100),
             'email': email,
             'reference': order.paystack_reference,
             'callback_url': callback_url,
         }
-        headers = {
-            'Authorization': f'Bearer {getattr(settings, "PAYSTACK_SECRET_KEY", "")}',
-            'Content-Type': 'application/json',
-        }
-        paystack_url = 'https://api.paystack.co/transaction/initialize'
-        resp = requests.post(paystack_url, json=payload, headers=headers)
-        data = resp.json()
+        data = paystack.initialize(payload)
         if not data.get('status'):
             return Response({'detail': 'Paystack initialization failed.', 'paystack': data}, status=400)
         return Response({'authorization_url': data['data']['authorization_url']})
+
+
+class PaystackStatsView(APIView):
+    """Outcome counts and latency histograms of Paystack calls, and this worker's circuit breaker."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(paystack.get_stats())
+
+    def delete(self, request):
+        paystack.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
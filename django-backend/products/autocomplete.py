@@ -0,0 +1,478 @@
+"""
+Search-box autocomplete.
+
+Each worker process keeps an in-memory prefix index: one sorted list of
+``(key, kind, text)`` entries, where ``key`` is the normalized text (lowercased,
+accents and punctuation stripped). Entries are
+
+* active product names, also keyed from each of their first words so "iph" finds
+  "Apple iPhone 12",
+* categories, and
+* queries searched at least ``POPULAR_QUERY_MIN_COUNT`` times in this process.
+
+Each university has its own list, and one more holds every entry. An entry's
+weight is how many active products have that name or category, or how often the
+query was searched. A lookup bisects the range of keys starting with the prefix in
+the requested university's list and keeps the heaviest texts. That top list is
+cached per prefix and updated in place as weights change, so a typed prefix
+usually costs one dict lookup. Prefixes whose ranges are large, and would be slow
+to scan, get their top lists when the index is built.
+
+The index is built in the background at startup (or on the first lookup) and kept
+current by the product signals in ``products/signals.py``. Changes made by other
+processes are picked up every ``AUTOCOMPLETE_SYNC_SECONDS`` from ``Product.updated_at``,
+and the whole index is rebuilt every ``AUTOCOMPLETE_REBUILD_SECONDS`` to drop deleted
+products. Until it is built, lookups are answered from the database.
+"""
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .models import Product, ProductCard
+from . import universities
+
+logger = logging.getLogger(__name__)
+
+MAX_LIMIT = 20
+TOP_CAPACITY = 2 * MAX_LIMIT  # cached top lists keep a reserve for removals
+MAX_CACHED_PREFIXES = 20000  # top lists kept per university
+HOT_PREFIX_ENTRIES = 1000  # prefixes covering this many entries get their top list at build time
+NAME_KEY_WORDS = 5  # name entries are also keyed from each of the first words
+POPULAR_QUERY_MIN_COUNT = 3
+MAX_TRACKED_QUERIES = 20000
+
+PRODUCT, CATEGORY, QUERY = 'product', 'category', 'query'
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse everything but letters and digits to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def display(text):
+    return ' '.join((text or '').split())
+
+
+def name_keys(name):
+    """The normalized name and its suffixes starting at each of the first words."""
+    words = normalize(name).split()
+    return {' '.join(words[start:]) for start in range(min(len(words), NAME_KEY_WORDS)) if len(words[start]) > 1 or start == 0}
+
+
+def product_entries(name, category):
+    text = display(name)
+    entries = {(key, PRODUCT, text) for key in name_keys(name) if key}
+    category_key = normalize(category)
+    if category_key:
+        # Shared by every product in the category
+        entries.add((sys.intern(category_key), CATEGORY, sys.intern(display(category))))
+    return entries
+
+
+def _order(item):
+    weight, kind, text = item
+    return -weight, len(text), text
+
+
+class _Top:
+    """The best ``(weight, kind, text)`` items under a prefix, best first."""
+    __slots__ = ('items', 'truncated')
+
+    def __init__(self, items, truncated):
+        self.items = items
+        self.truncated = truncated  # whether items beyond TOP_CAPACITY were cut off
+
+
+class _Scope:
+    """
+    The sorted entries of one university (or of all of them) with their weights.
+
+    ``top`` caches the best ``TOP_CAPACITY`` suggestions per looked-up prefix. Weight
+    changes are merged into the cached lists in place; a list is only recomputed once
+    removals leave it shorter than ``MAX_LIMIT`` with more candidates cut off.
+    """
+
+    def __init__(self):
+        self.entries = []              # sorted (key, kind, text)
+        self.weights = {}              # entry -> weight
+        self.top = OrderedDict()       # prefix -> best items, least recently used first
+
+    def _range(self, prefix):
+        start = bisect_left(self.entries, (prefix,))
+        return start, bisect_left(self.entries, (prefix + '\uffff',), lo=start)
+
+    def add(self, entry, delta):
+        weight = self.weights.get(entry, 0) + delta
+        if weight > 0:
+            if entry not in self.weights:
+                insort(self.entries, entry)
+            self.weights[entry] = weight
+        elif entry in self.weights:
+            del self.weights[entry]
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+        key, kind, text = entry
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            top = self.top.get(prefix)
+            if top is not None and not self._merge(top, delta, max(weight, 0), kind, text):
+                del self.top[prefix]
+
+    @staticmethod
+    def _merge(top, delta, weight, kind, text):
+        """Apply a weight change to a cached top list. Returns False if it must be recomputed."""
+        items = top.items
+        text_key = text.lower()
+        position = next((i for i, item in enumerate(items) if item[2].lower() == text_key), None)
+        if position is not None:
+            if delta < 0:
+                del items[position]
+                if weight > 0 and (not top.truncated or (items and _order((weight, kind, text)) < _order(items[-1]))):
+                    items.append((weight, kind, text))
+                    items.sort(key=_order)
+                # The reserve beyond MAX_LIMIT absorbs removals before a rescan is needed
+                return not top.truncated or len(items) >= MAX_LIMIT
+            if weight > items[position][0]:
+                items[position] = (weight, kind, text)
+                items.sort(key=_order)
+            return True
+        if delta > 0 and (not top.truncated or (items and _order((weight, kind, text)) < _order(items[-1]))):
+            items.append((weight, kind, text))
+            items.sort(key=_order)
+            if len(items) > TOP_CAPACITY:
+                del items[TOP_CAPACITY:]
+                top.truncated = True
+        return True
+
+    def _compute(self, prefix, start, end):
+        best = {}
+        weights = self.weights
+        for entry in self.entries[start:end]:
+            weight = weights[entry]
+            # Several keys (and kinds) can lead to the same text; keep its heaviest entry
+            text_key = entry[2].lower()
+            if weight > best.get(text_key, (0,))[0]:
+                best[text_key] = (weight, entry[1], entry[2])
+        top = _Top(heapq.nsmallest(TOP_CAPACITY, best.values(), key=_order), len(best) > TOP_CAPACITY)
+        self.top[prefix] = top
+        if len(self.top) > MAX_CACHED_PREFIXES:
+            self.top.popitem(last=False)
+        return top
+
+    def lookup(self, prefix, limit):
+        top = self.top.get(prefix)
+        if top is None:
+            top = self._compute(prefix, *self._range(prefix))
+        else:
+            self.top.move_to_end(prefix)
+        return [(kind, text) for _, kind, text in top.items[:limit]]
+
+    def precompute(self, min_entries=HOT_PREFIX_ENTRIES):
+        """Cache the top lists of every prefix covering at least ``min_entries`` entries."""
+        pending = ['']
+        while pending:
+            prefix = pending.pop()
+            start, end = self._range(prefix)
+            if end - start < min_entries:
+                continue
+            if prefix:
+                self._compute(prefix, start, end)
+            # Jump from child prefix to child prefix instead of walking the range
+            position = start
+            while position < end:
+                key = self.entries[position][0]
+                if len(key) == len(prefix):
+                    position += 1
+                    continue
+                child = key[:len(prefix) + 1]
+                pending.append(child)
+                position = bisect_left(self.entries, (child + '\uffff',), lo=position, hi=end)
+
+
+class PrefixIndex:
+    """
+    Autocomplete entries of every university, plus one scope holding all of them.
+    Not thread-safe; see the module lock.
+    """
+
+    def __init__(self):
+        self.scopes = {None: _Scope()}
+        self.products = {}   # product id -> (university_id, name, category)
+
+    @classmethod
+    def build(cls, product_rows, queries=()):
+        """An index of ``(id, university_id, name, category)`` rows and ``(text, university_id, count)`` queries."""
+        index = cls()
+        everywhere = index.scopes[None].weights
+        for product_id, university_id, name, category in product_rows:
+            index.products[product_id] = (university_id, name, category)
+            weights = index._scope(university_id).weights
+            for entry in product_entries(name, category):
+                weights[entry] = weights.get(entry, 0) + 1
+                everywhere[entry] = everywhere.get(entry, 0) + 1
+        for text, university_id, count in queries:
+            key = normalize(text)
+            if key:
+                entry = (key, QUERY, display(text))
+                index._scope(university_id).weights[entry] = count
+                everywhere[entry] = everywhere.get(entry, 0) + count
+        # One sort per scope instead of an insort per entry
+        for scope in index.scopes.values():
+            scope.entries = sorted(scope.weights)
+            scope.precompute()
+        return index
+
+    def __len__(self):
+        return len(self.scopes[None].entries)
+
+    def _scope(self, university_id):
+        scope = self.scopes.get(university_id)
+        if scope is None:
+            scope = self.scopes[university_id] = _Scope()
+        return scope
+
+    def _add(self, entry, university_id, delta):
+        self._scope(university_id).add(entry, delta)
+        self.scopes[None].add(entry, delta)
+
+    def remove_product(self, product_id):
+        if product_id not in self.products:
+            return
+        university_id, name, category = self.products.pop(product_id)
+        for entry in product_entries(name, category):
+            self._add(entry, university_id, -1)
+
+    def set_product(self, product_id, university_id, name, category):
+        if self.products.get(product_id) == (university_id, name, category):
+            return
+        self.remove_product(product_id)
+        self.products[product_id] = (university_id, name, category)
+        for entry in product_entries(name, category):
+            self._add(entry, university_id, 1)
+
+    def set_query(self, text, university_id, count):
+        key = normalize(text)
+        if not key:
+            return
+        entry = (key, QUERY, display(text))
+        current = self._scope(university_id).weights.get(entry, 0)
+        if count != current:
+            self._add(entry, university_id, count - current)
+
+    def lookup(self, prefix, university_id=None, limit=8):
+        """The heaviest ``limit`` suggestions for a normalized ``prefix``, as ``(kind, text)`` pairs."""
+        scope = self.scopes.get(university_id)
+        return scope.lookup(prefix, limit) if scope is not None else []
+
+
+_lock = threading.Lock()
+_index = None
+_built_at = None      # monotonic time of the last full build
+_synced_at = None     # database time up to which changes from other processes are applied
+_building = False
+_task_queued = False
+_replay = []          # product changes seen while a build was running
+_queries = Counter()  # (normalized query, university_id) -> searches in this process
+_query_texts = {}
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='autocomplete')
+    return _executor
+
+
+def _sync_seconds():
+    return getattr(settings, 'AUTOCOMPLETE_SYNC_SECONDS', 30)
+
+
+def _rebuild_seconds():
+    return getattr(settings, 'AUTOCOMPLETE_REBUILD_SECONDS', 900)
+
+
+def is_warm():
+    return _index is not None
+
+
+def _product_rows(queryset, batch_size=5000):
+    queryset = queryset.order_by('id').values_list('id', 'university_id', 'name', 'category')
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def build():
+    """(Re)build this process's index from the database. Returns the number of entries."""
+    global _index, _built_at, _synced_at, _building
+    with _lock:
+        if _building:
+            return len(_index) if _index else 0
+        _building = True
+        _replay.clear()
+    try:
+        started_at = timezone.now()
+        with _lock:
+            queries = [
+                (_query_texts[key], key[1], count)
+                for key, count in _queries.items() if count >= POPULAR_QUERY_MIN_COUNT
+            ]
+        index = PrefixIndex.build(_product_rows(Product.objects.filter(status='active')), queries)
+        with _lock:
+            # Signals that fired during the build may not be in its snapshot
+            for change in _replay:
+                _apply(index, *change)
+            _replay.clear()
+            _index = index
+            _built_at = time.monotonic()
+            _synced_at = started_at
+        return len(index)
+    finally:
+        with _lock:
+            _building = False
+
+
+def _apply(index, product_id, university_id=None, name=None, category=None, active=False):
+    if active:
+        index.set_product(product_id, university_id, name, category)
+    else:
+        index.remove_product(product_id)
+
+
+def _record_change(*change):
+    with _lock:
+        if _building:
+            _replay.append(change)
+        if _index is not None:
+            _apply(_index, *change)
+
+
+def product_saved(product):
+    """Apply a committed product save to this process's index."""
+    _record_change(product.pk, product.university_id, product.name, product.category, product.status == 'active')
+
+
+def product_deleted(product_id):
+    _record_change(product_id)
+
+
+def sync():
+    """Apply products changed by other processes since the last build or sync."""
+    global _synced_at
+    since = _synced_at
+    if since is None:
+        return 0
+    started_at = timezone.now()
+    rows = Product.objects.filter(updated_at__gte=since).order_by().values_list(
+        'id', 'university_id', 'name', 'category', 'status'
+    )
+    changed = 0
+    for product_id, university_id, name, category, status in rows.iterator():
+        _record_change(product_id, university_id, name, category, status == 'active')
+        changed += 1
+    _synced_at = started_at
+    return changed
+
+
+def _in_worker(task):
+    global _task_queued
+    try:
+        task()
+    except Exception:
+        logger.exception("Autocomplete index %s failed", task.__name__)
+    finally:
+        with _lock:
+            _task_queued = False
+        connection.close()
+
+
+def _kick(task):
+    global _task_queued
+    with _lock:
+        if _task_queued or _building:
+            return
+        _task_queued = True
+    _get_executor().submit(_in_worker, task)
+
+
+def warm_at_startup():
+    """Build the index in the background when a server process starts."""
+    if not getattr(settings, 'AUTOCOMPLETE_WARM_AT_STARTUP', True):
+        return
+    # Management commands other than runserver never serve autocomplete
+    if len(sys.argv) > 1 and sys.argv[0].endswith('manage.py') and sys.argv[1] != 'runserver':
+        return
+    _kick(build)
+
+
+def record_query(query, university_id):
+    """Count a search; queries searched often enough become suggestions."""
+    key = normalize(query)
+    if not key:
+        return
+    with _lock:
+        if len(_queries) >= MAX_TRACKED_QUERIES:
+            # Forget one-off searches rather than grow without bound
+            for stale in [k for k, count in _queries.items() if count < POPULAR_QUERY_MIN_COUNT]:
+                del _queries[stale]
+                _query_texts.pop(stale, None)
+        _queries[(key, university_id)] += 1
+        _query_texts.setdefault((key, university_id), display(query))
+        count = _queries[(key, university_id)]
+        if count >= POPULAR_QUERY_MIN_COUNT and _index is not None:
+            _index.set_query(_query_texts[(key, university_id)], university_id, count)
+
+
+def fallback(prefix, university_id, limit):
+    """Suggestions straight from the database, for a cold index."""
+    try:
+        cards = universities.filter_queryset(ProductCard.objects.filter(status='active'), university_id)
+        names = cards.filter(name__istartswith=prefix).order_by('name').values_list('name', flat=True)[:limit * 3]
+        categories = universities.filter_queryset(Product.objects.filter(status='active'), university_id) \
+            .filter(category__istartswith=prefix).order_by().values_list('category', flat=True).distinct()[:limit]
+        suggestions, seen = [], set()
+        for kind, text in [(CATEGORY, category) for category in categories] + [(PRODUCT, name) for name in names]:
+            if text.lower() not in seen:
+                seen.add(text.lower())
+                suggestions.append((kind, display(text)))
+        return suggestions[:limit]
+    except DatabaseError:
+        logger.exception("Autocomplete fallback query failed")
+        return []
+
+
+def suggest(query, university_id=None, limit=8):
+    """Return ``(suggestions, warm)``; suggestions are ``(kind, text)`` pairs, best first."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    prefix = normalize(query)
+    if not prefix:
+        return [], is_warm()
+    if _index is None:
+        _kick(build)
+        return fallback(prefix, university_id, limit), False
+    if time.monotonic() - _built_at >= _rebuild_seconds():
+        _kick(build)
+    elif _synced_at is not None and (timezone.now() - _synced_at).total_seconds() >= _sync_seconds():
+        _kick(sync)
+    with _lock:
+        return _index.lookup(prefix, university_id, limit), True
@@ -0,0 +1,110 @@
+"""
+Maintenance of the ``ProductCard`` read model (see ``ProductCard`` in models.py).
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Product, ProductCard, ProductImage
+from . import feed_cache
+
+CARD_FIELDS = [
+    'name', 'price', 'condition', 'category', 'status', 'seller', 'seller_name',
+    'university', 'cover_image', 'rating_average', 'rating_count', 'created_at',
+]
+
+
+def seller_display_name(user):
+    return f"{user.first_name} {user.last_name}".strip() or user.email
+
+
+def image_url(image):
+    if not image:
+        return ''
+    try:
+        return image.url
+    except ValueError:
+        return str(image)
+
+
+def build_card(product):
+    """Build an unsaved ``ProductCard`` for a product loaded with ``card_source_queryset``."""
+    images = product.images.all()
+    cover = images[0] if images else None
+    cover_url = ''
+    if cover:
+        # Prefer the small card rendition once products.images has produced it
+        renditions = {(r.kind, r.format): r for r in cover.renditions.all()}
+        card_rendition = renditions.get(('card', 'webp'))
+        cover_url = image_url(card_rendition.file if card_rendition else cover.image)
+    return ProductCard(
+        product_id=product.pk,
+        name=product.name,
+        price=product.price,
+        condition=product.condition,
+        category=product.category,
+        status=product.status,
+        seller_id=product.seller_id,
+        seller_name=seller_display_name(product.seller),
+        university_id=product.university_id,
+        cover_image=cover_url,
+        rating_average=product.get_rating_average(),
+        rating_count=product.rating_count,
+        created_at=product.created_at,
+    )
+
+
+def card_source_queryset():
+    return (
+        Product.objects.select_related('seller')
+        .prefetch_related(Prefetch('images', queryset=ProductImage.objects.order_by('id').prefetch_related('renditions')))
+        .order_by()
+    )
+
+
+def save_cards(cards):
+    ProductCard.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=CARD_FIELDS,
+    )
+
+
+def refresh_cards(product_ids):
+    """Recompute the cards of the given products and invalidate the cached feeds showing them."""
+    product_ids = [pk for pk in product_ids if pk is not None]
+    if not product_ids:
+        return
+    previous = set(ProductCard.objects.filter(pk__in=product_ids).values_list('university_id', flat=True))
+    new_cards = [build_card(product) for product in card_source_queryset().filter(pk__in=product_ids)]
+    save_cards(new_cards)
+    feed_cache.bump_versions(previous | {card.university_id for card in new_cards})
+
+
+def refresh_cards_on_commit(product_ids):
+    """
+    Refresh cards once the current transaction commits.
+
+    Deferring means products deleted in the same transaction (including cascades)
+    are simply skipped instead of getting their card re-created mid-delete.
+    """
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: refresh_cards(product_ids))
+
+
+def refresh_seller_cards(user):
+    """Push a seller's display name and university onto those of their cards that show old ones."""
+    name = seller_display_name(user)
+    # Any save of the user lands here (password, phone, ...); those match no card and write nothing
+    stale = ProductCard.objects.filter(seller_id=user.pk).exclude(seller_name=name, university_id=user.university_id)
+    previous = set(stale.values_list('university_id', flat=True).distinct())
+    if previous and stale.update(seller_name=name, university_id=user.university_id):
+        feed_cache.bump_versions(previous | {user.university_id})
+
+
+def rebuild_cards(batch_size=500):
+    """Rebuild every card in batches. Returns the number of cards written."""
+    ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        refresh_cards(ids[start:start + batch_size])
+    return len(ids)
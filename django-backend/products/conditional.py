@@ -0,0 +1,83 @@
+"""
+Conditional GETs (``ETag`` / ``Last-Modified``) for the product endpoints.
+
+Views using ``ConditionalGetMixin`` implement ``get_validators()``, which must be
+cheap (one small query or a cache read). When the request's ``If-None-Match`` /
+``If-Modified-Since`` still match, a 304 is returned before the object list is
+loaded or serialized.
+
+Product detail validators come from ``Product.updated_at``, which is also bumped
+when the product's images, renditions or ratings change (see ``touch_products``),
+plus the seller fields shown in the response. List validators are the newest
+``updated_at`` and the row count; since lists embed the seller too, editing those
+seller fields (or moving university) bumps ``updated_at`` on all of the seller's
+products (see products/signals.py).
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Product
+
+
+def make_etag(*parts):
+    """Strong ETag over the given values; include everything the response body depends on."""
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def touch_products(product_ids):
+    """Bump ``updated_at`` so changes to related rows invalidate the product's validators."""
+    Product.objects.filter(pk__in=list(product_ids)).update(updated_at=timezone.now())
+
+
+def detail_validators(request, product_id):
+    """``(etag, last_modified)`` for one product, or None if it does not exist."""
+    row = Product.objects.filter(pk=product_id).values_list(
+        'updated_at', 'seller_id', 'seller__first_name', 'seller__last_name', 'seller__role',
+        'seller__seller_type',
+    ).first()
+    if row is None:
+        return None
+    return make_etag(request.get_host(), product_id, *row), row[0]
+
+
+def queryset_validators(request, queryset):
+    """``(etag, last_modified)`` for a filtered product list: newest change plus row count."""
+    summary = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    etag = make_etag(request.get_host(), request.get_full_path(), summary['last_modified'], summary['count'])
+    return etag, summary['last_modified']
+
+
+def respond(request, validators, build):
+    """
+    Return 304 if the request's validators match ``(etag, last_modified)``, otherwise
+    ``build()``'s response tagged with them. ``validators`` may be None to skip the check.
+    """
+    if validators is None:
+        return build()
+    etag, last_modified = validators
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+    response = build()
+    if response.status_code == 200 and 'no-store' not in response.get('Cache-Control', ''):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer GETs with 304 when the client's validators are current; tag 200s with them.
+
+    The view (or another mixin) provides ``get_validators()`` returning ``(etag, last_modified)``,
+    or None to skip the check.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return respond(request, self.get_validators(), lambda: super(ConditionalGetMixin, self).get(request, *args, **kwargs))
@@ -0,0 +1,143 @@
+"""
+Streaming CSV and NDJSON exports for admins.
+
+An export is a ``values()`` queryset read with ``.iterator(chunk_size=EXPORT_CHUNK_SIZE)``
+(a server-side cursor on PostgreSQL) and written out by a ``StreamingHttpResponse``
+``ROWS_PER_WRITE`` rows at a time. Neither the rows nor the response body is ever held
+in full, so memory use is the same for a thousand rows as for ten million.
+
+``ExportView`` serves ``.../export.csv`` and ``.../export.ndjson`` and applies the shared
+filters: ``?from=`` / ``?to=`` (dates, inclusive) on ``date_field``, ``?university=``
+(id or name) on ``university_field``, and the comma-separated ``filters`` of each
+export, such as ``?status=pending,processing``. Subclasses set the queryset and the
+``columns`` (output name -> ORM lookup); see ``ProductExportView`` and the order
+exports in orders/views.py.
+"""
+from datetime import datetime, time, timedelta
+import csv
+import io
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+
+from . import universities
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+ROWS_PER_WRITE = 1000
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _key(name, lookup):
+    # Renamed columns get their own alias, which may not collide with a model field
+    return name if name == lookup else f'export_{name}'
+
+
+def rows(queryset, columns):
+    """``queryset`` as streamed ``values()`` dicts, keyed by ``_key()`` of each of ``columns``."""
+    fields = [lookup for name, lookup in columns.items() if name == lookup]
+    aliases = {_key(name, lookup): F(lookup) for name, lookup in columns.items() if name != lookup}
+    return queryset.values(*fields, **aliases).iterator(chunk_size=_chunk_size())
+
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    # Names, descriptions and addresses are user input: keep spreadsheets from running them as formulas
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(rows, columns):
+    keys = [_key(name, lookup) for name, lookup in columns.items()]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(row[key]) for key in keys])
+        if n % ROWS_PER_WRITE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_stream(rows, columns):
+    keys = [(name, _key(name, lookup)) for name, lookup in columns.items()]
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    lines = []
+    for row in rows:
+        # Same key order as the CSV columns
+        lines.append(encoder.encode({name: row[key] for name, key in keys}))
+        if len(lines) == ROWS_PER_WRITE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _day_start(value, param):
+    day = parse_date(value)
+    if day is None:
+        raise ValidationError({param: 'Must be a date (YYYY-MM-DD).'})
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class ExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    export_name = None
+    queryset = None
+    columns = {}
+    date_field = 'created_at'
+    university_field = None
+    filters = {}  # query parameter -> field, comma-separated values
+
+    def perform_content_negotiation(self, request, force=False):
+        # Clients asking for text/csv still get JSON errors
+        return super().perform_content_negotiation(request, force=True)
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        if params.get('from'):
+            queryset = queryset.filter(**{f'{self.date_field}__gte': _day_start(params['from'], 'from')})
+        if params.get('to'):
+            end = _day_start(params['to'], 'to') + timedelta(days=1)
+            queryset = queryset.filter(**{f'{self.date_field}__lt': end})
+        if self.university_field:
+            queryset = universities.filter_queryset(queryset, universities.from_request(self.request), self.university_field)
+        for param, field in self.filters.items():
+            values = [value for value in params.get(param, '').split(',') if value]
+            if values:
+                try:
+                    queryset = queryset.filter(**{f'{field}__in': values})
+                except ValueError:
+                    raise ValidationError({param: 'Invalid value.'})
+        return queryset
+
+    def get(self, request, export_format):
+        if export_format not in FORMATS:
+            raise Http404
+        queryset = self.filter_queryset(self.queryset.all()).order_by('pk')
+        stream = csv_stream if export_format == 'csv' else ndjson_stream
+        response = StreamingHttpResponse(
+            stream(rows(queryset, self.columns), self.columns), content_type=FORMATS[export_format],
+        )
+        filename = f'{self.export_name}-{timezone.localdate().isoformat()}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
@@ -0,0 +1,142 @@
+"""
+Facet counts for the catalog filter sheet.
+
+For the current ``?university=`` (id or name) and ``?search=`` this returns product counts per
+category, per condition and per price bucket. All three come from one grouped
+query (``GROUP BY category, condition, <price bucket>``, at most a few hundred
+groups) that is rolled up in Python.
+
+Price buckets are the university's price quintiles, rounded to two significant
+figures. They change slowly, so they are computed with a handful of index
+lookups and cached for ``FACETS_BOUNDARY_TTL`` seconds.
+
+Responses go through the feed cache (``products/feed_cache.py``), so they are keyed
+by the full filter signature and invalidated by the same version bump as the feeds.
+On PostgreSQL the grouped query runs under ``FACETS_TIMEOUT_MS``; when the budget
+is exceeded the last computed facets for that signature are served instead.
+"""
+from decimal import Decimal
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .models import Product
+from .search import ProductSearchFilter
+from . import universities
+
+PRICE_BUCKETS = 5
+STALE_TTL = 24 * 3600
+
+
+def _boundary_ttl():
+    return getattr(settings, 'FACETS_BOUNDARY_TTL', 3600)
+
+
+def _timeout_ms():
+    return getattr(settings, 'FACETS_TIMEOUT_MS', 300)
+
+
+def base_queryset(university_id):
+    return universities.filter_queryset(Product.objects.order_by(), university_id)
+
+
+def _round(value):
+    """Two significant figures, so bucket edges read like prices (137.40 -> 140)."""
+    return Decimal(f'{float(value):.2g}').quantize(Decimal('0.01'))
+
+
+def price_boundaries(university_id):
+    """Upper edges of the lower ``PRICE_BUCKETS - 1`` price buckets, ascending."""
+    key = f'facets:prices:{university_id}'
+    boundaries = cache.get(key)
+    if boundaries is not None:
+        return boundaries
+    queryset = base_queryset(university_id).order_by('price').values_list('price', flat=True)
+    total = queryset.count()
+    boundaries = []
+    if total:
+        for step in range(1, PRICE_BUCKETS):
+            edge = _round(queryset[total * step // PRICE_BUCKETS])
+            if edge > 0 and (not boundaries or edge > boundaries[-1]):
+                boundaries.append(edge)
+    cache.set(key, boundaries, timeout=_boundary_ttl())
+    return boundaries
+
+
+def bucket_expression(boundaries):
+    if not boundaries:
+        return Value(0, output_field=IntegerField())
+    return Case(
+        *[When(price__lt=edge, then=Value(index)) for index, edge in enumerate(boundaries)],
+        default=Value(len(boundaries)),
+        output_field=IntegerField(),
+    )
+
+
+def _grouped_counts(queryset, boundaries):
+    rows = queryset.values('category', 'condition', bucket=bucket_expression(boundaries)).annotate(n=Count('id'))
+    if connection.vendor != 'postgresql':
+        return list(rows)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [int(_timeout_ms())])
+        return list(rows)
+
+
+def compute(request, view=None):
+    """The facets for ``request``'s filters, as a plain dict."""
+    university_id = universities.from_request(request)
+    boundaries = price_boundaries(university_id)
+    queryset = ProductSearchFilter().filter_queryset(request, base_queryset(university_id), view).order_by()
+
+    categories, conditions, buckets = {}, {}, [0] * (len(boundaries) + 1)
+    total = 0
+    for row in _grouped_counts(queryset, boundaries):
+        categories[row['category']] = categories.get(row['category'], 0) + row['n']
+        conditions[row['condition']] = conditions.get(row['condition'], 0) + row['n']
+        buckets[row['bucket']] += row['n']
+        total += row['n']
+
+    edges = [None, *boundaries, None]
+    return {
+        'count': total,
+        'category': [
+            {'value': value, 'count': count}
+            for value, count in sorted(categories.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'condition': [
+            {'value': value, 'label': label, 'count': conditions.get(value, 0)}
+            for value, label in Product.CONDITION_CHOICES
+        ],
+        'price': [
+            {
+                'min': str(edges[index]) if edges[index] is not None else None,
+                'max': str(edges[index + 1]) if edges[index + 1] is not None else None,
+                'count': count,
+            }
+            for index, count in enumerate(buckets)
+        ],
+    }
+
+
+def _stale_key(request):
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    return 'facets:stale:' + hashlib.md5(repr(params).encode()).hexdigest()
+
+
+def compute_within_budget(request, view=None):
+    """
+    ``compute()``, falling back to the last facets computed for the same filters when the
+    query exceeds its time budget. Returns ``(data, stale)``; ``data`` is None if there
+    is nothing to fall back to.
+    """
+    try:
+        data = compute(request, view)
+    except OperationalError:
+        # statement_timeout cancelled the query
+        return cache.get(_stale_key(request)), True
+    cache.set(_stale_key(request), data, timeout=STALE_TTL)
+    return data, False
@@ -0,0 +1,162 @@
+"""
+Response cache for the featured/recent product feeds.
+
+Keys are scoped by university id and carry that university's version number, so
+invalidation is a single upsert incrementing ``FeedVersion`` for the university
+whenever a product in it changes; old entries are never read again and simply
+expire. The versions live in the database, not the cache: with the default
+per-process LocMemCache a bump made by a management command or another worker
+would otherwise never be seen. A cold key is rebuilt by one request at a time (``cache.add`` lock) while
+concurrent requests for the same key wait briefly for the result instead of all
+hitting the database.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.response import Response
+
+from . import universities
+from .models import FeedVersion
+
+ALL_UNIVERSITIES = 'All'
+STATS_KEYS = ('hits', 'misses', 'rebuilds', 'rebuild_ms', 'lock_waits')
+
+
+def _ttl():
+    return getattr(settings, 'FEED_CACHE_TTL', 300)
+
+
+def _lock_ttl():
+    return getattr(settings, 'FEED_CACHE_LOCK_TTL', 10)
+
+
+def _scope(university_id):
+    return ALL_UNIVERSITIES if university_id is None else str(university_id)
+
+
+def get_version(university_id):
+    version = FeedVersion.objects.filter(scope=_scope(university_id)).values_list('version', flat=True).first()
+    return version or 1
+
+
+def bump_versions(university_ids):
+    """Invalidate the cached feeds of the given university ids (and the all-universities feed)."""
+    scopes = sorted({_scope(pk) for pk in university_ids} | {ALL_UNIVERSITIES})
+    table = FeedVersion._meta.db_table
+    with connection.cursor() as cursor:
+        for start in range(0, len(scopes), 500):
+            chunk = scopes[start:start + 500]
+            # A scope without a row is at version 1, so its first bump inserts 2
+            cursor.execute(
+                f"INSERT INTO {table} (scope, version) VALUES " + ', '.join(['(%s, 2)'] * len(chunk))
+                + f" ON CONFLICT (scope) DO UPDATE SET version = {table}.version + 1",
+                chunk,
+            )
+
+
+def _incr_stat(name, delta=1):
+    key = f'feed:stats:{name}'
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def get_stats():
+    values = cache.get_many([f'feed:stats:{name}' for name in STATS_KEYS])
+    stats = {name: values.get(f'feed:stats:{name}', 0) for name in STATS_KEYS}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0
+    stats['avg_rebuild_ms'] = stats['rebuild_ms'] / stats['rebuilds'] if stats['rebuilds'] else 0
+    stats['ttl'] = _ttl()
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f'feed:stats:{name}' for name in STATS_KEYS])
+
+
+def cache_key(feed, request):
+    # ?university=3 and ?university=<its name> share the scope, and so the invalidation
+    university_id = universities.from_request(request)
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    fingerprint = hashlib.md5(repr((request.get_host(), params)).encode()).hexdigest()
+    return f'feed:{feed}:{_scope(university_id)}:v{_request_version(request, university_id)}:{fingerprint}'
+
+
+def _request_version(request, university_id):
+    # The ETag and the cache lookup of one request share a single version query
+    versions = request.__dict__.setdefault('_feed_versions', {})
+    if university_id not in versions:
+        versions[university_id] = get_version(university_id)
+    return versions[university_id]
+
+
+def is_no_store(response):
+    return 'no-store' in response.get('Cache-Control', '')
+
+
+def etag(feed, request):
+    """
+    Strong ETag for a feed response; changes exactly when its cache key does, that is
+    when the scope's ``FeedVersion`` row is bumped, whichever process bumped it.
+    """
+    return '"%s"' % hashlib.md5(cache_key(feed, request).encode()).hexdigest()
+
+
+def cached_response(feed, request, build):
+    """
+    Return the cached response data for ``request``, or call ``build()`` (which returns a
+    ``Response``) under a single-flight lock and cache its data.
+    """
+    key = cache_key(feed, request)
+    data = cache.get(key)
+    if data is not None:
+        _incr_stat('hits')
+        return Response(data, headers={'X-Cache': 'HIT'})
+    _incr_stat('misses')
+
+    lock_key = key + ':lock'
+    if not cache.add(lock_key, 1, timeout=_lock_ttl()):
+        # Someone else is rebuilding this key: wait for them rather than stampeding the DB
+        _incr_stat('lock_waits')
+        deadline = time.monotonic() + _lock_ttl()
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={'X-Cache': 'HIT'})
+            if cache.get(lock_key) is None:
+                break
+            delay = min(delay * 2, 0.2)
+
+    try:
+        start = time.perf_counter()
+        response = build()
+        if response.status_code == 200 and not is_no_store(response):
+            cache.set(key, response.data, timeout=_ttl())
+        _incr_stat('rebuilds')
+        _incr_stat('rebuild_ms', int((time.perf_counter() - start) * 1000))
+    finally:
+        cache.delete(lock_key)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+class FeedCacheMixin:
+    """Serve a list view through ``cached_response``; set ``feed_cache_name`` on the view."""
+    feed_cache_name = None
+
+    def get_validators(self):
+        # The versioned cache key already changes whenever the feed does (in any process)
+        return etag(self.feed_cache_name, self.request), None
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            self.feed_cache_name, request, lambda: super(FeedCacheMixin, self).list(request, *args, **kwargs)
+        )
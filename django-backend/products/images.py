@@ -0,0 +1,156 @@
+"""
+Image rendition pipeline for product photos.
+
+After a ``ProductImage`` is saved, the upload is normalized (EXIF orientation
+applied, EXIF/GPS metadata stripped, long edge capped at ``ORIGINAL_MAX_EDGE``)
+and fixed renditions are written in WebP and JPEG:
+
+    thumb   150px  - list thumbnails, order items
+    card    480px  - feed cards
+    detail 1280px  - product detail screen
+
+Work runs on a small in-process thread pool after the transaction commits, so
+the upload request never waits on Pillow. Images left ``pending`` (e.g. the
+worker died) are picked up by ``python manage.py process_image_renditions``.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import ProductImage, ProductImageRendition
+from . import storage_cleanup
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = {
+    'thumb': 150,
+    'card': 480,
+    'detail': 1280,
+}
+ORIGINAL_MAX_EDGE = 2560
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2),
+            thread_name_prefix='image-renditions',
+        )
+    return _executor
+
+
+def _encode(image, fmt, quality):
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        image.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _load(product_image):
+    with product_image.image.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    # Bake the EXIF orientation into the pixels; nothing below writes EXIF back out
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+    return image
+
+
+def _normalize_original(product_image, image):
+    """
+    Re-encode the stored upload without metadata and within ``ORIGINAL_MAX_EDGE``.
+    Returns the name of the replaced file, to delete once the new one is committed.
+    """
+    original = image.copy()
+    original.thumbnail((ORIGINAL_MAX_EDGE, ORIGINAL_MAX_EDGE), Image.LANCZOS)
+    fmt = 'png' if original.mode == 'RGBA' else 'jpeg'
+    content = _encode(original, fmt, 90)
+    old_name = product_image.image.name
+    base = os.path.splitext(os.path.basename(old_name))[0]
+    product_image.image.save(f"{base}_{uuid.uuid4().hex[:6]}.{'png' if fmt == 'png' else 'jpg'}", ContentFile(content), save=False)
+    product_image.width, product_image.height = original.size
+    product_image.bytes = len(content)
+    return old_name
+
+
+def generate_renditions(image_id):
+    """Normalize one ``ProductImage`` and (re)build all its renditions."""
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None or not product_image.image:
+        return
+    written = []
+    try:
+        image = _load(product_image)
+        replaced_original = _normalize_original(product_image, image)
+        written.append(product_image.image.name)
+        renditions = []
+        for kind, edge in RENDITION_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            for fmt, quality in (('webp', WEBP_QUALITY), ('jpeg', JPEG_QUALITY)):
+                content = _encode(resized, fmt, quality)
+                rendition = ProductImageRendition(
+                    image=product_image, kind=kind, format=fmt,
+                    width=resized.width, height=resized.height, bytes=len(content),
+                )
+                ext = 'jpg' if fmt == 'jpeg' else fmt
+                rendition.file.save(f"{product_image.pk}_{kind}_{uuid.uuid4().hex[:6]}.{ext}", ContentFile(content), save=False)
+                written.append(rendition.file.name)
+                renditions.append(rendition)
+        with transaction.atomic():
+            # Old rendition files are queued for deletion by the post_delete signal
+            product_image.renditions.all().delete()
+            ProductImageRendition.objects.bulk_create(renditions)
+            product_image.rendition_status = 'ready'
+            product_image.save(update_fields=['image', 'width', 'height', 'bytes', 'rendition_status'])
+            storage_cleanup.enqueue([replaced_original])
+    except Exception:
+        logger.exception("Failed to generate renditions for product image %s", image_id)
+        ProductImage.objects.filter(pk=image_id).update(rendition_status='failed')
+        # Files written before the failure are not referenced by any row
+        storage_cleanup.enqueue(written)
+
+
+def _run_in_worker(image_id):
+    try:
+        generate_renditions(image_id)
+    finally:
+        # Worker threads get their own DB connection; don't leak it
+        connection.close()
+
+
+def schedule_renditions(image_id):
+    """Generate renditions off the request thread once the current transaction commits."""
+    if not getattr(settings, 'IMAGE_RENDITIONS_ASYNC', True):
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, image_id))
+
+
+def rendition_map(product_image):
+    """``{kind: {format: {url, width, height, bytes}}}`` from the (prefetched) renditions."""
+    result = {}
+    for rendition in product_image.renditions.all():
+        result.setdefault(rendition.kind, {})[rendition.format] = {
+            'url': rendition.file.url,
+            'width': rendition.width,
+            'height': rendition.height,
+            'bytes': rendition.bytes,
+        }
+    return result
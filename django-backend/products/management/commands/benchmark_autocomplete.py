@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from products.autocomplete import PrefixIndex, normalize
+
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Furniture', 'Food', 'Other']
+WORDS = (
+    'apple samsung iphone galaxy laptop charger hp dell lenovo textbook calculus physics chemistry '
+    'economics shoes sneakers jacket hoodie desk chair mattress fan kettle rice cooker blender '
+    'headphones earbuds speaker bluetooth monitor keyboard mouse printer router tablet pro max mini'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the autocomplete prefix index for synthetic products in memory and report build '
+        'time, memory and lookup latency. Touches no database tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--universities', type=int, default=20)
+        parser.add_argument('--lookups', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        # A few real product words plus a long tail of made-up ones, drawn with a skew
+        vocabulary = WORDS + [
+            ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 9))) for _ in range(5000)
+        ]
+        word_weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        rows = [
+            (
+                pk,
+                rng.randint(1, options['universities']),
+                ' '.join(rng.choices(vocabulary, word_weights, k=rng.randint(2, 6))) + f' {rng.randint(1, 999)}',
+                rng.choice(CATEGORIES),
+            )
+            for pk in range(1, options['products'] + 1)
+        ]
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = PrefixIndex.build(rows)
+        built = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{len(rows):,} products -> {len(index):,} entries in {built:.2f}s, '
+            f'peak {memory / 2 ** 20:.0f} MiB'
+        )
+
+        prefixes = []
+        for _ in range(options['lookups']):
+            word = normalize(rng.choices(vocabulary, word_weights)[0])
+            prefixes.append((word[:rng.randint(1, len(word))], rng.choice([None, rng.randint(1, options['universities'])])))
+        for label in ('first lookups', 'repeat lookups'):
+            timings = []
+            for prefix, university_id in prefixes:
+                started = time.perf_counter()
+                index.lookup(prefix, university_id, 8)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{label}: p50 {statistics.median(timings):.3f} ms   p99 {timings[int(len(timings) * 0.99)]:.3f} ms   '
+                f'max {timings[-1]:.3f} ms'
+            )
+
+        started = time.perf_counter()
+        for pk, university_id, name, category in rows[:1000]:
+            index.set_product(pk, university_id, name + ' v2', category)
+        self.stdout.write(f'incremental update: {(time.perf_counter() - started):.3f} ms per product')
+
+        timings = []
+        for (prefix, university_id), (pk, university_id_, name, category) in zip(prefixes, rows[1000:]):
+            # Interleave writes with reads: every lookup follows a product being taken down
+            index.remove_product(pk)
+            started = time.perf_counter()
+            index.lookup(prefix, university_id, 8)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'lookups between removals: p50 {statistics.median(timings):.3f} ms   '
+            f'p99 {timings[int(len(timings) * 0.99)]:.3f} ms   max {timings[-1]:.3f} ms'
+        )
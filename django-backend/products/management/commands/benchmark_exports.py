@@ -0,0 +1,128 @@
+import gc
+import os
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from products.models import Product
+
+
+def create_orders(buyer_id, count, product_id):
+    """Insert ``count`` paid orders of one item each in SQL, so building them does not inflate this process's RSS."""
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s) '
+            f'INSERT INTO {Order._meta.db_table} (buyer_id, total, status, payment_method, payment_status, '
+            'paystack_reference, delivery_address, rollup_state, created_at, updated_at) '
+            "SELECT %s, 10, 'processing', 'paystack', 'paid', %s || i, 'Hall 3, Room 12', '', %s, %s FROM n",
+            [count, buyer_id, f'EXPORT-{buyer_id}-', now, now],
+        )
+        cursor.execute(
+            f'INSERT INTO {OrderItem._meta.db_table} (order_id, product_id, name, price, quantity, category, seller_name) '
+            f"SELECT id, %s, 'Export product', 10, 1, 'Other', 'Export Admin' FROM {Order._meta.db_table} "
+            'WHERE buyer_id = %s',
+            [product_id, buyer_id],
+        )
+
+
+class RSSSampler:
+    """Peak resident set size of this process while in the ``with`` block, sampled every few ms."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    @staticmethod
+    def current():
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        gc.collect()
+        self.baseline = self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+    @property
+    def growth_mb(self):
+        return (self.peak - self.baseline) / 2 ** 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the streaming admin exports: rows/sec and peak RSS growth for a small and a large '
+        'export of orders and order items, in CSV and NDJSON, against loading the same rows into a list. '
+        'All generated rows are rolled back at the end. Linux only (reads /proc).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Orders in the large export')
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/statm'):
+            raise CommandError('Needs /proc to measure RSS.')
+        with transaction.atomic():
+            self.benchmark(options['rows'])
+            transaction.set_rollback(True)
+
+    def benchmark(self, rows):
+        User = get_user_model()
+        admin = User.objects.create_user(email='export-admin@example.com', password=None,
+                                         first_name='Export', last_name='Admin', is_staff=True)
+        small = User.objects.create_user(email='export-small@example.com', password=None, first_name='Small', last_name='Buyer')
+        large = User.objects.create_user(email='export-large@example.com', password=None, first_name='Large', last_name='Buyer')
+        product = Product.objects.create(name='Export product', description='', price=10, category='Other',
+                                         condition='good', seller=admin, stock=1)
+        create_orders(small.pk, rows // 100, product.pk)
+        create_orders(large.pk, rows, product.pk)
+        client = APIClient()
+        client.force_authenticate(admin)
+        for path in ('/api/orders/export', '/api/orders/items/export'):
+            for export_format in ('csv', 'ndjson'):
+                for buyer in (small, large):
+                    self.run(client, f'{path}.{export_format}?buyer={buyer.pk}')
+
+        with RSSSampler() as sampler:
+            started = time.perf_counter()
+            count = len(list(Order.objects.filter(buyer=large).values()))
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'for comparison, list(values()) of {count:,} orders: {elapsed:.2f}s, '
+            f'peak RSS +{sampler.growth_mb:.1f} MB'
+        )
+
+    def run(self, client, url):
+        with RSSSampler() as sampler:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} answered {response.status_code}')
+            size = lines = 0
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+            elapsed = time.perf_counter() - started
+        rows = lines - 1 if url.split('?')[0].endswith('.csv') else lines
+        self.stdout.write(
+            f'{url.split("?")[0]:<32} {rows:>9,} rows, {size / 2 ** 20:7.1f} MB in {elapsed:6.2f}s '
+            f'({rows / elapsed:>9,.0f} rows/s), peak RSS +{sampler.growth_mb:.1f} MB'
+        )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.models import Product
+from products import facets, search
+
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Furniture', 'Food', 'Other']
+WORDS = ['laptop', 'phone', 'textbook', 'mattress', 'kettle', 'jacket', 'desk', 'lamp', 'fan', 'iron']
+CONDITIONS = [value for value, _ in Product.CONDITION_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time an uncached facets computation against FACETS_TIMEOUT_MS on a synthetic catalog. '
+        'All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(sorted(options['rows']), options['repeat'], options['batch_size'])
+            transaction.set_rollback(True)
+
+    def run(self, sizes, repeat, batch_size):
+        rng = random.Random(42)
+        backend = search.get_backend()
+        seller = get_user_model().objects.create_user(email='facets-benchmark@example.com', password=None)
+        factory = APIRequestFactory()
+        budget = facets._timeout_ms()
+        created = 0
+
+        for size in sizes:
+            while created < size:
+                count = min(batch_size, size - created)
+                products = Product.objects.bulk_create([self.make_product(rng, seller) for _ in range(count)])
+                backend.index(
+                    search.document_row(p.pk, p.name, p.description, p.category, p.features) for p in products
+                )
+                created += count
+
+            self.stdout.write(f'\n{size:,} rows (budget {budget} ms)')
+            for params in ({}, {'search': 'laptop'}):
+                request = Request(factory.get('/', params))
+                best = float('inf')
+                for _ in range(repeat):
+                    cache.clear()
+                    start = time.perf_counter()
+                    facets.compute(request)
+                    best = min(best, time.perf_counter() - start)
+                ms = best * 1000
+                verdict = 'ok' if ms <= budget else 'OVER BUDGET'
+                self.stdout.write(f'  {str(params or "all"):24} {ms:9.2f} ms  {verdict}')
+
+    def make_product(self, rng, seller):
+        return Product(
+            name=f'{rng.choice(WORDS)} {rng.randint(1, 9999)}'.title(),
+            description='benchmark product',
+            price=round(rng.lognormvariate(4, 1), 2),
+            category=rng.choice(CATEGORIES),
+            condition=rng.choice(CONDITIONS),
+            features=[],
+            seller=seller,
+        )
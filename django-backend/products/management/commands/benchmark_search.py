@@ -0,0 +1,98 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.models import Product
+from products import search
+
+WORDS = [
+    'laptop', 'phone', 'charger', 'textbook', 'calculator', 'mattress', 'fan', 'kettle',
+    'sneakers', 'jacket', 'headphones', 'desk', 'chair', 'lamp', 'backpack', 'printer',
+    'monitor', 'keyboard', 'mouse', 'speaker', 'iron', 'blender', 'camera', 'tablet',
+]
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Furniture', 'Food', 'Other']
+QUERIES = ['laptop', 'blue headphones', 'desk lamp', 'xyznotfound']
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'su', 'ta', 'ri', 'po', 'da', 've', 'zu', 'fa', 'go', 'he', 'bi', 'wo']
+
+
+class LegacySearchView:
+    search_fields = ['name', 'description', 'category', 'features']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full-text product search with the old SearchFilter icontains scan '
+        'on a synthetic catalog. All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        self.stdout.write(f'Search backend: {type(backend).__name__}')
+        with transaction.atomic():
+            self.run(backend, sorted(options['rows']), options['repeat'], options['batch_size'])
+            transaction.set_rollback(True)
+
+    def run(self, backend, sizes, repeat, batch_size):
+        rng = random.Random(42)
+        # Filler vocabulary so the product words above are as selective as in a real catalog
+        self.filler = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(5000)]
+        seller = get_user_model().objects.create_user(email='search-benchmark@example.com', password=None)
+        factory = APIRequestFactory()
+        legacy = filters.SearchFilter()
+        created = 0
+
+        for size in sizes:
+            while created < size:
+                count = min(batch_size, size - created)
+                products = Product.objects.bulk_create([self.make_product(rng, seller) for _ in range(count)])
+                backend.index(
+                    search.document_row(p.pk, p.name, p.description, p.category, p.features) for p in products
+                )
+                created += count
+
+            self.stdout.write(f'\n{size:,} rows')
+            for query in QUERIES:
+                request = Request(factory.get('/', {'search': query}))
+                old_qs = legacy.filter_queryset(request, Product.objects.all(), LegacySearchView())
+                new_qs = search.ProductSearchFilter().filter_queryset(request, Product.objects.all(), None)
+                old_ms, old_count = self.time_page(old_qs, repeat)
+                new_ms, new_count = self.time_page(new_qs, repeat)
+                speedup = old_ms / new_ms if new_ms else float('inf')
+                self.stdout.write(
+                    f'  {query!r:20} SearchFilter {old_ms:9.2f} ms ({old_count} hits)   '
+                    f'full-text {new_ms:9.2f} ms ({new_count} hits)   x{speedup:.1f}'
+                )
+
+    def time_page(self, queryset, repeat):
+        """Time what the list view does per request: a count plus the first page of 20."""
+        best = float('inf')
+        count = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = queryset.count()
+            list(queryset.values_list('id', flat=True)[:20])
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, count
+
+    def make_product(self, rng, seller):
+        words = [rng.choice(WORDS) if rng.random() < 0.2 else rng.choice(self.filler) for _ in range(3)]
+        return Product(
+            name=' '.join(words[:2]).title(),
+            description=' '.join(rng.choices(self.filler, k=30) + [rng.choice(['blue', 'used', 'cheap', 'new'])]),
+            price=rng.randint(5, 5000),
+            category=rng.choice(CATEGORIES),
+            condition='good',
+            features=[words[2], rng.choice(['blue', 'black', 'red'])],
+            seller=seller,
+        )
@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.cards import refresh_cards
+from products.models import Product, ProductImage
+from products.serializers import ProductSerializer, ProductCardRowSerializer
+
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Furniture', 'Food', 'Other']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows/sec of ProductSerializer(many=True) with the ?view=card row serializer '
+        '(query + serialization). All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[20, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(sorted(options['rows']), options['repeat'])
+            transaction.set_rollback(True)
+
+    def run(self, sizes, repeat):
+        rng = random.Random(42)
+        seller = get_user_model().objects.create_user(
+            email='serializer-benchmark@example.com', password=None, first_name='Bench', last_name='Seller'
+        )
+        products = Product.objects.bulk_create([self.make_product(rng, seller, i) for i in range(max(sizes))])
+        ProductImage.objects.bulk_create(
+            [ProductImage(product=p, image=f'product_images/bench_{p.pk}_{n}.jpg') for p in products for n in range(3)]
+        )
+        refresh_cards([p.pk for p in products])
+        request = Request(APIRequestFactory().get('/api/products/'))
+
+        for size in sizes:
+            full = self.rows_per_sec(size, repeat, lambda: ProductSerializer(
+                Product.objects.select_related('seller').prefetch_related('images__renditions')[:size],
+                many=True, context={'request': request},
+            ).data)
+            sparse = self.rows_per_sec(size, repeat, lambda: ProductSerializer(
+                Product.objects.select_related('seller').prefetch_related('images__renditions')[:size],
+                many=True, context={'request': request}, fields=['id', 'name', 'price', 'createdAt'],
+            ).data)
+            card = self.rows_per_sec(size, repeat, lambda: ProductCardRowSerializer(
+                Product.objects.values(*ProductCardRowSerializer.values_fields)[:size], request=request,
+            ).data)
+            self.stdout.write(
+                f'{size:>6} rows   ProductSerializer {full:>10,.0f} rows/s   '
+                f'?fields= (4) {sparse:>10,.0f} rows/s   ?view=card {card:>10,.0f} rows/s   x{card / full:.1f}'
+            )
+
+    def rows_per_sec(self, size, repeat, serialize):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = serialize()
+            best = min(best, time.perf_counter() - start)
+        return len(rows) / best if best else float('inf')
+
+    def make_product(self, rng, seller, i):
+        return Product(
+            name=f'Benchmark product {i}',
+            description=' '.join(rng.choices(['used', 'clean', 'works', 'great', 'campus', 'pickup'], k=120)),
+            price=rng.randint(5, 5000),
+            category=rng.choice(CATEGORIES),
+            condition='good',
+            features=['charger included', 'original box', 'warranty'],
+            seller=seller,
+        )
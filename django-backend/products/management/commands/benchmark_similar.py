@@ -0,0 +1,77 @@
+import random
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product, ProductCard
+from products import similar
+
+CATEGORIES = {
+    'Electronics': ['laptop', 'phone', 'charger', 'headphones', 'monitor', 'keyboard', 'mouse', 'speaker', 'tablet'],
+    'Books': ['textbook', 'novel', 'calculus', 'economics', 'biology', 'chemistry', 'law', 'notes'],
+    'Clothing': ['jacket', 'sneakers', 'dress', 'shirt', 'jeans', 'hoodie', 'kente', 'sandals'],
+    'Furniture': ['desk', 'chair', 'mattress', 'shelf', 'lamp', 'table', 'wardrobe'],
+    'Appliances': ['fan', 'kettle', 'iron', 'blender', 'fridge', 'microwave', 'cooker'],
+}
+ADJECTIVES = ['black', 'blue', 'red', 'white', 'small', 'large', 'portable', 'wireless', 'original', 'cheap']
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'su', 'ta', 'ri', 'po', 'da', 've', 'zu', 'fa', 'go', 'he', 'bi', 'wo']
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the similar-products index for a synthetic catalog and report throughput '
+        'and peak memory. All generated rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--k', type=int, default=similar.TOP_K)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options['rows'], options['k'], options['batch_size'])
+            transaction.set_rollback(True)
+
+    def run(self, size, k, batch_size):
+        rng = random.Random(42)
+        filler = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(5000)]
+        seller = get_user_model().objects.create_user(email='similar-benchmark@example.com', password=None)
+        for start in range(0, size, 5000):
+            products = Product.objects.bulk_create(
+                [self.make_product(rng, filler, seller) for _ in range(min(5000, size - start))]
+            )
+            ProductCard.objects.bulk_create([
+                ProductCard(product_id=p.pk, name=p.name, price=p.price, condition=p.condition, category=p.category,
+                            status=p.status, seller_id=seller.pk, seller_name='', created_at=p.created_at)
+                for p in products
+            ])
+
+        tracemalloc.start()
+        stats = similar.refresh(full=True, k=k, batch_size=batch_size)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(f"{stats['products']:,} products, vocabulary {stats['vocabulary']:,} terms, "
+                          f"{stats['matrix_nnz']:,} non-zeros ({stats['matrix_bytes'] / 2**20:.1f} MiB)")
+        self.stdout.write(f"  load + vectorize {stats['vectorize_seconds']:8.2f} s")
+        self.stdout.write(f"  neighbours       {stats['neighbors_seconds']:8.2f} s  "
+                          f"({stats['neighbors']:,} rows written)")
+        self.stdout.write(f"  total            {stats['total_seconds']:8.2f} s  "
+                          f"{stats['refreshed'] / stats['total_seconds']:,.0f} products/s")
+        self.stdout.write(f"  peak Python memory {peak / 2**20:.1f} MiB")
+
+    def make_product(self, rng, filler, seller):
+        category = rng.choice(list(CATEGORIES))
+        nouns = CATEGORIES[category]
+        return Product(
+            name=f'{rng.choice(ADJECTIVES)} {rng.choice(nouns)} {rng.choice(filler)}'.title(),
+            description=' '.join(rng.choices(filler, k=25) + rng.choices(nouns, k=2) + rng.choices(ADJECTIVES, k=2)),
+            price=rng.randint(5, 5000),
+            category=category,
+            condition='good',
+            features=[rng.choice(ADJECTIVES), rng.choice(filler)],
+            seller=seller,
+        )
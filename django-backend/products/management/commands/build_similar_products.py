@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from products import similar
+
+
+class Command(BaseCommand):
+    help = 'Recompute the similar-products neighbour lists (only changed products unless --full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every active product')
+        parser.add_argument('--k', type=int, default=similar.TOP_K)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        stats = similar.refresh(full=options['full'], k=options['k'], batch_size=options['batch_size'])
+        rate = stats['refreshed'] / stats['total_seconds'] if stats['total_seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {stats['refreshed']} of {stats['products']} products "
+            f"({stats['neighbors']} neighbours, {stats['removed']} stale rows removed) "
+            f"in {stats['total_seconds']:.1f}s, {rate:,.0f} products/s."
+        ))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products.models import ImageUpload
+from products.uploads import delete_chunks
+from products import storage_cleanup
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked image uploads that were abandoned or never attached to a product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = ImageUpload.objects.filter(status__in=['open', 'complete'], updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            delete_chunks(upload)
+            upload.delete()
+            storage_cleanup.enqueue([upload.file.name])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} uploads.'))
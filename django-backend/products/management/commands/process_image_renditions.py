@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from products.models import ProductImage
+from products.images import generate_renditions
+
+
+class Command(BaseCommand):
+    help = 'Generate renditions for product images still pending (or failed, with --retry-failed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true')
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+        ids = ProductImage.objects.filter(rendition_status__in=statuses).order_by('id').values_list('id', flat=True)
+        if options['limit']:
+            ids = ids[:options['limit']]
+        ids = list(ids)
+        for image_id in ids:
+            generate_renditions(image_id)
+        failed = ProductImage.objects.filter(pk__in=ids, rendition_status='failed').count()
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(ids)} images ({failed} failed).'))
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from products import storage_cleanup
+from products.models import StorageDeletion
+
+
+class Command(BaseCommand):
+    help = 'Delete queued product files from storage, retrying failures; optionally look for orphaned files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep draining the queue every --interval seconds')
+        parser.add_argument('--interval', type=int, default=30)
+        parser.add_argument('--find-orphans', action='store_true',
+                            help=f'List files under {storage_cleanup.ORPHAN_PREFIX} that no row references')
+        parser.add_argument('--enqueue-orphans', action='store_true', help='Queue the orphans found for deletion')
+        parser.add_argument('--orphan-min-age-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        if options['find_orphans'] or options['enqueue_orphans']:
+            self.handle_orphans(options)
+        while True:
+            deleted, failed = storage_cleanup.drain(options['batch_size'])
+            if deleted or failed or not options['loop']:
+                waiting = StorageDeletion.objects.count()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Deleted {deleted} files ({failed} failed, {waiting} still queued).'
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def handle_orphans(self, options):
+        min_age = timedelta(hours=options['orphan_min_age_hours'])
+        orphans = list(storage_cleanup.find_orphans(min_age=min_age))
+        for name in orphans:
+            self.stdout.write(name)
+        if options['enqueue_orphans']:
+            for start in range(0, len(orphans), 500):
+                storage_cleanup.enqueue(orphans[start:start + 500])
+        self.stdout.write(self.style.SUCCESS(
+            f"Found {len(orphans)} orphaned files{' (queued for deletion)' if options['enqueue_orphans'] else ''}."
+        ))
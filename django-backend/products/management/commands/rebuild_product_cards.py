@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products import cards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ProductCard feed read model from products, images, ratings and sellers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = cards.rebuild_cards(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} product cards.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Product
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents for all products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        if type(backend) is search.BaseSearchBackend:
+            self.stdout.write(self.style.WARNING('No full-text index available for this database; nothing to rebuild.'))
+            return
+        with transaction.atomic():
+            total = search.rebuild_index(Product.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} products ({backend.vendor}).'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products import ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute Product.rating_sum/rating_count from ProductRating and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = ratings.reconcile(batch_size=options['batch_size'])
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'Repaired rating aggregates on {len(fixed)} products: {fixed[:20]}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Rating aggregates are consistent.'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products import ranking
+
+
+class Command(BaseCommand):
+    help = (
+        'Rescore products for the featured feed. By default only products with activity '
+        'since the previous run are rescored; use --full (e.g. nightly) to rescore everything.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rescore every active product')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        result = ranking.refresh(full=options['full'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {result['scored']} products, removed {result['removed']} stale rankings in {elapsed:.2f}s."
+        ))
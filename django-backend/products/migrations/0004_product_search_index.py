@@ -0,0 +1,92 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def features_text(features):
+    """Flatten the ``features`` JSON into plain text, as products/search.py did when this was written."""
+    if not features:
+        return ''
+    if isinstance(features, dict):
+        return ' '.join(f"{key} {value}" for key, value in features.items())
+    if isinstance(features, (list, tuple)):
+        return ' '.join(features_text(item) if isinstance(item, (list, tuple, dict)) else str(item) for item in features)
+    return str(features)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products_product_search (
+                product_id bigint PRIMARY KEY REFERENCES products_product (id) ON DELETE CASCADE,
+                document tsvector NOT NULL
+            )
+            """
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS products_product_search_document_gin "
+            "ON products_product_search USING gin (document)"
+        )
+    elif connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+                "name, description, category, features, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains filtering
+            return
+    else:
+        return
+
+    if connection.vendor == 'postgresql':
+        insert = """
+            INSERT INTO products_product_search (product_id, document)
+            VALUES (
+                %s,
+                setweight(to_tsvector('simple', %s), 'A') ||
+                setweight(to_tsvector('simple', %s), 'D') ||
+                setweight(to_tsvector('simple', %s), 'B') ||
+                setweight(to_tsvector('simple', %s), 'C')
+            )
+            ON CONFLICT (product_id) DO NOTHING
+        """
+    else:
+        insert = (
+            "INSERT INTO products_product_fts (rowid, name, description, category, features) "
+            "VALUES (%s, %s, %s, %s, %s)"
+        )
+
+    Product = apps.get_model('products', 'Product')
+    rows = Product.objects.order_by().values_list('id', 'name', 'description', 'category', 'features')
+    batch = []
+    with connection.cursor() as cursor:
+        for product_id, name, description, category, features in rows.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            batch.append((product_id, name or '', description or '', category or '', features_text(features)))
+            if len(batch) == BACKFILL_BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_search")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_alter_product_options_alter_product_category_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def build_product_cards(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductCard = apps.get_model('products', 'ProductCard')
+    products = (
+        Product.objects.select_related('seller')
+        .prefetch_related('images')
+        .annotate(avg_rating=Avg('ratings__rating'), num_ratings=Count('ratings'))
+        .order_by('pk')
+    )
+    cards = []
+    for product in products.iterator(chunk_size=500):
+        seller = product.seller
+        images = sorted(product.images.all(), key=lambda image: image.pk)
+        cover = ''
+        if images and images[0].image:
+            try:
+                cover = images[0].image.url
+            except ValueError:
+                cover = str(images[0].image)
+        cards.append(ProductCard(
+            product_id=product.pk,
+            name=product.name,
+            price=product.price,
+            condition=product.condition,
+            category=product.category,
+            status=product.status,
+            seller_id=seller.pk,
+            seller_name=f"{seller.first_name} {seller.last_name}".strip() or seller.email,
+            university_id=seller.university_id,
+            cover_image=cover,
+            rating_average=product.avg_rating or 0,
+            rating_count=product.num_ratings,
+            created_at=product.created_at,
+        ))
+    ProductCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search_index'),
+        ('users', '0004_notificationlog_pushtoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('condition', models.CharField(choices=[('new', 'New'), ('like_new', 'Like New'), ('very_good', 'Very Good'), ('good', 'Good'), ('acceptable', 'Acceptable')], max_length=20)),
+                ('category', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('sold', 'Sold'), ('suspended', 'Suspended'), ('hidden', 'Hidden')], max_length=20)),
+                ('seller_name', models.CharField(max_length=255)),
+                ('cover_image', models.CharField(blank=True, default='', max_length=1000)),
+                ('rating_average', models.FloatField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('university', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.university')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', '-created_at'], name='products_pr_status_a89387_idx'), models.Index(fields=['university', 'status', '-created_at'], name='products_pr_univers_329f4c_idx'), models.Index(fields=['category', 'status', '-created_at'], name='products_pr_categor_213855_idx')],
+            },
+        ),
+        migrations.RunPython(build_product_cards, migrations.RunPython.noop),
+    ]
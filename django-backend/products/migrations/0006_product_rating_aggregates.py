@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:34
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductRating = apps.get_model('products', 'ProductRating')
+    totals = ProductRating.objects.order_by().values('product_id').annotate(total=Sum('rating'), num=Count('id'))
+    for row in totals.iterator():
+        Product.objects.filter(pk=row['product_id']).update(rating_sum=row['total'], rating_count=row['num'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
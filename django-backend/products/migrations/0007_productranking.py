@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_rating_aggregates'),
+        ('users', '0004_notificationlog_pushtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='products.productcard')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('university', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.university')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['university', '-score'], name='products_pr_univers_d1d0a5_idx'), models.Index(fields=['-score'], name='products_pr_score_b40936_idx'), models.Index(fields=['computed_at'], name='products_pr_compute_ffdc40_idx')],
+            },
+        ),
+    ]
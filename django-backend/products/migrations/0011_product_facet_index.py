@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_storagedeletion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'condition', 'price'], name='products_pr_categor_f1294c_idx'),
+        ),
+    ]
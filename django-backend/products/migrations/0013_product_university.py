@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_product_university(apps, schema_editor):
+    """
+    Copy each seller's university and campus onto their products, one id range per
+    transaction so no lock is held for longer than a single batch.
+    """
+    Product = apps.get_model('products', 'Product')
+    User = apps.get_model('users', 'User')
+    seller = User.objects.filter(pk=OuterRef('seller_id'))
+    last_id = 0
+    while True:
+        ids = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:BACKFILL_BATCH_SIZE])
+        if not ids:
+            return
+        with transaction.atomic():
+            Product.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(
+                university_id=Subquery(seller.values('university_id')[:1]),
+                campus_id=Subquery(seller.values('campus_id')[:1]),
+            )
+        last_id = ids[-1]
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    ``AddIndex`` that builds the index with ``CREATE INDEX CONCURRENTLY`` on PostgreSQL,
+    so writes to the table carry on while it builds. Other databases add it as usual.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+    # Lets the backfill commit batch by batch (the new columns are nullable, so adding them is
+    # instant) and the indexes build concurrently, which cannot happen inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('products', '0012_productneighbor'),
+        ('users', '0004_notificationlog_pushtoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='campus',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.campus'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='university',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.university'),
+        ),
+        # Backfill before building the indexes so they are written once
+        migrations.RunPython(backfill_product_university, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['university', 'status', '-created_at'], name='products_pr_univers_497d5d_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['university', 'category', '-created_at'], name='products_pr_univers_d0c178_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['campus', 'status', '-created_at'], name='products_pr_campus__6fbb92_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_university'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductViewStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_stats', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='products_pr_date_abb93f_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+    ]
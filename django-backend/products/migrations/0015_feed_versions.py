@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_productviewstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=20, unique=True)),
+                ('version', models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -27,6 +29,12 @@ class Product(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active', db_index=True)
     stock = models.PositiveIntegerField(default=1)
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products', db_index=True)
+    # Copied from the seller (see products/signals.py) so feeds filter without joining users
+    university = models.ForeignKey('users.University', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    campus = models.ForeignKey('users.Campus', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Running rating aggregates, maintained by products.ratings.record_rating
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -36,20 +44,114 @@ class Product(models.Model):
             models.Index(fields=['seller', 'status']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['price', 'category']),
+            # Covers the facet counts' GROUP BY category, condition, price bucket
+            models.Index(fields=['category', 'condition', 'price']),
+            models.Index(fields=['university', 'status', '-created_at']),
+            models.Index(fields=['university', 'category', '-created_at']),
+            models.Index(fields=['campus', 'status', '-created_at']),
         ]
         ordering = ['-created_at']
 
     def __str__(self):
         return self.name
 
+    def get_rating_average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
 class ProductImage(models.Model):
+    RENDITION_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Filled in by products.images once the upload has been normalized
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bytes = models.PositiveIntegerField(null=True, blank=True)
+    rendition_status = models.CharField(max_length=10, choices=RENDITION_STATUS_CHOICES, default='pending', db_index=True)
 
     def __str__(self):
         return f"Image for {self.product.name}"
 
+class ProductImageRendition(models.Model):
+    """A resized, EXIF-free copy of a ProductImage (see products/images.py)."""
+    KIND_CHOICES = [
+        ('thumb', 'Thumbnail'),
+        ('card', 'Card'),
+        ('detail', 'Detail'),
+    ]
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    image = models.ForeignKey(ProductImage, on_delete=models.CASCADE, related_name='renditions')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    file = models.ImageField(upload_to='product_images/renditions/')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    bytes = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('image', 'kind', 'format')
+
+    def __str__(self):
+        return f"{self.kind} {self.format} of image {self.image_id}"
+
+class ImageUpload(models.Model):
+    """
+    A resumable chunked image upload (see products/uploads.py).
+
+    Chunks are written to storage as they arrive; ``complete`` assembles them into
+    ``file``, which product create/update can then attach by id instead of base64.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+        ('attached', 'Attached'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='image_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveIntegerField()
+    received = models.PositiveIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    file = models.ImageField(upload_to='product_images/', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.size} bytes)"
+
+class StorageDeletion(models.Model):
+    """
+    A storage key waiting to be deleted (see products/storage_cleanup.py).
+
+    Rows are written in the same transaction that deletes the owning record, so a
+    rolled-back delete never loses its file and a committed one never leaks it.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 class ProductRating(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='ratings')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_ratings')
@@ -63,4 +165,114 @@ class ProductRating(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.product.name} rated {self.rating} by {self.user}"
\ No newline at end of file
+        return f"{self.product.name} rated {self.rating} by {self.user}"
+
+class ProductCard(models.Model):
+    """
+    Denormalized read model for the product feeds.
+
+    One row per product holding exactly what a feed card shows, so the
+    featured/recent endpoints read a single table with no joins. Rows are kept
+    current by the signals in ``products/signals.py`` and can be rebuilt with
+    ``python manage.py rebuild_product_cards``.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    condition = models.CharField(max_length=20, choices=Product.CONDITION_CHOICES)
+    category = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=Product.STATUS_CHOICES)
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    seller_name = models.CharField(max_length=255)
+    university = models.ForeignKey('users.University', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    cover_image = models.CharField(max_length=1000, blank=True, default='')
+    rating_average = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['university', 'status', '-created_at']),
+            models.Index(fields=['category', 'status', '-created_at']),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Card for {self.name}"
+
+
+class ProductRanking(models.Model):
+    """
+    Popularity score per product, materialized by ``python manage.py refresh_rankings``.
+
+    Scores are time-invariant (see ``products/ranking.py``), so only products with
+    new activity need rescoring and the featured feed is a single index scan on
+    ``(university, -score)``.
+    """
+    card = models.OneToOneField(ProductCard, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    university = models.ForeignKey('users.University', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['university', '-score']),
+            models.Index(fields=['-score']),
+            models.Index(fields=['computed_at']),
+        ]
+
+    def __str__(self):
+        return f"Ranking for product {self.card_id}: {self.score:.3f}"
+
+class ProductNeighbor(models.Model):
+    """
+    One of a product's most similar products by content, precomputed by
+    ``python manage.py build_similar_products`` (see products/similar.py).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(ProductCard, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('product', 'rank')
+
+    def __str__(self):
+        return f"#{self.rank} neighbor of product {self.product_id}: {self.neighbor_id} ({self.score:.3f})"
+
+class ProductViewStat(models.Model):
+    """
+    Detail-page views of a product on one day.
+
+    Views are counted in memory by each worker and added here in batches (see
+    products/view_counts.py), so reading a product never writes to the database.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='view_stats')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('product', 'date')
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.views} views of product {self.product_id} on {self.date}"
+
+
+class FeedVersion(models.Model):
+    """
+    Version number of one scope (a university id, or ``All``) of the cached product
+    feeds (see products/feed_cache.py). Kept in the database rather than the cache so
+    a bump from any process or management command reaches every worker.
+    """
+    scope = models.CharField(max_length=20, unique=True)
+    version = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Feed version {self.version} of {self.scope}"
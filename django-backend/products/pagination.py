@@ -0,0 +1,159 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Keyset pagination over ``(-created_at, -id)``.
+
+    Each page is a single ``WHERE created_at <= %s ... ORDER BY created_at DESC, id DESC LIMIT n``
+    query that can walk the ``(status, -created_at)`` and ``(category, -created_at)`` indexes,
+    so page 500 costs the same as page 1 and no ``COUNT(*)`` is run. Cursors are opaque
+    base64 tokens; the primary key breaks ties between products created in the same instant.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('-created_at', '-pk')
+        reverse = False
+        if position is not None:
+            created_at, pk, reverse = position
+            if reverse:
+                queryset = queryset.filter(created_at__gte=created_at).exclude(
+                    Q(created_at=created_at) & Q(pk__lte=pk)
+                ).order_by('created_at', 'pk')
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).exclude(
+                    Q(created_at=created_at) & Q(pk__gte=pk)
+                )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else True
+        self.has_previous = (position is not None) if not reverse else has_more
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(*self.position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(*self.position(self.page[0]), reverse=True)
+
+    def position(self, row):
+        # Rows are model instances, or dicts when the view paginates a ``.values()`` queryset
+        if isinstance(row, dict):
+            return row['created_at'], row['id']
+        return row.created_at, row.pk
+
+    def encode_cursor(self, created_at, pk, reverse):
+        token = f"{created_at.isoformat()}|{pk}|{int(reverse)}"
+        encoded = base64.urlsafe_b64encode(token.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            token = base64.urlsafe_b64decode(encoded.encode()).decode()
+            created_at, pk, reverse = token.split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(pk), bool(int(reverse))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ProductFeedPagination(pagination.PageNumberPagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+
+    Clients opt in with ``?pagination=cursor`` (or by following a ``cursor`` link);
+    older app versions keep getting ``count``/``next``/``previous`` page links.
+    Searches stay on page numbers because they are ordered by relevance, not date.
+    Cursors only walk ``-created_at``, so any other ``?ordering=`` is rejected with a
+    400 in keyset mode instead of being silently ignored.
+    """
+    mode_query_param = 'pagination'
+    keyset_ordering = ('-created_at',)
+
+    def __init__(self):
+        self.keyset = None
+
+    def use_keyset(self, request):
+        if request.query_params.get('search'):
+            return False
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+            if ordering and [field.strip() for field in ordering.split(',')] != list(self.keyset_ordering):
+                raise ValidationError({api_settings.ORDERING_PARAM: [
+                    'Cursor pagination is always newest first; drop ordering or use page numbers.'
+                ]})
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,164 @@
+"""
+Popularity ranking for the featured feed.
+
+A product's score is
+
+    created_at / RECENCY_TAU
+    + WISHLIST_WEIGHT * log1p(wishlist adds)
+    + ORDER_WEIGHT * log1p(units ordered)
+    + MESSAGE_WEIGHT * log1p(message threads)
+    + VIEW_WEIGHT * log1p(detail views)
+    + RATING_WEIGHT * (bayesian rating - RATING_PRIOR) * log1p(rating count)
+
+Ordering by this is the same as ordering by ``engagement * exp(-age / RECENCY_TAU)``,
+but the score of a product does not change as time passes. Rankings computed in
+different runs therefore stay comparable, and a refresh only has to rescore
+products that had activity since the previous run.
+
+Scores are computed with NumPy over batches of products and written to
+``ProductRanking`` by ``python manage.py refresh_rankings``.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+import numpy as np
+
+from .models import Product, ProductCard, ProductRanking, ProductRating, ProductViewStat
+from . import feed_cache
+
+RECENCY_TAU = 4 * 24 * 3600  # seconds; a product 4 days older needs e times the engagement to tie
+WISHLIST_WEIGHT = 1.0
+ORDER_WEIGHT = 1.5
+MESSAGE_WEIGHT = 0.75
+VIEW_WEIGHT = 0.25
+RATING_WEIGHT = 0.5
+RATING_PRIOR = 3.5
+RATING_PRIOR_COUNT = 3
+
+
+def score_products(created_ts, wishlists, units_ordered, threads, views, rating_sum, rating_count):
+    """Vectorized score for arrays of per-product signals (all the same length)."""
+    bayesian_rating = (rating_sum + RATING_PRIOR * RATING_PRIOR_COUNT) / (rating_count + RATING_PRIOR_COUNT)
+    return (
+        created_ts / RECENCY_TAU
+        + WISHLIST_WEIGHT * np.log1p(wishlists)
+        + ORDER_WEIGHT * np.log1p(units_ordered)
+        + MESSAGE_WEIGHT * np.log1p(threads)
+        + VIEW_WEIGHT * np.log1p(views)
+        + RATING_WEIGHT * (bayesian_rating - RATING_PRIOR) * np.log1p(rating_count)
+    )
+
+
+def _scatter(ids, rows):
+    """Turn ``(product_id, value)`` rows into an array aligned with the sorted ``ids``."""
+    values = np.zeros(len(ids), dtype=np.float64)
+    if rows:
+        keys, counts = np.array(rows, dtype=np.float64).T
+        values[np.searchsorted(ids, keys.astype(np.int64))] = counts
+    return values
+
+
+def score_batch(rows):
+    """
+    Score one batch of ``(id, university_id, created_at, rating_sum, rating_count)`` rows,
+    sorted by id. Runs four grouped queries for the engagement signals.
+    """
+    from messaging.models import MessageThread
+    from orders.models import OrderItem
+    from users.models import Wishlist
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    id_list = ids.tolist()
+    wishlists = Wishlist.objects.filter(product_id__in=id_list).order_by().values('product_id') \
+        .annotate(n=Count('id')).values_list('product_id', 'n')
+    units = OrderItem.objects.filter(product_id__in=id_list).exclude(order__status='cancelled').order_by() \
+        .values('product_id').annotate(n=Sum('quantity')).values_list('product_id', 'n')
+    threads = MessageThread.objects.filter(product_id__in=id_list).order_by().values('product_id') \
+        .annotate(n=Count('id')).values_list('product_id', 'n')
+    views = ProductViewStat.objects.filter(product_id__in=id_list).order_by().values('product_id') \
+        .annotate(n=Sum('views')).values_list('product_id', 'n')
+
+    scores = score_products(
+        created_ts=np.array([row[2].timestamp() for row in rows], dtype=np.float64),
+        wishlists=_scatter(ids, list(wishlists)),
+        units_ordered=_scatter(ids, list(units)),
+        threads=_scatter(ids, list(threads)),
+        views=_scatter(ids, list(views)),
+        rating_sum=np.array([row[3] for row in rows], dtype=np.float64),
+        rating_count=np.array([row[4] for row in rows], dtype=np.float64),
+    )
+    return ids, [row[1] for row in rows], scores
+
+
+def changed_product_ids(since):
+    """Ids of products with any ranking-relevant activity after ``since``."""
+    from messaging.models import MessageThread
+    from orders.models import OrderItem
+    from users.models import Wishlist
+
+    ids = set(Product.objects.filter(updated_at__gt=since).values_list('id', flat=True))
+    ids.update(Wishlist.objects.filter(created_at__gt=since).values_list('product_id', flat=True))
+    ids.update(OrderItem.objects.filter(
+        Q(order__created_at__gt=since) | Q(order__updated_at__gt=since)
+    ).values_list('product_id', flat=True))
+    ids.update(MessageThread.objects.filter(updated_at__gt=since).values_list('product_id', flat=True))
+    ids.update(ProductRating.objects.filter(updated_at__gt=since).values_list('product_id', flat=True))
+    ids.update(ProductViewStat.objects.filter(updated_at__gt=since).values_list('product_id', flat=True))
+    ids.discard(None)
+    return sorted(ids)
+
+
+def _product_rows(product_ids, batch_size):
+    """Yield batches of active product rows, either for ``product_ids`` or for all products."""
+    queryset = Product.objects.filter(status='active').order_by('id').values_list(
+        'id', 'university_id', 'created_at', 'rating_sum', 'rating_count'
+    )
+    if product_ids is None:
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+    else:
+        for start in range(0, len(product_ids), batch_size):
+            rows = list(queryset.filter(id__in=product_ids[start:start + batch_size]))
+            if rows:
+                yield rows
+
+
+def refresh(full=False, batch_size=2000):
+    """
+    Rescore products and upsert their ``ProductRanking`` rows.
+
+    Without ``full`` only products with activity since the previous run are rescored.
+    Returns a dict with ``scored`` and ``removed`` counts.
+    """
+    # Keep IN (...) lists within the backend's bound-parameter limit
+    batch_size = min(batch_size, connection.features.max_query_params or batch_size)
+    now = timezone.now()
+    last_run = None if full else ProductRanking.objects.order_by('-computed_at').values_list('computed_at', flat=True).first()
+    product_ids = None if last_run is None else changed_product_ids(last_run)
+
+    scored = 0
+    with transaction.atomic():
+        for rows in _product_rows(product_ids, batch_size):
+            ids, universities, scores = score_batch(rows)
+            card_ids = set(ProductCard.objects.filter(pk__in=ids.tolist()).values_list('pk', flat=True))
+            ProductRanking.objects.bulk_create(
+                [
+                    ProductRanking(card_id=pk, university_id=university, score=score, computed_at=now)
+                    for pk, university, score in zip(ids.tolist(), universities, scores.tolist())
+                    if pk in card_ids
+                ],
+                update_conflicts=True,
+                unique_fields=['card'],
+                update_fields=['university', 'score', 'computed_at'],
+            )
+            scored += len(card_ids)
+        removed, _ = ProductRanking.objects.exclude(card__status='active').delete()
+    if scored or removed:
+        from users.models import University
+        feed_cache.bump_versions(University.objects.values_list('id', flat=True))
+    return {'scored': scored, 'removed': removed}
@@ -0,0 +1,68 @@
+"""
+Incremental rating aggregates stored on ``Product.rating_sum`` / ``Product.rating_count``.
+
+Every rating create, change and delete is applied as a single
+``UPDATE ... SET rating_sum = rating_sum + %s`` so concurrent raters never
+overwrite each other. ``python manage.py reconcile_ratings`` repairs drift.
+"""
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Product, ProductRating
+from . import cards
+
+
+def rating_average_expression():
+    """``rating_sum / rating_count`` as a query expression (0 for unrated products), for sorting."""
+    return Coalesce(
+        Cast('rating_sum', FloatField()) / Cast(NullIf('rating_count', 0), FloatField()),
+        Value(0.0),
+    )
+
+
+def record_rating(product_id, old_rating, new_rating):
+    """
+    Apply one rating change to the product's aggregates.
+
+    ``old_rating`` is None for a new rating and ``new_rating`` is None for a deleted one.
+    """
+    delta_sum = (new_rating or 0) - (old_rating or 0)
+    delta_count = (new_rating is not None) - (old_rating is not None)
+    if delta_sum or delta_count:
+        Product.objects.filter(pk=product_id).update(
+            rating_sum=F('rating_sum') + delta_sum,
+            rating_count=F('rating_count') + delta_count,
+            # Invalidates the product detail ETag (see products/conditional.py)
+            updated_at=timezone.now(),
+        )
+    cards.refresh_cards_on_commit([product_id])
+
+
+def reconcile(batch_size=1000):
+    """Recompute aggregates from ``ProductRating`` and fix products that drifted. Returns the fixed ids."""
+    fixed = []
+    last_pk = 0
+    while True:
+        products = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'rating_sum', 'rating_count')[:batch_size]
+        )
+        if not products:
+            break
+        last_pk = products[-1][0]
+        actual = {
+            row['product_id']: (row['total'], row['num'])
+            for row in ProductRating.objects.filter(product_id__in=[pk for pk, _, _ in products])
+            .order_by().values('product_id').annotate(total=Sum('rating'), num=Count('id'))
+        }
+        drifted = [
+            Product(pk=pk, rating_sum=actual.get(pk, (0, 0))[0], rating_count=actual.get(pk, (0, 0))[1])
+            for pk, rating_sum, rating_count in products
+            if (rating_sum, rating_count) != actual.get(pk, (0, 0))
+        ]
+        if drifted:
+            Product.objects.bulk_update(drifted, ['rating_sum', 'rating_count'])
+            cards.refresh_cards([product.pk for product in drifted])
+            fixed.extend(product.pk for product in drifted)
+    return fixed
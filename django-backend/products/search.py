@@ -0,0 +1,240 @@
+"""
+Full-text search for products.
+
+Every product has a search document (name, description, category and the
+flattened ``features`` list) stored in a vendor-specific index:
+
+* PostgreSQL: ``products_product_search`` with a weighted ``tsvector`` column
+  and a GIN index.
+* SQLite: ``products_product_fts``, an FTS5 virtual table keyed by product id.
+
+The tables are created by ``products/migrations/0004_product_search_index.py``.
+Documents are kept in sync by the signals in ``products/signals.py`` and can be
+rebuilt with ``python manage.py rebuild_search_index``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from rest_framework import filters
+
+POSTGRES_TABLE = 'products_product_search'
+SQLITE_TABLE = 'products_product_fts'
+
+# Relative importance of each field when ranking results (name > category > features > description)
+FIELD_WEIGHTS = {
+    'name': 10.0,
+    'description': 1.0,
+    'category': 4.0,
+    'features': 2.0,
+}
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Split a raw ``?search=`` value into normalized terms."""
+    return TERM_RE.findall((query or '').lower())
+
+
+def features_text(features):
+    """Flatten the ``features`` JSON (usually a list of strings) into plain text."""
+    if not features:
+        return ''
+    if isinstance(features, dict):
+        return ' '.join(f"{key} {value}" for key, value in features.items())
+    if isinstance(features, (list, tuple)):
+        return ' '.join(features_text(item) if isinstance(item, (list, tuple, dict)) else str(item) for item in features)
+    return str(features)
+
+
+def document_row(product_id, name, description, category, features):
+    return (product_id, name or '', description or '', category or '', features_text(features))
+
+
+class BaseSearchBackend:
+    """Fallback backend: the same ``icontains`` scan that ``SearchFilter`` used to do."""
+
+    vendor = None
+
+    def is_available(self):
+        return True
+
+    def index(self, rows):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term) |
+                Q(category__icontains=term) | Q(features__icontains=term)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    vendor = 'postgresql'
+
+    def index(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"""
+                INSERT INTO {POSTGRES_TABLE} (product_id, document)
+                VALUES (
+                    %s,
+                    setweight(to_tsvector('simple', %s), 'A') ||
+                    setweight(to_tsvector('simple', %s), 'D') ||
+                    setweight(to_tsvector('simple', %s), 'B') ||
+                    setweight(to_tsvector('simple', %s), 'C')
+                )
+                ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                rows,
+            )
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE product_id = ANY(%s)", [product_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {POSTGRES_TABLE}")
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        table = queryset.model._meta.db_table
+        # Weights are listed D, C, B, A as ts_rank expects
+        return queryset.extra(
+            tables=[POSTGRES_TABLE],
+            where=[
+                f"{POSTGRES_TABLE}.product_id = {table}.id",
+                f"{POSTGRES_TABLE}.document @@ to_tsquery('simple', %s)",
+            ],
+            params=[tsquery],
+            select={
+                'search_rank': f"ts_rank('{{0.1, 0.2, 0.4, 1.0}}', {POSTGRES_TABLE}.document, to_tsquery('simple', %s))",
+            },
+            select_params=[tsquery],
+        )
+
+
+class SqliteSearchBackend(BaseSearchBackend):
+    vendor = 'sqlite'
+    _available = None
+
+    def is_available(self):
+        if SqliteSearchBackend._available is None:
+            SqliteSearchBackend._available = SQLITE_TABLE in connection.introspection.table_names()
+        return SqliteSearchBackend._available
+
+    def index(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, name, description, category, features) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in ('name', 'description', 'category', 'features'))
+        # Join on the FTS table so MATCH runs once; bm25() is lower-is-better, so negate it
+        return queryset.extra(
+            tables=[SQLITE_TABLE],
+            where=[f"{SQLITE_TABLE}.rowid = {table}.id", f"{SQLITE_TABLE} MATCH %s"],
+            params=[match],
+            select={'search_rank': f"-bm25({SQLITE_TABLE}, {weights})"},
+        )
+
+
+_BACKENDS = {
+    backend.vendor: backend
+    for backend in (PostgresSearchBackend(), SqliteSearchBackend())
+}
+
+
+def get_backend():
+    backend = _BACKENDS.get(connection.vendor)
+    if backend is None or not backend.is_available():
+        return BaseSearchBackend()
+    return backend
+
+
+def index_products(products):
+    """Add or refresh the search documents of the given ``Product`` instances."""
+    get_backend().index(
+        document_row(p.pk, p.name, p.description, p.category, p.features) for p in products
+    )
+
+
+def remove_products(product_ids):
+    get_backend().remove(product_ids)
+
+
+def rebuild_index(queryset, batch_size=2000):
+    """Rebuild all search documents from ``queryset`` in batches. Returns the number indexed."""
+    backend = get_backend()
+    backend.clear()
+    total = 0
+    batch = []
+    rows = queryset.order_by().values_list('id', 'name', 'description', 'category', 'features')
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(document_row(*row))
+        if len(batch) >= batch_size:
+            backend.index(batch)
+            total += len(batch)
+            batch = []
+    backend.index(batch)
+    return total + len(batch)
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for ``filters.SearchFilter`` backed by the full-text index.
+
+    Keeps the ``?search=`` contract; matching products are annotated with
+    ``search_rank`` and ordered by relevance, newest first for ties.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not search_terms(query):
+            return queryset
+        return get_backend().search(queryset, query).order_by('-search_rank', '-created_at', '-id')
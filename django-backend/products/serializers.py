@@ -1,12 +1,23 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Product, ProductImage, ProductRating
+from .models import Product, ProductImage, ProductRating, ProductCard, ImageUpload
+from .images import rendition_map
+from .uploads import attach_uploads
 import base64
 import uuid
 from django.core.files.base import ContentFile
 
 User = get_user_model()
 
+class DynamicFieldsMixin:
+    """Keep only the fields named in the ``fields`` kwarg (sparse fieldsets, ``?fields=id,name``)."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class UserSerializer(serializers.ModelSerializer):
     # Add name field for frontend compatibility
     name = serializers.SerializerMethodField()
@@ -19,11 +30,24 @@ class UserSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}".strip() or obj.email
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    # {kind: {format: {url, width, height, bytes}}} so clients can pick the smallest fit
+    renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'width', 'height', 'bytes', 'rendition_status', 'renditions']
+
+    def get_renditions(self, obj):
+        renditions = rendition_map(obj)
+        request = self.context.get('request')
+        if request:
+            for formats in renditions.values():
+                for data in formats.values():
+                    if data['url'].startswith('/'):
+                        data['url'] = request.build_absolute_uri(data['url'])
+        return renditions
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     seller = UserSerializer(read_only=True)
     # Add date field mapping for frontend compatibility
@@ -31,27 +55,39 @@ class ProductSerializer(serializers.ModelSerializer):
     updatedAt = serializers.DateTimeField(source='updated_at', read_only=True)
     # Add stockCount alias for frontend compatibility
     stockCount = serializers.IntegerField(source='stock', read_only=True)
+    # Read from the stored aggregates, no per-product AVG/COUNT query
+    rating_average = serializers.SerializerMethodField()
     # Add base64 images field for mobile app
     images_base64 = serializers.ListField(
         child=serializers.DictField(),
         write_only=True,
         required=False
     )
+    # Ids of completed chunked uploads (see products/uploads.py), preferred over images_base64
+    upload_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        write_only=True,
+        required=False
+    )
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'category', 'condition', 
             'features', 'status', 'stock', 'stockCount', 'images', 'seller',
-            'createdAt', 'updatedAt', 'images_base64'
+            'rating_average', 'rating_count', 'createdAt', 'updatedAt', 'images_base64', 'upload_ids'
         ]
-        read_only_fields = ['status', 'seller', 'stockCount', 'createdAt', 'updatedAt']
+        read_only_fields = ['status', 'seller', 'stockCount', 'rating_count', 'createdAt', 'updatedAt']
+
+    def get_rating_average(self, obj):
+        return obj.get_rating_average()
 
     def create(self, validated_data):
         request = self.context.get('request')
         
         # Handle base64 images from mobile app
         images_base64 = validated_data.pop('images_base64', [])
+        upload_ids = validated_data.pop('upload_ids', [])
         
         # Handle regular file uploads
         images = request.FILES.getlist('images') if request else []
@@ -113,6 +149,10 @@ class ProductSerializer(serializers.ModelSerializer):
         for image in images:
             ProductImage.objects.create(product=product, image=image)
             print(f"✅ Saved file upload: {image.name}")
+
+        # Attach finished chunked uploads
+        if upload_ids:
+            attach_uploads(product, request.user, upload_ids)
         
         print(f"🎉 Product created with ID: {product.id}")
         print("===============================")
@@ -124,6 +164,7 @@ class ProductSerializer(serializers.ModelSerializer):
         
         # Handle base64 images from mobile app
         images_base64 = validated_data.pop('images_base64', [])
+        upload_ids = validated_data.pop('upload_ids', [])
         
         # Handle regular file uploads
         images = request.FILES.getlist('images') if request else []
@@ -132,10 +173,11 @@ class ProductSerializer(serializers.ModelSerializer):
         print(f"📱 Base64 images received: {len(images_base64)}")
         print(f"📁 File uploads received: {len(images)}")
 
-        # Update product fields
+        # Update product fields (only the edited ones, so concurrent rating
+        # aggregate updates are not overwritten with stale values)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        instance.save(update_fields=[*validated_data, 'updated_at'])
 
         # Handle image deletions
         delete_image_ids = request.data.get('delete_image_ids') if request else None
@@ -198,14 +240,118 @@ class ProductSerializer(serializers.ModelSerializer):
             ProductImage.objects.create(product=instance, image=image)
             print(f"✅ Saved file upload: {image.name}")
 
+        # Attach finished chunked uploads
+        if upload_ids:
+            attach_uploads(instance, request.user, upload_ids)
+
         print(f"🎉 Product updated with ID: {instance.id}")
         print("=============================")
 
         return instance
 
+class ImageUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'filename', 'content_type', 'size', 'received', 'status', 'created_at']
+        read_only_fields = ['id', 'received', 'status', 'created_at']
+
 class ProductRatingSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     class Meta:
         model = ProductRating
         fields = ['id', 'product', 'user', 'rating', 'review', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'product']
\ No newline at end of file
+        read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'product']
+
+
+class ProductCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Feed card built from the denormalized ``ProductCard`` row only (no related lookups)."""
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    seller = serializers.SerializerMethodField()
+    cover_image = serializers.SerializerMethodField()
+    # Single-entry images list so existing feed clients keep rendering the cover
+    images = serializers.SerializerMethodField()
+    createdAt = serializers.DateTimeField(source='created_at', read_only=True)
+
+    class Meta:
+        model = ProductCard
+        fields = [
+            'id', 'name', 'price', 'condition', 'category', 'status', 'seller',
+            'cover_image', 'images', 'rating_average', 'rating_count', 'createdAt'
+        ]
+        read_only_fields = fields
+
+    def get_seller(self, obj):
+        return {'id': obj.seller_id, 'name': obj.seller_name, 'university_id': obj.university_id}
+
+    def get_cover_image(self, obj):
+        request = self.context.get('request')
+        # Local storage yields relative media URLs; make them absolute like ImageField does
+        if request and obj.cover_image.startswith('/'):
+            return request.build_absolute_uri(obj.cover_image)
+        return obj.cover_image
+
+    def get_images(self, obj):
+        cover_image = self.get_cover_image(obj)
+        return [{'image': cover_image}] if cover_image else []
+
+
+class ProductCardRowSerializer:
+    """
+    Hand-written list serializer for ``?view=card`` on the product list.
+
+    Works on plain ``queryset.values(*ProductCardRowSerializer.values_fields)`` rows and
+    builds the response dicts directly, skipping DRF's per-field machinery. The output
+    matches ``ProductCardSerializer`` (plus ``stock``) so clients can share one card model.
+    """
+    values_fields = (
+        'id', 'name', 'price', 'category', 'condition', 'status', 'stock', 'seller_id',
+        'rating_sum', 'rating_count', 'created_at',
+        'card__seller_name', 'card__university_id', 'card__cover_image',
+    )
+    output_fields = (
+        'id', 'name', 'price', 'condition', 'category', 'status', 'stock', 'seller',
+        'cover_image', 'images', 'rating_average', 'rating_count', 'createdAt',
+    )
+    _datetime = serializers.DateTimeField()
+
+    def __init__(self, rows, request=None, fields=None):
+        self.rows = rows
+        self.request = request
+        self.fields = [name for name in self.output_fields if fields is None or name in fields]
+        # Same result as request.build_absolute_uri(path), computed once per page
+        self.media_prefix = request.build_absolute_uri('/')[:-1] if request is not None else ''
+
+    def media_url(self, path):
+        if path and path.startswith('/'):
+            return self.media_prefix + path
+        return path or ''
+
+    def to_representation(self, row):
+        count = row['rating_count']
+        cover_image = self.media_url(row['card__cover_image'])
+        data = {
+            'id': row['id'],
+            'name': row['name'],
+            'price': str(row['price']),
+            'condition': row['condition'],
+            'category': row['category'],
+            'status': row['status'],
+            'stock': row['stock'],
+            'seller': {
+                'id': row['seller_id'],
+                'name': row['card__seller_name'],
+                'university_id': row['card__university_id'],
+            },
+            'cover_image': cover_image,
+            'images': [{'image': cover_image}] if cover_image else [],
+            'rating_average': row['rating_sum'] / count if count else 0,
+            'rating_count': count,
+            'createdAt': self._datetime.to_representation(row['created_at']),
+        }
+        if len(self.fields) != len(self.output_fields):
+            data = {name: data[name] for name in self.fields}
+        return data
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.rows]
@@ -0,0 +1,143 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Product, ProductImage, ProductImageRendition, ProductRating
+from . import autocomplete, cards, feed_cache, images, ratings, search, storage_cleanup
+from .conditional import touch_products
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Product)
+def copy_seller_university(sender, instance, raw=False, **kwargs):
+    # New products take the seller's university and campus; later moves are applied
+    # by sync_seller_products_university below
+    if raw or not instance._state.adding or instance.university_id is not None or instance.seller_id is None:
+        return
+    instance.university_id = instance.seller.university_id
+    instance.campus_id = instance.seller.campus_id
+
+
+@receiver(post_save, sender=Product)
+def index_product_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_search_document(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+# In-process autocomplete index
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: autocomplete.product_saved(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.product_deleted(product_id))
+
+
+# ProductCard read model
+
+@receiver(post_save, sender=Product)
+def refresh_product_card(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cards.refresh_cards_on_commit([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_feeds(sender, instance, **kwargs):
+    # The card is gone with the product, so refresh_cards cannot see its university
+    university_ids = [instance.university_id]
+    transaction.on_commit(lambda: feed_cache.bump_versions(university_ids))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_related_product_card(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cards.refresh_cards_on_commit([instance.product_id])
+    # Image and rendition changes show up in the product detail response
+    touch_products([instance.product_id])
+
+
+@receiver(post_save, sender=User)
+def refresh_seller_product_cards(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cards.refresh_seller_cards(instance)
+
+
+# Seller fields embedded in every product response (UserSerializer in products/serializers.py)
+SELLER_FIELDS = ('first_name', 'last_name', 'role', 'seller_type')
+
+
+@receiver(pre_save, sender=User)
+def remember_seller_fields(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._seller_fields_before = User.objects.filter(pk=instance.pk).values_list(*SELLER_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def touch_seller_products(sender, instance, raw=False, **kwargs):
+    before = instance.__dict__.pop('_seller_fields_before', None)
+    if raw or before is None:
+        return
+    if before != tuple(getattr(instance, field) for field in SELLER_FIELDS):
+        # So the product list and detail validators (products/conditional.py) change with them
+        Product.objects.filter(seller_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def sync_seller_products_university(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Any save of the user lands here; unless the seller moved this is one SELECT matching nothing
+    moved = Product.objects.filter(seller_id=instance.pk).exclude(
+        Q(university_id=instance.university_id) & Q(campus_id=instance.campus_id)
+    )
+    previous = set(moved.values_list('university_id', flat=True).distinct())
+    if not previous:
+        return
+    # updated_at, so conditional GETs and the autocomplete sync see the move
+    moved.update(university_id=instance.university_id, campus_id=instance.campus_id, updated_at=timezone.now())
+    feed_cache.bump_versions(previous | {instance.university_id})
+
+
+@receiver(post_delete, sender=ProductRating)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    # Creates and edits are applied by ProductRatingListCreateView; deletions can also
+    # come from cascades (e.g. the rater's account is removed)
+    ratings.record_rating(instance.product_id, instance.rating, None)
+
+
+@receiver(post_save, sender=ProductImage)
+def schedule_product_image_renditions(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        images.schedule_renditions(instance.pk)
+
+
+# Storage files are removed by products.storage_cleanup once the delete commits
+
+@receiver(post_delete, sender=ProductImage)
+def queue_product_image_file_deletion(sender, instance, **kwargs):
+    storage_cleanup.enqueue([instance.image.name])
+
+
+@receiver(post_delete, sender=ProductImageRendition)
+def queue_rendition_file_deletion(sender, instance, **kwargs):
+    storage_cleanup.enqueue([instance.file.name])
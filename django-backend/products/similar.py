@@ -0,0 +1,202 @@
+"""
+Content-based "similar products".
+
+Each active product becomes a TF-IDF vector over the words of its name, category,
+features and description (name words count three times, category and features
+twice). Terms found in more than ``MAX_DOCUMENT_FREQUENCY`` of the catalog carry no
+signal and are dropped, which also keeps the similarity products sparse.
+
+The top ``TOP_K`` cosine neighbours of every product are found with SciPy sparse
+matrix products, one batch of rows at a time, and stored in ``ProductNeighbor``.
+The similar-products endpoint is then a single indexed lookup.
+
+``refresh()`` without ``full`` only recomputes products changed since the last run
+and the products whose stored lists mention them. New products therefore only
+show up in older products' lists after the next ``--full`` build, which should
+run nightly.
+"""
+from array import array
+from collections import Counter
+import re
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+import numpy as np
+from scipy import sparse
+
+from .models import Product, ProductNeighbor
+from .search import features_text
+
+TOP_K = 12
+MIN_SCORE = 0.05
+MAX_DOCUMENT_FREQUENCY = 0.2
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('features', 2.0), ('description', 1.0))
+TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or so the this to was '
+    'were will with very good new used condition item items sale selling'.split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOP_WORDS]
+
+
+def document_terms(name, description, category, features):
+    """Weighted term counts for one product."""
+    fields = {'name': name, 'category': category, 'features': features_text(features), 'description': description}
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokenize(fields[field]):
+            counts[token] += weight
+    return counts
+
+
+def iter_documents(batch_size=2000):
+    """Yield ``(id, term counts)`` for every active product that has a card, in id order."""
+    queryset = Product.objects.filter(status='active', card__isnull=False).order_by('id').values_list(
+        'id', 'name', 'description', 'category', 'features'
+    )
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            return
+        for pk, name, description, category, features in rows:
+            yield pk, document_terms(name, description, category, features)
+        last_id = rows[-1][0]
+
+
+def tfidf_matrix(documents):
+    """L2-normalized TF-IDF rows (``float32`` CSR) for an iterable of term counts, consumed once."""
+    vocabulary = {}
+    # Typed arrays: a few bytes per entry instead of a Python int/float object each
+    rows, cols, values = array('i'), array('i'), array('f')
+    n_documents = 0
+    for row, counts in enumerate(documents):
+        for term, count in counts.items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            values.append(count)
+        n_documents = row + 1
+    rows = np.frombuffer(rows, dtype=np.int32)
+    cols = np.frombuffer(cols, dtype=np.int32)
+    values = np.frombuffer(values, dtype=np.float32)
+    tf = sparse.csr_matrix(
+        (np.log1p(values), (rows, cols)),
+        shape=(n_documents, len(vocabulary)),
+        dtype=np.float32,
+    )
+    document_frequency = np.bincount(cols, minlength=len(vocabulary))
+    idf = (np.log((1 + n_documents) / (1 + document_frequency)) + 1).astype(np.float32)
+    if n_documents >= 100:
+        idf[document_frequency > MAX_DOCUMENT_FREQUENCY * n_documents] = 0
+    matrix = (tf @ sparse.diags(idf)).tocsr()
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).tocsr().astype(np.float32)
+
+
+def top_neighbors(matrix, rows, k=TOP_K, batch_size=500):
+    """Yield ``(row, [(neighbor_row, score), ...])`` for ``rows``, best first."""
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        scores = (matrix[batch] @ transposed).tocsr()
+        for offset, row in enumerate(batch):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+            keep = (columns != row) & (values >= MIN_SCORE)
+            columns, values = columns[keep], values[keep]
+            if len(values) > k:
+                best = np.argpartition(-values, k)[:k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            yield row, list(zip(columns[order].tolist(), values[order].tolist()))
+
+
+def _affected_ids(changed_ids, chunk_size):
+    """Products whose stored neighbour lists include one of ``changed_ids``."""
+    affected = set()
+    changed_ids = list(changed_ids)
+    for start in range(0, len(changed_ids), chunk_size):
+        affected.update(
+            ProductNeighbor.objects.filter(neighbor_id__in=changed_ids[start:start + chunk_size])
+            .values_list('product_id', flat=True)
+        )
+    return affected
+
+
+def refresh(full=False, k=TOP_K, batch_size=500):
+    """
+    Recompute and store neighbour lists. Returns build statistics: counts, the
+    vocabulary and matrix size, and timings.
+    """
+    # Keep IN (...) lists within the backend's bound-parameter limit
+    batch_size = min(batch_size, connection.features.max_query_params or batch_size)
+    started = time.perf_counter()
+    now = timezone.now()
+    last_run = None if full else ProductNeighbor.objects.order_by('-computed_at').values_list('computed_at', flat=True).first()
+
+    ids = []
+
+    def documents():
+        for pk, counts in iter_documents():
+            ids.append(pk)
+            yield counts
+
+    matrix = tfidf_matrix(documents())
+    vectorized = time.perf_counter()
+
+    if last_run is None:
+        targets = list(range(len(ids)))
+    else:
+        changed = set(Product.objects.filter(updated_at__gt=last_run).values_list('id', flat=True))
+        wanted = changed | _affected_ids(changed, batch_size)
+        targets = [row for row, pk in enumerate(ids) if pk in wanted]
+
+    # Millions of rows on a full build: insert plain tuples instead of model instances
+    table = ProductNeighbor._meta.db_table
+    insert_sql = f"INSERT INTO {table} (product_id, neighbor_id, rank, score, computed_at) VALUES (%s, %s, %s, %s, %s)"
+    computed_at = connection.ops.adapt_datetimefield_value(now)
+    written = 0
+    batch_ids, pending = [], []
+
+    def flush():
+        nonlocal written
+        with transaction.atomic():
+            ProductNeighbor.objects.filter(product_id__in=batch_ids).delete()
+            with connection.cursor() as cursor:
+                cursor.executemany(insert_sql, pending)
+        written += len(pending)
+        batch_ids.clear()
+        pending.clear()
+
+    for row, neighbors in top_neighbors(matrix, targets, k=k, batch_size=batch_size):
+        product_id = ids[row]
+        batch_ids.append(product_id)
+        pending.extend(
+            (product_id, ids[column], rank, score, computed_at)
+            for rank, (column, score) in enumerate(neighbors)
+        )
+        if len(batch_ids) >= batch_size:
+            flush()
+    if batch_ids:
+        flush()
+    removed, _ = ProductNeighbor.objects.exclude(product__status='active').delete()
+
+    finished = time.perf_counter()
+    return {
+        'products': len(ids),
+        'refreshed': len(targets),
+        'neighbors': written,
+        'removed': removed,
+        'vocabulary': matrix.shape[1],
+        'matrix_nnz': matrix.nnz,
+        'matrix_bytes': matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes,
+        'vectorize_seconds': vectorized - started,
+        'neighbors_seconds': finished - vectorized,
+        'total_seconds': finished - started,
+    }
@@ -0,0 +1,209 @@
+"""
+Durable, batched deletion of product files from storage.
+
+Deleting a ``ProductImage`` or ``ProductImageRendition`` only records its storage key
+in ``StorageDeletion`` (in the same transaction, via the signals in
+``products/signals.py``); nothing touches storage during the request. Keys are then
+deleted through the storage API, which works the same on the local filesystem and
+on GCS, by
+
+* a small in-process pool kicked after the transaction commits, and
+* ``python manage.py process_storage_deletions``, which also retries failures
+  with exponential backoff and can look for orphaned files.
+
+Keys still referenced by an image, rendition or pending upload are never deleted.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import posixpath
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ImageUpload, ProductImage, ProductImageRendition, StorageDeletion
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_PREFIX = 'product_images/'
+CLAIM_SECONDS = 300  # a claimed batch is retried by someone else if its worker dies
+MAX_BACKOFF_SECONDS = 6 * 3600
+
+_drain_executor = None
+_delete_executor = None
+_kick_lock = threading.Lock()
+_kick_queued = False
+
+
+def _get_drain_executor():
+    # One drainer at a time; extra kicks queue behind it and find nothing due
+    global _drain_executor
+    if _drain_executor is None:
+        _drain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-drain')
+    return _drain_executor
+
+
+def _get_delete_executor():
+    global _delete_executor
+    if _delete_executor is None:
+        _delete_executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'STORAGE_DELETION_WORKERS', 4),
+            thread_name_prefix='storage-deletions',
+        )
+    return _delete_executor
+
+
+def enqueue(names):
+    """Queue storage keys for deletion once the current transaction commits."""
+    names = {name for name in names if name}
+    if not names:
+        return
+    now = timezone.now()
+    StorageDeletion.objects.bulk_create(
+        [StorageDeletion(name=name, next_attempt_at=now) for name in names],
+        ignore_conflicts=True,
+    )
+    if getattr(settings, 'STORAGE_DELETION_ASYNC', True):
+        transaction.on_commit(_kick)
+
+
+def _kick():
+    """Start a background drain unless one is already queued (a delete can enqueue many keys)."""
+    global _kick_queued
+    with _kick_lock:
+        if _kick_queued:
+            return
+        _kick_queued = True
+    _get_drain_executor().submit(_drain_in_worker)
+
+
+def referenced_names(names):
+    """The subset of ``names`` that rows still point at."""
+    names = list(names)
+    referenced = set(ProductImage.objects.filter(image__in=names).values_list('image', flat=True))
+    referenced.update(ProductImageRendition.objects.filter(file__in=names).values_list('file', flat=True))
+    # Attached uploads hand their file over to a ProductImage, which is checked above
+    referenced.update(
+        ImageUpload.objects.filter(file__in=names).exclude(status='attached').values_list('file', flat=True)
+    )
+    return referenced
+
+
+def _claim(batch_size):
+    """Lease a batch of due rows so concurrent workers never delete the same keys."""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            StorageDeletion.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now).order_by('next_attempt_at')[:batch_size]
+        )
+        if rows:
+            StorageDeletion.objects.filter(pk__in=[row.pk for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+            )
+    return rows
+
+
+def _delete(name):
+    try:
+        default_storage.delete(name)
+    except Exception as e:
+        return e
+    return None
+
+
+def process_batch(batch_size=100):
+    """Delete one batch of due keys. Returns ``(deleted, failed)``."""
+    rows = _claim(batch_size)
+    if not rows:
+        return 0, 0
+    still_used = referenced_names(row.name for row in rows)
+    pending = [row for row in rows if row.name not in still_used]
+    # Storage deletes are network round trips on GCS; run them concurrently
+    errors = list(_get_delete_executor().map(_delete, [row.name for row in pending])) if pending else []
+
+    done = [row.pk for row in rows if row.name in still_used]
+    failed = []
+    now = timezone.now()
+    for row, error in zip(pending, errors):
+        if error is None:
+            done.append(row.pk)
+            continue
+        row.attempts += 1
+        row.last_error = f'{type(error).__name__}: {error}'
+        row.next_attempt_at = now + timedelta(seconds=min(2 ** row.attempts * 30, MAX_BACKOFF_SECONDS))
+        failed.append(row)
+    StorageDeletion.objects.filter(pk__in=done).delete()
+    if failed:
+        StorageDeletion.objects.bulk_update(failed, ['attempts', 'last_error', 'next_attempt_at'])
+        for row in failed:
+            logger.warning("Failed to delete %s from storage (attempt %s): %s", row.name, row.attempts, row.last_error)
+    return len(pending) - len(failed), len(failed)
+
+
+def drain(batch_size=100):
+    """Process batches until nothing is due. Returns ``(deleted, failed)``."""
+    deleted = failed = 0
+    while True:
+        batch_deleted, batch_failed = process_batch(batch_size)
+        if not batch_deleted and not batch_failed:
+            return deleted, failed
+        deleted += batch_deleted
+        failed += batch_failed
+
+
+def _drain_in_worker():
+    global _kick_queued
+    with _kick_lock:
+        # Kicks arriving from here on queue another pass for keys added during this one
+        _kick_queued = False
+    try:
+        drain()
+    except Exception:
+        logger.exception("Storage deletion drain failed")
+    finally:
+        connection.close()
+
+
+def _walk(storage, path):
+    directories, files = storage.listdir(path)
+    for filename in files:
+        yield posixpath.join(path, filename)
+    for directory in directories:
+        yield from _walk(storage, posixpath.join(path, directory))
+
+
+def find_orphans(prefix=ORPHAN_PREFIX, min_age=timedelta(hours=1), batch_size=500):
+    """
+    Yield files under ``prefix`` that no row references.
+
+    Files younger than ``min_age`` are skipped: they may belong to a request that
+    has saved the file but not yet committed its row.
+    """
+    cutoff = timezone.now() - min_age
+    names = []
+
+    def flush():
+        used = referenced_names(names) | set(
+            StorageDeletion.objects.filter(name__in=names).values_list('name', flat=True)
+        )
+        for name in names:
+            if name in used:
+                continue
+            try:
+                if default_storage.get_modified_time(name) > cutoff:
+                    continue
+            except (NotImplementedError, OSError):
+                pass
+            yield name
+
+    for name in _walk(default_storage, prefix.rstrip('/')):
+        names.append(name)
+        if len(names) >= batch_size:
+            yield from flush()
+            names = []
+    if names:
+        yield from flush()
@@ -0,0 +1,43 @@
+"""
+Resolution of the ``?university=`` filter used by the product endpoints.
+
+Clients may pass a university id or its name; ``All`` (or nothing) means every
+university. Names are resolved through the cache, since universities are
+effectively static.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+ALL_UNIVERSITIES = 'All'
+# Matches no university; returned for names that do not exist so filters come back empty
+UNKNOWN_UNIVERSITY = 0
+NAME_CACHE_TTL = 3600
+
+
+def resolve(value):
+    """Return the university id for ``value``, None for all universities or ``UNKNOWN_UNIVERSITY``."""
+    value = (value or '').strip()
+    if not value or value == ALL_UNIVERSITIES:
+        return None
+    if value.isdigit():
+        return int(value)
+    key = 'university:id:' + hashlib.md5(value.encode()).hexdigest()
+    university_id = cache.get(key)
+    if university_id is None:
+        from users.models import University
+        university_id = University.objects.filter(name=value).values_list('id', flat=True).first()
+        university_id = UNKNOWN_UNIVERSITY if university_id is None else university_id
+        cache.set(key, university_id, timeout=NAME_CACHE_TTL)
+    return university_id
+
+
+def from_request(request):
+    return resolve(request.query_params.get('university'))
+
+
+def filter_queryset(queryset, university_id, field='university_id'):
+    """Apply a resolved university filter (no-op for all universities)."""
+    if university_id is None:
+        return queryset
+    return queryset.filter(**{field: university_id})
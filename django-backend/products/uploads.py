@@ -0,0 +1,127 @@
+"""
+Resumable chunked image uploads.
+
+    POST   /api/products/uploads/                    {filename, content_type, size} -> session
+    PUT    /api/products/uploads/<id>/?offset=<n>    raw chunk bytes as the request body
+    GET    /api/products/uploads/<id>/               current ``received`` offset (to resume)
+    POST   /api/products/uploads/<id>/complete/      assemble and validate -> ready to attach
+
+Each chunk goes straight to the configured storage backend as its own object,
+so a worker only ever holds one chunk in memory and any instance can receive
+any chunk. ``complete`` streams the chunks through a spooled temp file into the
+final image. Products reference finished uploads with ``upload_ids``.
+"""
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .models import ImageUpload, ProductImage
+
+ALLOWED_CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+}
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The client is out of sync; it should resume from ``upload.received``."""
+
+
+def max_upload_bytes():
+    return getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+
+
+def max_chunk_bytes():
+    return getattr(settings, 'IMAGE_UPLOAD_CHUNK_BYTES', 1024 * 1024)
+
+
+def chunk_name(upload, index):
+    return f'uploads/{upload.id}/{index:06d}'
+
+
+def start_upload(owner, filename, content_type, size):
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise UploadError(f'Unsupported content type: {content_type}')
+    if size <= 0 or size > max_upload_bytes():
+        raise UploadError(f'Upload size must be between 1 and {max_upload_bytes()} bytes.')
+    return ImageUpload.objects.create(
+        owner=owner, filename=os.path.basename(filename)[:255], content_type=content_type, size=size
+    )
+
+
+def append_chunk(upload, offset, data):
+    """
+    Store one chunk. ``offset`` must equal the bytes received so far, which makes
+    a retried chunk (same offset, already stored) a harmless no-op.
+    """
+    if upload.status != 'open':
+        raise UploadError('Upload is already complete.')
+    if offset < upload.received and offset + len(data) <= upload.received:
+        return upload  # retry of a chunk we already have
+    if offset != upload.received:
+        raise OffsetMismatch(f'Expected offset {upload.received}.')
+    if not data or len(data) > max_chunk_bytes():
+        raise UploadError(f'Chunks must be between 1 and {max_chunk_bytes()} bytes.')
+    if upload.received + len(data) > upload.size:
+        raise UploadError('Chunk exceeds the declared upload size.')
+    name = chunk_name(upload, upload.chunk_count)
+    # A previous attempt may have stored this chunk before failing; never let storage rename it
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(data))
+    upload.received += len(data)
+    upload.chunk_count += 1
+    upload.save(update_fields=['received', 'chunk_count', 'updated_at'])
+    return upload
+
+
+def complete_upload(upload):
+    """Assemble the chunks into the final image file."""
+    if upload.status != 'open':
+        return upload
+    if upload.received != upload.size:
+        raise UploadError(f'Upload incomplete: {upload.received} of {upload.size} bytes received.')
+    with tempfile.SpooledTemporaryFile(max_size=COPY_BUFFER_SIZE * 16) as assembled:
+        for index in range(upload.chunk_count):
+            with default_storage.open(chunk_name(upload, index), 'rb') as chunk:
+                while block := chunk.read(COPY_BUFFER_SIZE):
+                    assembled.write(block)
+        assembled.seek(0)
+        try:
+            with Image.open(assembled) as image:
+                image.verify()
+        except Exception:
+            raise UploadError('Uploaded file is not a valid image.')
+        assembled.seek(0)
+        ext = ALLOWED_CONTENT_TYPES[upload.content_type]
+        upload.file.save(f'upload_{uuid.uuid4().hex[:12]}.{ext}', File(assembled), save=False)
+    upload.status = 'complete'
+    upload.save(update_fields=['file', 'status', 'updated_at'])
+    delete_chunks(upload)
+    return upload
+
+
+def delete_chunks(upload):
+    for index in range(upload.chunk_count):
+        default_storage.delete(chunk_name(upload, index))
+
+
+def attach_uploads(product, owner, upload_ids):
+    """Create ``ProductImage``s from the owner's completed uploads. Returns how many were attached."""
+    uploads = list(ImageUpload.objects.filter(id__in=upload_ids, owner=owner, status='complete'))
+    for upload in uploads:
+        # Reuse the stored file as-is; no bytes are copied
+        ProductImage.objects.create(product=product, image=upload.file.name)
+    ImageUpload.objects.filter(pk__in=[upload.pk for upload in uploads]).update(status='attached')
+    return len(uploads)
@@ -5,12 +5,30 @@ from .views import (
     ProductRatingListCreateView,
     FeaturedProductsView,
     RecentProductsView,
+    FeedCacheStatsView,
+    ProductFacetsView,
+    ProductAutocompleteView,
+    SimilarProductsView,
+    ProductViewStatsView,
+    ProductExportView,
+    ImageUploadCreateView,
+    ImageUploadDetailView,
+    ImageUploadCompleteView,
 )
 
 urlpatterns = [
     path('featured/', FeaturedProductsView.as_view(), name='product-featured'),
     path('recent/', RecentProductsView.as_view(), name='product-recent'),
+    path('feed-cache-stats/', FeedCacheStatsView.as_view(), name='product-feed-cache-stats'),
+    path('facets/', ProductFacetsView.as_view(), name='product-facets'),
+    path('export.<str:export_format>', ProductExportView.as_view(), name='product-export'),
+    path('autocomplete/', ProductAutocompleteView.as_view(), name='product-autocomplete'),
+    path('uploads/', ImageUploadCreateView.as_view(), name='product-image-upload-create'),
+    path('uploads/<uuid:upload_id>/', ImageUploadDetailView.as_view(), name='product-image-upload-detail'),
+    path('uploads/<uuid:upload_id>/complete/', ImageUploadCompleteView.as_view(), name='product-image-upload-complete'),
     path('<int:product_id>/ratings/', ProductRatingListCreateView.as_view(), name='product-ratings'),
     path('', ProductListCreateView.as_view(), name='product-list-create'),
     path('<int:pk>/', ProductRetrieveUpdateDestroyView.as_view(), name='product-detail'),
+    path('<int:pk>/similar/', SimilarProductsView.as_view(), name='product-similar'),
+    path('<int:pk>/views/', ProductViewStatsView.as_view(), name='product-view-stats'),
 ]
\ No newline at end of file
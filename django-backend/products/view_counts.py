@@ -0,0 +1,182 @@
+"""
+Buffered product view counters.
+
+Counting a view must not write on the product detail read path, so each worker
+process keeps its counts in memory, keyed by ``(product_id, day)``, and adds them to
+``ProductViewStat`` in batches: one multi-row ``INSERT ... ON CONFLICT DO UPDATE
+SET views = views + excluded.views`` per few hundred products.
+
+A flush is started by a timer ``VIEW_COUNTS_FLUSH_SECONDS`` after the first view
+counted since the last flush, by the view that finds the buffer holding
+``VIEW_COUNTS_MAX_PENDING`` products, and at interpreter exit. Counted views therefore
+reach the database within about ``VIEW_COUNTS_FLUSH_SECONDS`` even if no more views
+arrive, and a worker that crashes loses at most that much counting; a flush that
+fails puts its counts back and re-arms the timer.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Product, ProductViewStat
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+_flush_queued = False
+_executor = None
+_timer = None
+
+
+def _flush_seconds():
+    return getattr(settings, 'VIEW_COUNTS_FLUSH_SECONDS', 30)
+
+
+def _max_pending():
+    return getattr(settings, 'VIEW_COUNTS_MAX_PENDING', 500)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='view-counts')
+    return _executor
+
+
+def _is_async():
+    return getattr(settings, 'VIEW_COUNTS_ASYNC', True)
+
+
+def _arm_timer():
+    """Schedule a flush ``VIEW_COUNTS_FLUSH_SECONDS`` from now, unless one is scheduled. Call with ``_lock`` held."""
+    global _timer
+    if _timer is None and _pending and _is_async():
+        _timer = threading.Timer(_flush_seconds(), _flush_on_timer)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_on_timer():
+    global _timer, _flush_queued
+    with _lock:
+        _timer = None
+        if _flush_queued or not _pending:
+            return
+        _flush_queued = True
+    _get_executor().submit(_flush_in_worker)
+
+
+def record(product_id, count=1):
+    """Count a view of ``product_id``. Never touches the database on the caller's thread."""
+    global _flush_queued
+    key = (int(product_id), timezone.localdate())
+    with _lock:
+        _pending[key] += count
+        due = not _flush_queued and (
+            len(_pending) >= _max_pending() or time.monotonic() - _last_flush >= _flush_seconds()
+        )
+        if due:
+            _flush_queued = True
+        else:
+            _arm_timer()
+    if not due:
+        return
+    if _is_async():
+        _get_executor().submit(_flush_in_worker)
+    else:
+        flush()
+
+
+def _take():
+    """Swap the buffer out for an empty one."""
+    global _pending, _last_flush, _flush_queued
+    with _lock:
+        counts, _pending = _pending, Counter()
+        _last_flush = time.monotonic()
+        _flush_queued = False
+    return counts
+
+
+def _put_back(counts):
+    with _lock:
+        _pending.update(counts)
+        _arm_timer()
+
+
+def write(counts):
+    """Add ``{(product_id, date): views}`` to ``ProductViewStat``. Returns the number of rows upserted."""
+    existing = set()
+    product_ids = list({product_id for product_id, _ in counts})
+    chunk_size = min(500, connection.features.max_query_params or 500)
+    for start in range(0, len(product_ids), chunk_size):
+        existing.update(
+            Product.objects.filter(pk__in=product_ids[start:start + chunk_size]).values_list('pk', flat=True)
+        )
+    # Views of products deleted since they were counted are dropped
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = [
+        (product_id, connection.ops.adapt_datefield_value(date), views, now)
+        for (product_id, date), views in sorted(counts.items())
+        if product_id in existing
+    ]
+    table = ProductViewStat._meta.db_table
+    rows_per_statement = min(250, (connection.features.max_query_params or 1000) // 4)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), rows_per_statement):
+            chunk = rows[start:start + rows_per_statement]
+            cursor.execute(
+                f"INSERT INTO {table} (product_id, date, views, updated_at) VALUES "
+                + ', '.join(['(%s, %s, %s, %s)'] * len(chunk))
+                + f" ON CONFLICT (product_id, date) DO UPDATE SET views = {table}.views + excluded.views, "
+                "updated_at = excluded.updated_at",
+                [value for row in chunk for value in row],
+            )
+    return len(rows)
+
+
+def flush():
+    """Write this process's buffered views. Returns the number of rows upserted."""
+    counts = _take()
+    if not counts:
+        return 0
+    try:
+        return write(counts)
+    except DatabaseError:
+        _put_back(counts)
+        logger.exception("Flushing %s product view counters failed; keeping them for the next flush", len(counts))
+        return 0
+
+
+def _flush_in_worker():
+    try:
+        flush()
+    finally:
+        connection.close()
+
+
+@atexit.register
+def _flush_at_exit():
+    counts = _take()
+    if not counts:
+        return
+    try:
+        write(counts)
+    except DatabaseError as e:
+        # The database may be gone by now (a test database after the run, say): one line, no traceback
+        logger.warning("Dropped %s product view counters at exit: %s", len(counts), e)
+
+
+def total_views(product_ids):
+    """``{product_id: views}`` over all flushed days for ``product_ids``."""
+    rows = ProductViewStat.objects.filter(product_id__in=list(product_ids)).order_by() \
+        .values('product_id').annotate(n=Sum('views')).values_list('product_id', 'n')
+    return dict(rows)
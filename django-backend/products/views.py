@@ -1,8 +1,18 @@
 from django.shortcuts import render
 from rest_framework import generics, permissions, filters
-from .models import Product
-from .serializers import ProductSerializer
-import os
+from .models import Product, ProductCard, ProductRanking, ProductViewStat, ImageUpload
+from .serializers import ProductSerializer, ProductCardSerializer, ProductCardRowSerializer, ImageUploadSerializer
+from .search import ProductSearchFilter
+from .pagination import ProductFeedPagination
+from .feed_cache import FeedCacheMixin
+from .exports import ExportView
+from . import autocomplete, facets, feed_cache, universities, uploads, view_counts
+from .conditional import ConditionalGetMixin, detail_validators, queryset_validators, respond
+from .ratings import record_rating, rating_average_expression
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from datetime import timedelta
 
 # Create your views here.
 
@@ -19,14 +29,13 @@ class ProductRatingListCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, product_id):
-        ratings = ProductRating.objects.filter(product_id=product_id)
+        product = get_object_or_404(Product.objects.only('rating_sum', 'rating_count'), pk=product_id)
+        ratings = ProductRating.objects.filter(product_id=product_id).select_related('user')
         serializer = ProductRatingSerializer(ratings, many=True)
-        avg = ratings.aggregate(models.Avg('rating'))['rating__avg']
-        count = ratings.count()
         return Response({
             'results': serializer.data,
-            'average': avg or 0,
-            'count': count
+            'average': product.get_rating_average(),
+            'count': product.rating_count
         })
 
     def post(self, request, product_id):
@@ -39,64 +48,312 @@ class ProductRatingListCreateView(APIView):
         ).exists()
         if not purchased:
             raise PermissionDenied('You can only rate products you have purchased.')
-        # Check if already rated
-        instance = ProductRating.objects.filter(product_id=product_id, user=user).first()
-        data = request.data.copy()
-        data['product'] = product_id
-        if instance:
-            serializer = ProductRatingSerializer(instance, data=data, partial=True)
-        else:
-            serializer = ProductRatingSerializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save(user=user, product_id=product_id)
+        with transaction.atomic():
+            # Check if already rated (locked so concurrent edits apply their deltas in turn)
+            instance = ProductRating.objects.select_for_update().filter(product_id=product_id, user=user).first()
+            old_rating = instance.rating if instance else None
+            data = request.data.copy()
+            data['product'] = product_id
+            if instance:
+                serializer = ProductRatingSerializer(instance, data=data, partial=True)
+            else:
+                serializer = ProductRatingSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            rating = serializer.save(user=user, product_id=product_id)
+            record_rating(product_id, old_rating, rating.rating)
         return Response(serializer.data, status=status.HTTP_201_CREATED if not instance else status.HTTP_200_OK)
 
+    def delete(self, request, product_id):
+        # Aggregates are updated by the ProductRating post_delete signal
+        deleted, _ = ProductRating.objects.filter(product_id=product_id, user=request.user).delete()
+        if not deleted:
+            return Response({'detail': 'You have not rated this product.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class ProductListCreateView(generics.ListCreateAPIView):
-    queryset = Product.objects.all()
+
+class SparseFieldsetMixin:
+    """Pass ``?fields=id,name,price`` through to the serializer on reads."""
+    fields_query_param = 'fields'
+
+    def requested_fields(self):
+        fields = self.request.query_params.get(self.fields_query_param)
+        if not fields:
+            return None
+        return [name.strip() for name in fields.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class ProductListCreateView(ConditionalGetMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.select_related('seller').prefetch_related('images__renditions')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'description', 'category', 'features']
+    pagination_class = ProductFeedPagination
+    # Full-text search over name, description, category and features (see products/search.py)
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
+    ordering_fields = ['created_at', 'price', 'rating_average', 'rating_count']
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        university = self.request.query_params.get('university')
-        if university and university != 'All':
-            queryset = queryset.filter(seller__university__name=university)
+        queryset = super().get_queryset().annotate(rating_average=rating_average_expression())
+        fields = self.requested_fields()
+        if fields is not None and 'images' not in fields:
+            # Sparse fieldset without images: skip the two prefetch queries
+            queryset = queryset.prefetch_related(None)
+        queryset = universities.filter_queryset(queryset, universities.from_request(self.request))
+        campus = self.request.query_params.get('campus')
+        if campus and campus.isdigit():
+            queryset = queryset.filter(campus_id=int(campus))
         return queryset
 
+    def get_validators(self):
+        return queryset_validators(self.request, self.filter_queryset(self.get_queryset()))
 
-class FeaturedProductsView(generics.ListAPIView):
-    serializer_class = ProductSerializer
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search')
+        if search and request.query_params.get(self.paginator.page_query_param, '1') == '1':
+            # Frequent searches become autocomplete suggestions
+            autocomplete.record_query(search, universities.from_request(request))
+        if request.query_params.get('view') != 'card':
+            return super().list(request, *args, **kwargs)
+        # Lean card rows: one query over plain values, no model instances or nested serializers
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        page = self.paginate_queryset(queryset.values(*ProductCardRowSerializer.values_fields))
+        serializer = ProductCardRowSerializer(page, request=request, fields=self.requested_fields())
+        return self.get_paginated_response(serializer.data)
+
+
+class FeaturedProductsView(ConditionalGetMixin, FeedCacheMixin, SparseFieldsetMixin, generics.ListAPIView):
+    """
+    Top-ranked active products, read from the ProductRanking table that
+    ``python manage.py refresh_rankings`` materializes (see products/ranking.py).
+    """
+    serializer_class = ProductCardSerializer
     permission_classes = [permissions.AllowAny]
+    feed_cache_name = 'featured'
+    featured_limit = 100
 
     def get_queryset(self):
-        queryset = Product.objects.filter(status='active')
-        university = self.request.query_params.get('university')
-        if university and university != 'All':
-            queryset = queryset.filter(seller__university__name=university)
-        return queryset
+        queryset = ProductCard.objects.filter(status='active')
+        university_id = universities.from_request(self.request)
+        if not ProductRanking.objects.exists():
+            # Rankings have never been computed: fall back to the newest products
+            return universities.filter_queryset(queryset, university_id)[:self.featured_limit]
+        if university_id is not None:
+            queryset = queryset.filter(ranking__university_id=university_id)
+        else:
+            queryset = queryset.filter(ranking__isnull=False)
+        return queryset.order_by('-ranking__score')[:self.featured_limit]
 
 
-class RecentProductsView(generics.ListAPIView):
-    serializer_class = ProductSerializer
+class RecentProductsView(ConditionalGetMixin, FeedCacheMixin, SparseFieldsetMixin, generics.ListAPIView):
+    serializer_class = ProductCardSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ProductFeedPagination
+    feed_cache_name = 'recent'
 
     def get_queryset(self):
-        queryset = Product.objects.filter(status='active')
-        university = self.request.query_params.get('university')
-        if university and university != 'All':
-            queryset = queryset.filter(seller__university__name=university)
-        return queryset
+        queryset = ProductCard.objects.filter(status='active')
+        return universities.filter_queryset(queryset, universities.from_request(self.request))
+
+class SimilarProductsView(generics.ListAPIView):
+    """
+    Products most similar in content to ``pk``, from the ProductNeighbor table that
+    ``python manage.py build_similar_products`` fills (see products/similar.py).
+    """
+    serializer_class = ProductCardSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    similar_limit = 12
+
+    def get_queryset(self):
+        product_id = self.kwargs['pk']
+        cards = list(
+            ProductCard.objects.filter(similar_to__product_id=product_id, status='active')
+            .order_by('similar_to__rank')[:self.similar_limit]
+        )
+        if cards:
+            return cards
+        # Not indexed yet (new product, or the build has not run): newest in the same category
+        product = get_object_or_404(Product.objects.only('category'), pk=product_id)
+        return ProductCard.objects.filter(category=product.category, status='active') \
+            .exclude(pk=product_id)[:self.similar_limit]
+
+
+class ProductViewStatsView(APIView):
+    """
+    Daily detail-page views of ``pk`` over the last ``?days=`` days (default 30), for
+    the product's seller. Views reach these counts within about
+    ``VIEW_COUNTS_FLUSH_SECONDS`` (see products/view_counts.py).
+    """
+    permission_classes = [IsAuthenticated]
+    max_days = 365
+
+    def get(self, request, pk):
+        product = get_object_or_404(Product.objects.only('seller_id'), pk=pk)
+        if product.seller_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied("You do not have permission to access this product.")
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            raise ValidationError({'days': 'Must be an integer.'})
+        days = min(max(days, 1), self.max_days)
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        counts = dict(
+            ProductViewStat.objects.filter(product_id=pk, date__gte=start).values_list('date', 'views')
+        )
+        series = [
+            {'date': day.isoformat(), 'views': counts.get(day, 0)}
+            for day in (start + timedelta(days=n) for n in range(days))
+        ]
+        return Response({
+            'product': product.pk,
+            'total': view_counts.total_views([product.pk]).get(product.pk, 0),
+            'days': series,
+        })
+
+
+class ProductAutocompleteView(APIView):
+    """
+    Typeahead suggestions (product names, categories and popular searches) for
+    ``?q=`` within ``?university=``, from the in-memory index in products/autocomplete.py.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 8))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        suggestions, warm = autocomplete.suggest(
+            request.query_params.get('q', ''), universities.from_request(request), limit,
+        )
+        return Response({
+            'results': [{'text': text, 'type': kind} for kind, text in suggestions],
+            'warm': warm,
+        })
+
+
+class ProductFacetsView(APIView):
+    """
+    Category, condition and price-bucket counts for ``?university=`` and ``?search=``
+    (see products/facets.py). Cached and invalidated together with the feeds.
+    """
+    permission_classes = [permissions.AllowAny]
+    feed_cache_name = 'facets'
+
+    def get(self, request):
+        return respond(
+            request,
+            (feed_cache.etag(self.feed_cache_name, request), None),
+            lambda: feed_cache.cached_response(self.feed_cache_name, request, lambda: self.build(request)),
+        )
+
+    def build(self, request):
+        data, stale = facets.compute_within_budget(request, self)
+        if data is None:
+            return Response(
+                {'detail': 'Facets are temporarily unavailable.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'},
+            )
+        if stale:
+            # Served from the last good result: keep it out of the caches
+            return Response({**data, 'stale': True}, headers={'Cache-Control': 'no-store'})
+        return Response(data)
+
+
+class ImageUploadCreateView(APIView):
+    """Start a resumable chunked image upload (see products/uploads.py)."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.start_upload(request.user, **serializer.validated_data)
+        except uploads.UploadError as e:
+            raise ValidationError({'detail': str(e)})
+        data = ImageUploadSerializer(upload).data
+        data['chunk_size'] = uploads.max_chunk_bytes()
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class ImageUploadDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = get_object_or_404(ImageUpload, pk=upload_id, owner=request.user)
+        return Response(ImageUploadSerializer(upload).data)
+
+    def put(self, request, upload_id):
+        try:
+            offset = int(request.query_params.get('offset', ''))
+        except ValueError:
+            raise ValidationError({'detail': 'offset query parameter is required.'})
+        # The raw body is the chunk; Django caps it at DATA_UPLOAD_MAX_MEMORY_SIZE
+        data = request.body
+        with transaction.atomic():
+            upload = get_object_or_404(ImageUpload.objects.select_for_update(), pk=upload_id, owner=request.user)
+            try:
+                uploads.append_chunk(upload, offset, data)
+            except uploads.OffsetMismatch as e:
+                return Response({'detail': str(e), 'received': upload.received}, status=status.HTTP_409_CONFLICT)
+            except uploads.UploadError as e:
+                raise ValidationError({'detail': str(e)})
+        return Response(ImageUploadSerializer(upload).data)
+
+
+class ImageUploadCompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        with transaction.atomic():
+            upload = get_object_or_404(ImageUpload.objects.select_for_update(), pk=upload_id, owner=request.user)
+            try:
+                uploads.complete_upload(upload)
+            except uploads.UploadError as e:
+                raise ValidationError({'detail': str(e)})
+        return Response(ImageUploadSerializer(upload).data)
+
+
+class FeedCacheStatsView(APIView):
+    """Hit/miss/rebuild counters of the feed cache, for tuning FEED_CACHE_TTL."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(feed_cache.get_stats())
+
+    def delete(self, request):
+        feed_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 from rest_framework.exceptions import PermissionDenied
 
-class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+class ProductRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.select_related('seller').prefetch_related('images__renditions')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_validators(self):
+        validators = detail_validators(self.request, self.kwargs['pk'])
+        user = self.request.user
+        if validators is not None and user.is_authenticated and getattr(user, 'role', None) == 'seller':
+            # Let get_object() apply the owner check instead of answering 304
+            if not Product.objects.filter(pk=self.kwargs['pk'], seller_id=user.id).exists():
+                return None
+        return validators
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            # Counted in memory and written in batches (see products/view_counts.py)
+            view_counts.record(self.kwargs['pk'])
+        return response
+
     def get_object(self):
         obj = super().get_object()
         user = self.request.user
@@ -107,16 +364,32 @@ class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return obj
 
     def perform_destroy(self, instance):
-        # Delete associated image files before deleting the product
-        for image in instance.images.all():
-            if image.image:
-                try:
-                    # Delete the file from storage
-                    if os.path.exists(image.image.path):
-                        os.remove(image.image.path)
-                except Exception as e:
-                    # Log the error but continue with deletion
-                    print(f"Error deleting image file {image.image.path}: {e}")
-        
-        # Delete the product (this will cascade delete ProductImage records)
+        # Cascades to the images; their files are queued for background deletion
+        # (see products/storage_cleanup.py) instead of being removed here
         instance.delete()
+
+
+class ProductExportView(ExportView):
+    """All products, for admins, as ``export.csv`` or ``export.ndjson``."""
+    export_name = 'products'
+    queryset = Product.objects.all()
+    university_field = 'university_id'
+    filters = {'status': 'status', 'category': 'category', 'condition': 'condition', 'seller': 'seller_id'}
+    columns = {
+        'id': 'id',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'name': 'name',
+        'description': 'description',
+        'category': 'category',
+        'condition': 'condition',
+        'status': 'status',
+        'price': 'price',
+        'stock': 'stock',
+        'seller_id': 'seller_id',
+        'seller_email': 'seller__email',
+        'university': 'university__name',
+        'campus': 'campus__name',
+        'rating_sum': 'rating_sum',
+        'rating_count': 'rating_count',
+    }
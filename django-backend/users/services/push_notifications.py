@@ -1,6 +1,7 @@
 import requests
 import json
 import logging
+from collections import defaultdict
 from typing import List, Dict, Optional
 from users.models import PushToken, NotificationLog
 
@@ -8,6 +9,14 @@ logger = logging.getLogger(__name__)
 
 EXPO_PUSH_URL = 'https://exp.host/--/api/v2/push/send'
 EXPO_PUSH_RECEIPT_URL = 'https://exp.host/--/api/v2/push/getReceipts'
+EXPO_MAX_MESSAGES = 100  # per push request
+
+ORDER_STATUS_MESSAGES = {
+    'processing': 'Your order is being processed',
+    'shipped': 'Your order has been shipped 📦',
+    'delivered': 'Your order has been delivered ✅',
+    'cancelled': 'Your order has been cancelled',
+}
 
 
 class PushNotificationService:
@@ -162,6 +171,98 @@ class PushNotificationService:
         
         return results
 
+    @staticmethod
+    def send_many(notifications: List[Dict]) -> Dict:
+        """
+        Send many notifications, each a dict with user_id, title, body, data and type,
+        with one query for all the recipients' tokens and one Expo request per 100
+        messages. Used by the order event dispatcher (orders/lifecycle.py).
+        """
+        results = {'successful': 0, 'failed': 0, 'total': len(notifications)}
+        if not notifications:
+            return results
+        tokens = defaultdict(list)
+        rows = PushToken.objects.filter(
+            user_id__in={notification['user_id'] for notification in notifications},
+            is_active=True
+        ).values_list('user_id', 'token')
+        for user_id, token in rows:
+            if PushNotificationService.validate_token(token):
+                tokens[user_id].append(token)
+
+        messages = []  # (notification index, token, message)
+        for index, notification in enumerate(notifications):
+            for token in tokens[notification['user_id']]:
+                messages.append((index, token, {
+                    'to': token,
+                    'sound': 'default',
+                    'title': notification['title'],
+                    'body': notification['body'],
+                    'data': notification.get('data') or {},
+                    'badge': 1,
+                    'priority': 'high',
+                }))
+
+        sent = defaultdict(int)
+        errors = {}
+        inactive = []
+        for start in range(0, len(messages), EXPO_MAX_MESSAGES):
+            chunk = messages[start:start + EXPO_MAX_MESSAGES]
+            try:
+                response = requests.post(
+                    EXPO_PUSH_URL,
+                    headers={
+                        'Accept': 'application/json',
+                        'Accept-Encoding': 'gzip, deflate',
+                        'Content-Type': 'application/json',
+                    },
+                    data=json.dumps([message for _, _, message in chunk]),
+                    timeout=10
+                )
+                result = response.json()
+            except Exception as e:
+                logger.error(f"Error sending {len(chunk)} push notifications: {str(e)}")
+                for index, _, _ in chunk:
+                    errors[index] = str(e)
+                continue
+            if response.status_code != 200:
+                logger.error(f"Expo push error: {result}")
+                for index, _, _ in chunk:
+                    errors[index] = str(result)
+                continue
+            tickets = result.get('data', [])
+            for (index, token, _), ticket in zip(chunk, tickets):
+                if ticket.get('status') == 'error':
+                    if ticket.get('details', {}).get('error') in ['DeviceNotRegistered', 'InvalidCredentials']:
+                        inactive.append(token)
+                else:
+                    sent[index] += 1
+
+        if inactive:
+            PushToken.objects.filter(token__in=inactive).update(is_active=False)
+            logger.warning(f"Marked {len(inactive)} tokens as inactive")
+
+        logs = []
+        for index, notification in enumerate(notifications):
+            if not tokens[notification['user_id']]:
+                results['failed'] += 1
+                continue
+            successful = index not in errors
+            results['successful' if successful else 'failed'] += 1
+            logs.append(NotificationLog(
+                user_id=notification['user_id'],
+                type=notification.get('type', 'system'),
+                title=notification['title'],
+                body=notification['body'],
+                data=notification.get('data'),
+                sent_to_tokens=sent[index],
+                successful=successful,
+                error_message=errors.get(index)
+            ))
+        NotificationLog.objects.bulk_create(logs)
+        logger.info(f"Push notifications sent: {results['successful']} of {results['total']}")
+        return results
+
 
 # Convenience functions for common notification types
 
@@ -188,17 +289,10 @@ def notify_order_status_update(order, status):
     """Notify buyer when order status changes"""
     from orders.models import Order
     
-    status_messages = {
-        'processing': 'Your order is being processed',
-        'shipped': 'Your order has been shipped 📦',
-        'delivered': 'Your order has been delivered ✅',
-        'cancelled': 'Your order has been cancelled',
-    }
-    
     return PushNotificationService.send_notification(
         user_id=order.buyer.id,
         title='Order Update',
-        body=status_messages.get(status, f'Order status: {status}'),
+        body=ORDER_STATUS_MESSAGES.get(status, f'Order status: {status}'),
         data={
             'type': 'order',
             'orderId': str(order.id),
@@ -91,4 +91,35 @@ def send_sms_notification(phone_number, message):
         return {
             'success': False,
             'error': str(e)
-        } 
\ No newline at end of file
+        } 
+
+def send_bulk_sms(phone_numbers, message):
+    """Send the same ``message`` to many numbers in one request."""
+    if not phone_numbers:
+        return {'success': True, 'sent_to': 0}
+    if not SMS_ENABLED:
+        logger.info(f"SMS disabled - Would send to {len(phone_numbers)} numbers: {message}")
+        return {'success': False, 'error': 'SMS library not available'}
+    try:
+        request = SMSRequest()
+        request.setHost("api.smsonlinegh.com")
+        request.setAuthModel(AuthModel.API_KEY)
+        request.setAuthApiKey(settings.ZENOPH_API_KEY)
+        request.setSender(settings.ZENOPH_SENDER_ID)
+        request.setMessage(message)
+        request.setSMSType(SMSType.GSM_DEFAULT)
+        for phone_number in phone_numbers:
+            request.addDestination(phone_number)
+        response = request.submit()
+        logger.debug(f"SMS sent to {len(phone_numbers)} numbers, response: {response!r}")
+        return {
+            'success': True,
+            'sent_to': len(phone_numbers),
+            'response': str(response)
+        }
+    except Exception as e:
+        logger.error(f"Failed to send SMS to {len(phone_numbers)} numbers: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }